@@ -0,0 +1,148 @@
+import threading
+
+from PyQt6.QtCore import QObject, QRunnable, QThreadPool, pyqtSignal, pyqtSlot
+
+
+class JobCancelled(Exception):
+    """Wird in einem Job ausgelöst, um ihn nach einem Abbruch vorzeitig zu beenden."""
+
+
+class JobSignals(QObject):
+    """Signale eines Jobs; sie werden im GUI-Thread zugestellt."""
+    finished = pyqtSignal(object, object)   # Job, Ergebnis
+    failed = pyqtSignal(object, str)        # Job, Fehlermeldung
+    progress = pyqtSignal(object, int, int, str)  # Job, erledigt, gesamt, Text
+    done = pyqtSignal(object)               # Job; wird immer als letztes gesendet
+
+
+class Job(QRunnable):
+    """
+    Führt fn(job, *args, **kwargs) in einem Thread des QThreadPool aus.
+    fn kann über job.check_cancelled() oder job.cancel_event auf einen Abbruch reagieren
+    und über job.report_progress() den Fortschritt melden.
+    """
+
+    def __init__(self, channel, fn, *args, **kwargs):
+        super().__init__()
+        self.channel = channel
+        self.fn = fn
+        self.args = args
+        self.kwargs = kwargs
+        self.signals = JobSignals()
+        self.cancel_event = threading.Event()
+
+    @property
+    def cancelled(self):
+        return self.cancel_event.is_set()
+
+    def cancel(self):
+        self.cancel_event.set()
+
+    def check_cancelled(self):
+        if self.cancelled:
+            raise JobCancelled()
+
+    def report_progress(self, done, total, text=""):
+        if not self.cancelled:
+            self.signals.progress.emit(self, done, total, text)
+
+    def run(self):
+        # Bereits vor dem Start abgebrochene Jobs (z.B. durch schnelles Umschalten) laufen gar nicht erst
+        try:
+            if self.cancelled:
+                return
+            try:
+                result = self.fn(self, *self.args, **self.kwargs)
+            except JobCancelled:
+                return
+            except Exception as e:
+                if not self.cancelled:
+                    self.signals.failed.emit(self, str(e))
+                return
+            if not self.cancelled:
+                self.signals.finished.emit(self, result)
+        finally:
+            self.signals.done.emit(self)
+
+
+class JobRunner(QObject):
+    """
+    Verteilt Jobs auf einen QThreadPool. Je Kanal (z.B. 'indicators' oder 'import') ist nur der
+    zuletzt gestartete Job aktiv: Ein neuer Job bricht seinen Vorgänger ab, und Ergebnisse
+    veralteter Jobs werden verworfen. Alle Rückrufe laufen im GUI-Thread.
+    """
+
+    def __init__(self, max_threads=4, parent=None):
+        super().__init__(parent)
+        self.pool = QThreadPool()
+        self.pool.setMaxThreadCount(max_threads)
+        self._active = {}
+        self._callbacks = {}
+        # Auch abgebrochene Jobs laufen ggf. noch im Pool und müssen bis zum Ende referenziert bleiben
+        self._running = set()
+
+    def submit(self, channel, fn, *args, on_finished=None, on_failed=None, on_progress=None, **kwargs):
+        """Startet fn(job, *args, **kwargs) im Hintergrund und ersetzt einen laufenden Job desselben Kanals."""
+        self.cancel(channel)
+        job = Job(channel, fn, *args, **kwargs)
+        job.setAutoDelete(False)
+        job.signals.finished.connect(self._on_finished)
+        job.signals.failed.connect(self._on_failed)
+        job.signals.progress.connect(self._on_progress)
+        job.signals.done.connect(self._on_done)
+        self._running.add(job)
+        self._active[channel] = job
+        self._callbacks[job] = (on_finished, on_failed, on_progress)
+        self.pool.start(job)
+        return job
+
+    def is_running(self, channel):
+        return channel in self._active
+
+    def cancel(self, channel):
+        job = self._active.pop(channel, None)
+        if job is not None:
+            job.cancel()
+            self._callbacks.pop(job, None)
+
+    def shutdown(self, timeout_ms=5000):
+        """Bricht alle Jobs ab und wartet, bis die laufenden Threads beendet sind."""
+        for channel in list(self._active):
+            self.cancel(channel)
+        self.pool.waitForDone(timeout_ms)
+
+    def _take(self, job):
+        """Gibt die Rückrufe zurück, wenn job noch der aktive Job seines Kanals ist."""
+        if self._active.get(job.channel) is not job:
+            return None
+        return self._callbacks.get(job)
+
+    @pyqtSlot(object, object)
+    def _on_finished(self, job, result):
+        callbacks = self._take(job)
+        if callbacks is None:
+            return
+        del self._active[job.channel]
+        del self._callbacks[job]
+        if callbacks[0]:
+            callbacks[0](result)
+
+    @pyqtSlot(object, str)
+    def _on_failed(self, job, message):
+        callbacks = self._take(job)
+        if callbacks is None:
+            return
+        del self._active[job.channel]
+        del self._callbacks[job]
+        if callbacks[1]:
+            callbacks[1](message)
+
+    @pyqtSlot(object, int, int, str)
+    def _on_progress(self, job, done, total, text):
+        callbacks = self._take(job)
+        if callbacks and callbacks[2]:
+            callbacks[2](done, total, text)
+
+    @pyqtSlot(object)
+    def _on_done(self, job):
+        self._running.discard(job)
@@ -0,0 +1,292 @@
+"""
+Backtests einfacher Regeln mit gleitenden Durchschnitten über viele Symbole und Parameter (ohne GUI).
+
+Regel: Long, solange der schnelle gleitende Durchschnitt über dem langsamen liegt und (optional) die
+rollierende, annualisierte Volatilität höchstens vol_threshold beträgt; sonst keine Position.
+Das Signal eines Handelstags gilt ab dem nächsten Tag (Schlusskurs zu Schlusskurs, ohne Kosten).
+
+Aufruf:
+    python backtest.py --db stock_analysis.db --fast 5:50 --slow 60:250:4 --vol-threshold 0.25 0.4 inf \\
+        --top 20 --output sweep.csv
+
+Alle Fensterkombinationen eines Symbols entstehen aus einer gemeinsamen kumulierten Summe der Kurse;
+die Kennzahlen je Kombination sind Matrixprodukte über die Positionen. Die Symbole werden wie in
+batch_analytics.py in Blöcken auf einen Prozess-Pool verteilt.
+"""
+import argparse
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import dataclass
+import logging
+import os
+import sys
+import time
+import warnings
+
+import numpy as np
+import pandas as pd
+
+from financial_tools import TRADING_DAYS_PER_YEAR, FinancialTools
+from instrumentation import configure_logging
+from stock_data_manager import StockDataManager
+from storage_backends import open_storage
+
+logger = logging.getLogger(__name__)
+
+METRICS = ("annual_return", "volatility", "max_drawdown", "turnover")
+# Spalten der Rangliste, nach denen sortiert werden kann; kleinere Werte sind bei ASCENDING_METRICS besser
+RANK_COLUMNS = ("sharpe",) + METRICS + ("worst_drawdown",)
+ASCENDING_METRICS = ("volatility", "max_drawdown", "turnover", "worst_drawdown")
+
+
+@dataclass(frozen=True)
+class SweepGrid:
+    """Parameterraster: schnelle und langsame Fenster (Handelstage) und Volatilitätsgrenzen (inf: ohne Filter)."""
+    fast_windows: tuple
+    slow_windows: tuple
+    vol_thresholds: tuple = (np.inf,)
+    vol_window: int = 20
+
+    def __post_init__(self):
+        for name in ("fast_windows", "slow_windows", "vol_thresholds"):
+            values = tuple(sorted(set(getattr(self, name))))
+            if not values:
+                raise ValueError(f"{name} darf nicht leer sein.")
+            object.__setattr__(self, name, values)
+        if min(self.fast_windows + self.slow_windows) < 1 or self.vol_window < 2:
+            raise ValueError("Fenster müssen mindestens 1 (Volatilität: 2) Tage umfassen.")
+
+    @property
+    def shape(self):
+        return len(self.vol_thresholds), len(self.fast_windows), len(self.slow_windows)
+
+    @property
+    def filtered(self):
+        return any(np.isfinite(self.vol_thresholds))
+
+    def warmup(self):
+        """Index des ersten Kurses, an dem alle Durchschnitte (und ggf. die Volatilität) definiert sind."""
+        return max(max(self.fast_windows + self.slow_windows) - 1, self.vol_window if self.filtered else 0)
+
+
+def sweep_prices(prices, grid, combo_chunk=256):
+    """
+    Bewertet alle Kombinationen von grid für eine Kursreihe (Series oder Array, NaN wird übersprungen).
+    Alle Kombinationen verwenden denselben Zeitraum ab grid.warmup(). Gibt ein Dict mit einem Array der
+    Form grid.shape je Kennzahl aus METRICS zurück (NaN, wo fast >= slow) bzw. None bei zu wenigen Kursen:
+    annual_return (geometrisch), volatility (annualisiert), max_drawdown (Anteil), turnover (Positions-
+    wechsel je Jahr).
+    """
+    prices = np.asarray(prices, dtype='float64')
+    prices = prices[~np.isnan(prices)]
+    start = grid.warmup()
+    if len(prices) - start < 3:
+        return None
+
+    windows = np.array(sorted(set(grid.fast_windows + grid.slow_windows)))
+    sums = np.concatenate([[0.0], np.cumsum(prices)])
+    days = np.arange(start, len(prices) - 1)  # Signaltage; die Position gilt für die Rendite des Folgetags
+    # Alle Durchschnitte aus derselben kumulierten Summe: (Fenster x Tage)
+    averages = (sums[days + 1] - sums[days + 1 - windows[:, None]]) / windows[:, None]
+    fast_rows = np.searchsorted(windows, grid.fast_windows)
+    slow_rows = np.searchsorted(windows, grid.slow_windows)
+
+    returns = prices[days + 1] / prices[days] - 1
+    log_returns = np.log1p(returns)
+    years = len(days) / TRADING_DAYS_PER_YEAR
+    if grid.filtered:
+        # Rollierende Volatilität der vol_window Renditen bis zum Signaltag (wie calculate_volatility)
+        daily = FinancialTools.calculate_returns(pd.Series(prices), in_percent=False).to_numpy()
+        first = np.concatenate([[0.0], np.cumsum(daily)])
+        second = np.concatenate([[0.0], np.cumsum(daily * daily)])
+        window = grid.vol_window
+        total, squares = first[days] - first[days - window], second[days] - second[days - window]
+        variance = np.clip((squares - total * total / window) / (window - 1), 0, None)
+        volatility = np.sqrt(variance) * np.sqrt(TRADING_DAYS_PER_YEAR)
+
+    result = {metric: np.full(grid.shape, np.nan) for metric in METRICS}
+    pairs = np.array([(f, s) for f in range(len(fast_rows)) for s in range(len(slow_rows))
+                      if grid.fast_windows[f] < grid.slow_windows[s]], dtype=np.intp).reshape(-1, 2)
+    for first_pair in range(0, len(pairs), combo_chunk):
+        chunk = pairs[first_pair:first_pair + combo_chunk]
+        signal = averages[fast_rows[chunk[:, 0]]] > averages[slow_rows[chunk[:, 1]]]
+        for v, threshold in enumerate(grid.vol_thresholds):
+            position = signal if not np.isfinite(threshold) else signal & (volatility <= threshold)
+            weights = position.astype('float64')
+            # Positionen sind 0 oder 1: Summen der Strategierenditen als Matrix-Vektor-Produkte
+            total_log = weights @ log_returns
+            mean = weights @ returns / len(days)
+            mean_square = weights @ (returns * returns) / len(days)
+            variance = np.clip(mean_square - mean * mean, 0, None) * len(days) / (len(days) - 1)
+            equity = np.cumsum(weights * log_returns, axis=1)
+            peak = np.maximum(np.maximum.accumulate(equity, axis=1), 0.0)
+            changes = np.count_nonzero(position[:, 1:] != position[:, :-1], axis=1) + position[:, 0]
+
+            index = (v, chunk[:, 0], chunk[:, 1])
+            result["annual_return"][index] = np.expm1(total_log / years)
+            result["volatility"][index] = np.sqrt(variance * TRADING_DAYS_PER_YEAR)
+            result["max_drawdown"][index] = -np.expm1(-(peak - equity).max(axis=1))
+            result["turnover"][index] = changes / years
+    return result
+
+
+def ranked_table(results, grid, rank_by="sharpe"):
+    """
+    Fasst die Ergebnisse je Symbol ({Symbol: sweep_prices(...)}) zu einer Tabelle je Kombination
+    zusammen (Mittelwerte über die Symbole, dazu sharpe = annual_return / volatility je Symbol gemittelt
+    und worst_drawdown) und sortiert sie nach rank_by (siehe RANK_COLUMNS, beste zuerst).
+    """
+    if rank_by not in RANK_COLUMNS:
+        raise ValueError(f"Unbekannte Kennzahl für die Rangfolge: {rank_by} (möglich: {', '.join(RANK_COLUMNS)})")
+    vol_thresholds, fast, slow = np.meshgrid(grid.vol_thresholds, grid.fast_windows, grid.slow_windows,
+                                             indexing='ij')
+    table = pd.DataFrame({"fast": fast.ravel(), "slow": slow.ravel(), "vol_threshold": vol_thresholds.ravel()})
+    table = table.astype({"fast": "int64", "slow": "int64"})
+    if results:
+        stacked = {metric: np.stack([result[metric] for result in results.values()]) for metric in METRICS}
+        with np.errstate(divide='ignore', invalid='ignore'), warnings.catch_warnings():
+            # Kombinationen ohne Ergebnis bei allen Symbolen bleiben NaN
+            warnings.simplefilter("ignore", category=RuntimeWarning)
+            for metric in METRICS:
+                table[metric] = np.nanmean(stacked[metric], axis=0).ravel()
+            sharpe = stacked["annual_return"] / stacked["volatility"]
+            sharpe[~np.isfinite(sharpe)] = np.nan
+            table["sharpe"] = np.nanmean(sharpe, axis=0).ravel()
+            table["worst_drawdown"] = np.nanmax(stacked["max_drawdown"], axis=0).ravel()
+        table["symbols"] = np.count_nonzero(~np.isnan(stacked["annual_return"]), axis=0).ravel()
+    else:
+        for column in METRICS + ("sharpe", "worst_drawdown", "symbols"):
+            table[column] = np.nan
+    table = table[table["fast"] < table["slow"]]
+    table = table.sort_values(rank_by, ascending=rank_by in ASCENDING_METRICS, na_position="last", kind="stable")
+    return table.reset_index(drop=True).rename_axis("rank")
+
+
+# Zustand eines Worker-Prozesses: eigener, nur lesender Zugriff
+_worker = {}
+
+
+def _init_worker(storage_path, start_date, end_date, log_level):
+    configure_logging(log_level)
+    storage = open_storage(storage_path, read_only=True)
+    if not storage.is_open:
+        raise RuntimeError(f"Datenbank '{storage_path}' konnte nicht gelesen werden.")
+    _worker.update(manager=StockDataManager(storage=storage, cache_bytes=0), start_date=start_date,
+                   end_date=end_date)
+
+
+def _run_chunk(symbols, grid):
+    """Worker: Backtest eines Symbolblocks. Gibt (Ergebnisse je Symbol, Fehler je Symbol) zurück."""
+    manager = _worker["manager"]
+    results, failed = {}, {}
+    for symbol in symbols:
+        try:
+            data = manager.get_stock_data(symbol, _worker["start_date"], _worker["end_date"])
+            prices = FinancialTools._price_series(data) if not data.empty else None
+            result = sweep_prices(prices, grid) if prices is not None else None
+            if result is None:
+                failed[symbol] = "Zu wenige Kurse für die Fenster im Zeitraum."
+            else:
+                results[symbol] = result
+        except Exception as e:
+            failed[symbol] = str(e)
+    return results, failed
+
+
+def run_sweep(storage_path, symbols, grid, start_date=None, end_date=None, workers=None, chunk_size=25,
+              rank_by="sharpe", progress=None, log_level=None):
+    """
+    Bewertet grid für alle symbols in einem Prozess-Pool mit workers Prozessen (Standard: alle
+    CPU-Kerne). progress(erledigt, gesamt) wird nach jedem Block aufgerufen.
+    Gibt (Rangliste wie ranked_table, Ergebnisse je Symbol, Fehler je Symbol) zurück.
+    """
+    if rank_by not in RANK_COLUMNS:
+        raise ValueError(f"Unbekannte Kennzahl für die Rangfolge: {rank_by} (möglich: {', '.join(RANK_COLUMNS)})")
+    symbols = list(dict.fromkeys(symbol.upper() for symbol in symbols))
+    workers = workers or os.cpu_count() or 1
+    chunks = [symbols[i:i + chunk_size] for i in range(0, len(symbols), chunk_size)]
+    results, failed = {}, {}
+    started = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=min(workers, max(len(chunks), 1)), initializer=_init_worker,
+                             initargs=(str(storage_path), start_date, end_date,
+                                       log_level or logging.getLevelName(logging.getLogger().level))) as pool:
+        futures = [pool.submit(_run_chunk, chunk, grid) for chunk in chunks]
+        for done, future in enumerate(as_completed(futures), start=1):
+            chunk_results, chunk_failed = future.result()
+            results.update(chunk_results)
+            failed.update(chunk_failed)
+            if progress:
+                progress(done, len(chunks))
+    elapsed = time.perf_counter() - started
+    combinations = int(np.prod(grid.shape))
+    logger.info("%d/%d Symbole x %d Kombinationen in %.1f s (%d Prozesse).", len(results), len(symbols),
+                combinations, elapsed, workers)
+    return ranked_table(results, grid, rank_by), results, failed
+
+
+def _windows(text):
+    """'20' oder 'START:STOP[:STEP]' (STOP eingeschlossen) als Liste von Fenstern."""
+    parts = [int(part) for part in text.split(":")]
+    if len(parts) == 1:
+        return parts
+    if len(parts) not in (2, 3):
+        raise argparse.ArgumentTypeError(f"Ungültige Fensterangabe: {text}")
+    return list(range(parts[0], parts[1] + 1, parts[2] if len(parts) == 3 else 1))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Gleitende-Durchschnitte-Regeln über viele Symbole testen (ohne GUI).")
+    parser.add_argument("--db", default="stock_analysis.db",
+                        help="SQLite-Datenbank oder Verzeichnis einer Spaltenablage (Standard: stock_analysis.db)")
+    parser.add_argument("--symbols", nargs="+", help="Symbole (Standard: alle Symbole der Datenbank)")
+    parser.add_argument("--start", help="Startdatum (YYYY-MM-DD)")
+    parser.add_argument("--end", help="Enddatum (YYYY-MM-DD)")
+    parser.add_argument("--fast", nargs="+", type=_windows, default=[[5, 10, 20, 50]],
+                        help="Schnelle Fenster, z.B. 5 10 20 oder 2:51")
+    parser.add_argument("--slow", nargs="+", type=_windows, default=[[50, 100, 200]],
+                        help="Langsame Fenster, z.B. 100 200 oder 52:250:4")
+    parser.add_argument("--vol-threshold", nargs="+", type=float, default=[np.inf],
+                        help="Höchste annualisierte Volatilität für eine Position, z.B. 0.3 inf (inf: ohne Filter)")
+    parser.add_argument("--vol-window", type=int, default=20, help="Fenster der Volatilität (Standard: 20)")
+    parser.add_argument("--rank-by", default="sharpe", choices=RANK_COLUMNS, help="Kennzahl der Rangfolge")
+    parser.add_argument("--top", type=int, default=20, help="Anzahl angezeigter Kombinationen")
+    parser.add_argument("--output", help="Vollständige Rangliste als CSV-Datei")
+    parser.add_argument("--workers", type=int, help="Anzahl Prozesse (Standard: alle CPU-Kerne)")
+    parser.add_argument("--chunk-size", type=int, default=25, help="Symbole je Arbeitspaket")
+    parser.add_argument("--log-level", default="INFO", help="Protokollstufe (Standard: INFO)")
+    args = parser.parse_args(argv)
+    configure_logging(args.log_level)
+
+    try:
+        grid = SweepGrid(tuple(w for ws in args.fast for w in ws), tuple(w for ws in args.slow for w in ws),
+                         tuple(args.vol_threshold), args.vol_window)
+    except ValueError as e:
+        parser.error(str(e))
+
+    symbols = args.symbols
+    if not symbols:
+        storage = open_storage(args.db, read_only=True)
+        if not storage.is_open:
+            logger.error("Datenbank '%s' konnte nicht geöffnet werden.", args.db)
+            return 1
+        symbols = storage.symbols()
+        storage.close()
+
+    try:
+        table, results, failed = run_sweep(args.db, symbols, grid, args.start, args.end, workers=args.workers,
+                                           chunk_size=args.chunk_size, rank_by=args.rank_by,
+                                           log_level=args.log_level,
+                                           progress=lambda done, total: logger.debug("%d/%d Blöcke fertig", done, total))
+    except ValueError as e:
+        parser.error(str(e))
+    for symbol, message in sorted(failed.items()):
+        logger.warning("%s: %s", symbol, message)
+    if args.output:
+        table.to_csv(args.output)
+        logger.info("Rangliste gespeichert in %s", args.output)
+    with pd.option_context("display.width", 160, "display.max_columns", 20):
+        print(table.head(args.top).to_string(float_format=lambda value: f"{value:.4f}"))
+    return 0 if results or not symbols else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,309 @@
+"""
+Headless-Batchlauf für Indikatoren über viele Symbole (ohne PyQt6/matplotlib).
+
+Aufruf:
+    python batch_analytics.py --db stock_analysis.db --indicators returns ma:20 ma:200 volatility:20 beta:SPY:60 \\
+        --output indikatoren.csv
+    python batch_analytics.py --db stock_analysis.db --symbols AAPL MSFT --indicators ma:50 beta:60 --to-db
+
+Die Symbole werden in Blöcken auf einen Prozess-Pool verteilt; jeder Prozess öffnet die Datenbank
+bzw. Spaltenablage einmal nur lesend. Geschrieben wird ausschließlich im Hauptprozess, blockweise in
+eine CSV- oder Parquet-Datei oder in die Tabelle 'indicator_values' der Datenbank.
+Gleitender Durchschnitt, Volatilität und Beta werden aus bereits gespeicherten, aktuellen Reihen
+gelesen (siehe StockDataManager.get_indicator) und nur sonst berechnet.
+"""
+import argparse
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import dataclass, field
+import logging
+import os
+from pathlib import Path
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+from financial_tools import DEFAULT_MARKET_SYMBOL, IndicatorContext, IndicatorSpec, compute_indicators
+from instrumentation import configure_logging
+from stock_data_manager import PERSISTED_INDICATORS, StockDataManager
+from storage_backends import open_storage
+
+logger = logging.getLogger(__name__)
+
+# Zustand eines Worker-Prozesses: eigener, nur lesender Zugriff und gecachte Marktdaten
+_worker = {}
+
+DEFAULT_INDICATORS = ["returns", "ma:20", "volatility:20", "beta:60"]
+
+
+def _init_worker(storage_path, start_date, end_date, log_level):
+    configure_logging(log_level)
+    storage = open_storage(storage_path, read_only=True)
+    if not storage.is_open:
+        raise RuntimeError(f"Datenbank '{storage_path}' konnte nicht gelesen werden.")
+    # Ohne Cache: jedes Symbol wird genau einmal gelesen
+    _worker.update(manager=StockDataManager(storage=storage, cache_bytes=0),
+                   start_date=start_date, end_date=end_date, market_data={})
+
+
+def _run_chunk(symbols, specs, encode):
+    """
+    Worker: berechnet die Indikatoren eines Symbolblocks und bereitet sie mit encode(ergebnisse, specs)
+    für die Ausgabe auf (z.B. als CSV-Text), damit auch das Formatieren parallel läuft.
+    Gibt (aufbereitete Ergebnisse, Zeilen je Symbol, Fehler je Symbol) zurück.
+    """
+    manager = _worker["manager"]
+    start_date, end_date = _worker["start_date"], _worker["end_date"]
+    market_data = _worker["market_data"]
+    for market in {spec.market for spec in specs if spec.market}:
+        if market not in market_data:
+            market_data[market] = manager.get_stock_data(market, start_date, end_date)
+
+    results, failed = {}, {}
+    for symbol in symbols:
+        try:
+            data = manager.get_stock_data(symbol, start_date, end_date)
+            if data.empty:
+                failed[symbol] = "Keine Kursdaten im Zeitraum."
+                continue
+            context = IndicatorContext(data, stored=lambda spec: manager.get_indicator(symbol, spec, start_date,
+                                                                                      end_date))
+            results[symbol] = compute_indicators(context, specs, market_data)
+        except Exception as e:
+            failed[symbol] = str(e)
+    return encode(results, specs), {symbol: len(frame) for symbol, frame in results.items()}, failed
+
+
+# Ausgaben: encode(ergebnisse, specs) läuft im Worker-Prozess, write(aufbereitet) im Hauptprozess
+
+
+class CsvSink:
+    """Schreibt die Ergebnisse blockweise in eine CSV-Datei (Spalten: symbol, date, Indikatoren)."""
+
+    def __init__(self, path, specs):
+        self._file = open(path, "w", encoding="utf-8", newline="")
+        self._file.write(",".join(_columns(specs)) + "\n")
+
+    @staticmethod
+    def encode(results, specs):
+        return _long_frame(results, specs).to_csv(None, header=False, index=False, date_format="%Y-%m-%d")
+
+    def write(self, encoded):
+        self._file.write(encoded)
+
+    def close(self):
+        self._file.close()
+
+
+class ParquetSink:
+    """Schreibt die Ergebnisse blockweise als Row-Groups in eine Parquet-Datei (benötigt pyarrow)."""
+
+    def __init__(self, path, specs):
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError as e:
+            raise RuntimeError("Für Parquet-Ausgaben wird pyarrow benötigt (pip install pyarrow).") from e
+        self._pa = pa
+        schema = pa.schema([("symbol", pa.string()), ("date", pa.timestamp("ns"))]
+                           + [(spec.key, pa.float64()) for spec in specs])
+        self._writer = pq.ParquetWriter(path, schema)
+
+    @staticmethod
+    def encode(results, specs):
+        return _long_frame(results, specs)
+
+    def write(self, encoded):
+        self._writer.write_table(self._pa.Table.from_pandas(encoded, schema=self._writer.schema,
+                                                            preserve_index=False))
+
+    def close(self):
+        self._writer.close()
+
+
+class StorageSink:
+    """
+    Schreibt die Ergebnisse in 'indicator_values' eines Speicher-Backends (eine Transaktion je Block).
+    Möglich sind nur Indikatoren, die StockDataManager.get_indicator speichert (PERSISTED_INDICATORS).
+    """
+
+    def __init__(self, path, specs):
+        unsupported = [spec.key for spec in specs if spec.name not in PERSISTED_INDICATORS]
+        if unsupported:
+            raise ValueError(f"Nicht speicherbar: {', '.join(unsupported)} "
+                             f"(möglich: {', '.join(PERSISTED_INDICATORS)})")
+        self.storage = open_storage(path)
+        if not self.storage.is_open:
+            raise RuntimeError(f"Datenbank '{path}' konnte nicht zum Schreiben geöffnet werden.")
+        self.keys = [spec.key for spec in specs]
+
+    @staticmethod
+    def encode(results, specs):
+        return results
+
+    def write(self, results):
+        with self.storage.transaction():
+            for symbol, frame in results.items():
+                days = frame.index.to_numpy().astype('datetime64[D]').astype(np.int64)
+                for key in self.keys:
+                    values = frame[key].to_numpy(dtype='float64')
+                    valid = ~np.isnan(values)
+                    if valid.any():
+                        self.storage.insert_indicator_values(symbol, key, days[valid], values[valid])
+
+    def close(self):
+        self.storage.close()
+
+
+def _columns(specs):
+    return ["symbol", "date"] + [spec.key for spec in specs]
+
+
+def _long_frame(results, specs):
+    """Hängt die Ergebnisse aller Symbole eines Blocks untereinander (Spalten symbol und date vorn)."""
+    columns = _columns(specs)
+    frames = [frame.rename_axis("date").reset_index().assign(symbol=symbol) for symbol, frame in results.items()]
+    if not frames:
+        return pd.DataFrame(columns=columns)
+    return pd.concat(frames, ignore_index=True).reindex(columns=columns)
+
+
+def open_sink(output, specs, storage_path=None):
+    """Wählt das Ausgabeformat anhand der Dateiendung (.csv, .parquet) bzw. die Datenbank (output=None)."""
+    if output is None:
+        return StorageSink(storage_path, specs)
+    suffix = Path(output).suffix.lower()
+    if suffix == ".csv":
+        return CsvSink(output, specs)
+    if suffix in (".parquet", ".pq"):
+        return ParquetSink(output, specs)
+    raise ValueError(f"Unbekanntes Ausgabeformat: {output} (.csv oder .parquet)")
+
+
+@dataclass
+class BatchReport:
+    """Ergebnis von run_batch."""
+    succeeded: list = field(default_factory=list)
+    failed: dict = field(default_factory=dict)  # Symbol -> Fehlermeldung
+    rows: int = 0
+    elapsed: float = 0.0
+
+    @property
+    def symbols_per_second(self):
+        return len(self.succeeded) / self.elapsed if self.elapsed else 0.0
+
+
+def run_batch(storage_path, symbols, specs, sink, start_date=None, end_date=None, workers=None, chunk_size=50,
+              progress=None, log_level=None):
+    """
+    Berechnet die Indikatoren specs für alle symbols in einem Prozess-Pool mit workers Prozessen
+    (Standard: alle CPU-Kerne). Die Worker bereiten jeden Block mit sink.encode auf, der
+    Hauptprozess schreibt ihn mit sink.write.
+    progress(erledigt, gesamt) wird nach jedem Block aufgerufen. Gibt einen BatchReport zurück.
+    """
+    symbols = list(dict.fromkeys(symbol.upper() for symbol in symbols))
+    workers = workers or os.cpu_count() or 1
+    chunks = [symbols[i:i + chunk_size] for i in range(0, len(symbols), chunk_size)]
+    report = BatchReport()
+    started = time.perf_counter()
+    done = 0
+    with ProcessPoolExecutor(max_workers=min(workers, max(len(chunks), 1)), initializer=_init_worker,
+                             initargs=(str(storage_path), start_date, end_date,
+                                       log_level or logging.getLevelName(logging.getLogger().level))) as pool:
+        futures = [pool.submit(_run_chunk, chunk, specs, sink.encode) for chunk in chunks]
+        for future in as_completed(futures):
+            encoded, rows, failed = future.result()
+            sink.write(encoded)
+            report.succeeded.extend(rows)
+            report.failed.update(failed)
+            report.rows += sum(rows.values())
+            done += 1
+            if progress:
+                progress(done, len(chunks))
+    report.elapsed = time.perf_counter() - started
+    logger.info("%d/%d Symbole, %d Zeilen in %.1f s (%.1f Symbole/s, %d Prozesse).", len(report.succeeded),
+                len(symbols), report.rows, report.elapsed, report.symbols_per_second, workers)
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Indikatoren für viele Symbole parallel berechnen (ohne GUI).")
+    parser.add_argument("--db", default="stock_analysis.db",
+                        help="SQLite-Datenbank oder Verzeichnis einer Spaltenablage (Standard: stock_analysis.db)")
+    parser.add_argument("--symbols", nargs="+", help="Symbole (Standard: alle Symbole der Datenbank)")
+    parser.add_argument("--symbols-file", help="CSV-Datei mit Spalte 'Symbol' (z.B. stocks.csv)")
+    parser.add_argument("--start", help="Startdatum (YYYY-MM-DD)")
+    parser.add_argument("--end", help="Enddatum (YYYY-MM-DD)")
+    parser.add_argument("--indicators", nargs="+",
+                        help="z.B. returns cumulative_returns ma:20 volatility:20 beta:SPY:60 (Standard: "
+                             f"{' '.join(DEFAULT_INDICATORS)}; mit --to-db nur {', '.join(PERSISTED_INDICATORS)})")
+    parser.add_argument("--market", default=DEFAULT_MARKET_SYMBOL, help="Markt-Symbol für 'beta:FENSTER'")
+    parser.add_argument("--workers", type=int, help="Anzahl Prozesse (Standard: alle CPU-Kerne)")
+    parser.add_argument("--chunk-size", type=int, default=50, help="Symbole je Arbeitspaket")
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument("--output", help="Ergebnisdatei (.csv oder .parquet)")
+    target.add_argument("--to-db", action="store_true", help="Ergebnisse in die Tabelle 'indicator_values' schreiben")
+    parser.add_argument("--log-level", default="INFO", help="Protokollstufe (Standard: INFO)")
+    args = parser.parse_args(argv)
+    configure_logging(args.log_level)
+
+    indicators = args.indicators or DEFAULT_INDICATORS
+    try:
+        specs = list(dict.fromkeys(IndicatorSpec.parse(text, args.market.upper()) for text in indicators))
+    except ValueError as e:
+        parser.error(str(e))
+    if args.to_db:
+        if args.indicators is None:
+            specs = [spec for spec in specs if spec.name in PERSISTED_INDICATORS]
+        unsupported = [spec.key for spec in specs if spec.name not in PERSISTED_INDICATORS]
+        if unsupported:
+            # Nur diese Reihen liest StockDataManager.get_indicator wieder aus der Datenbank
+            parser.error(f"--to-db speichert nur {', '.join(PERSISTED_INDICATORS)}; "
+                         f"nicht möglich: {', '.join(unsupported)}.")
+    if args.to_db and (args.start or args.end):
+        # Gespeicherte Reihen umfassen immer die gesamte Historie (siehe StockDataManager.get_indicator)
+        parser.error("--to-db berechnet die gesamte Historie; --start/--end sind dabei nicht möglich.")
+
+    markets = sorted({spec.market for spec in specs if spec.market})
+    if markets:
+        storage = open_storage(args.db, read_only=True)
+        missing = [market for market in markets if storage.is_open and storage.last_stored_date(market) is None]
+        storage.close()
+        if missing and args.indicators is not None:
+            parser.error(f"Keine Kurse für den Markt {', '.join(missing)} gespeichert (siehe --market).")
+        if missing:
+            # Sonst enthielte die Beta-Spalte der Standardindikatoren nur NaN
+            logger.warning("Keine Kurse für den Markt %s gespeichert; Beta wird nicht berechnet.", ", ".join(missing))
+            specs = [spec for spec in specs if spec.market not in missing]
+
+    if args.symbols:
+        symbols = args.symbols
+    elif args.symbols_file:
+        symbols = pd.read_csv(args.symbols_file)['Symbol'].astype(str).tolist()
+    else:
+        storage = open_storage(args.db, read_only=True)
+        if not storage.is_open:
+            logger.error("Datenbank '%s' konnte nicht geöffnet werden.", args.db)
+            return 1
+        symbols = storage.symbols()
+        storage.close()
+
+    try:
+        sink = open_sink(args.output, specs, storage_path=args.db)
+    except (RuntimeError, ValueError) as e:
+        logger.error("%s", e)
+        return 1
+    try:
+        report = run_batch(args.db, symbols, specs, sink, args.start, args.end, workers=args.workers,
+                           chunk_size=args.chunk_size, log_level=args.log_level,
+                           progress=lambda done, total: logger.debug("%d/%d Blöcke fertig", done, total))
+    finally:
+        sink.close()
+    for symbol, message in sorted(report.failed.items()):
+        logger.warning("%s: %s", symbol, message)
+    return 0 if report.succeeded or not symbols else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
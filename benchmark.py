@@ -0,0 +1,446 @@
+"""
+Offline-Benchmarks mit synthetischen Kursdaten (ohne Netzwerk).
+
+Aufruf:
+    python benchmark.py --preset smoke
+    python benchmark.py --preset default --storage columnar --output ergebnis.json
+    python benchmark.py --preset default --compare baseline.json
+    python benchmark.py --preset stress --no-gui
+
+Die Ergebnisse werden als JSON geschrieben (Median, Minimum und alle Einzelmessungen je Szenario
+sowie Git-Commit, Versionen und Konfiguration), sodass sich Läufe verschiedener Commits mit
+--compare vergleichen lassen. Mit --metrics werden zusätzlich die Messwerte je Operation
+(siehe instrumentation.py) gespeichert; die Zeitmessung verlängert die Szenarien geringfügig.
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+from correlation import CorrelationEngine
+from financial_tools import FinancialTools
+from instrumentation import METRICS, configure_logging
+from stock_data_manager import StockDataManager
+from storage_backends import ColumnarBackend, SQLiteBackend
+from synthetic_data import DEFAULT_END, SyntheticDataSource, populate, synthetic_symbols
+
+
+PRESETS = {
+    "smoke": {"symbols": 20, "years": 2, "queries": 50, "repeats": 3},
+    "default": {"symbols": 500, "years": 10, "queries": 500, "repeats": 5},
+    "stress": {"symbols": 5000, "years": 30, "queries": 2000, "repeats": 3},
+}
+
+STORAGES = ("sqlite-legacy", "sqlite-compact", "columnar")
+
+# Marktindex für Beta-Berechnungen (wird wie die übrigen Symbole synthetisch erzeugt)
+MARKET_SYMBOL = "SPY"
+
+# Symbole der 'warm'-Abfragen; ihre Historien passen auch im Stresslauf in den Standard-Cache
+HOT_SYMBOLS = 50
+
+# Obergrenze der Symbole für die Panel-Kernels, damit der Stresslauf im Speicher bleibt
+PANEL_SYMBOLS = 1000
+
+# Anzahl gleichzeitig lesender Threads im Nebenläufigkeits-Szenario
+READER_COUNTS = (1, 2, 4, 8)
+
+# Symbole mit 1-Minuten-Balken im Intraday-Szenario (je die letzten 30 Tage, wie bei yfinance)
+INTRADAY_SYMBOLS = 20
+
+
+def _measure(fn, repeats):
+    """Führt fn repeats-mal aus und gibt die Laufzeiten in Sekunden zurück."""
+    runs = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        fn()
+        runs.append(time.perf_counter() - started)
+    return runs
+
+
+def _result(runs, **extra):
+    return {"median_s": statistics.median(runs), "min_s": min(runs), "runs": runs, **extra}
+
+
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _open_storage(storage, workdir):
+    if storage == "columnar":
+        return ColumnarBackend(os.path.join(workdir, "benchmark_columns"))
+    layout = storage.split("-", 1)[1]
+    return SQLiteBackend(os.path.join(workdir, "benchmark.db"), layout=layout)
+
+
+def bench_bulk_insert(manager, symbols):
+    report = populate(manager, symbols)
+    if report.failed:
+        raise RuntimeError(f"Synthetische Daten konnten nicht gespeichert werden: {report.failed}")
+    return _result([report.elapsed], rows=report.rows, rows_per_second=report.rows_per_second,
+                   symbols_per_second=report.symbols_per_second)
+
+
+def bench_range_queries(manager, symbols, years, queries, repeats, seed):
+    """
+    Zufällige Ein-Jahres-Zeiträume. 'cold' leert den Cache vor jeder Abfrage und verteilt die
+    Abfragen über alle Symbole; 'warm' fragt nur HOT_SYMBOLS Symbole ab, die in den Cache passen.
+    """
+    rng = np.random.default_rng(seed)
+    last = pd.Timestamp(DEFAULT_END)
+    first = last - pd.DateOffset(years=years)
+
+    def random_requests(universe):
+        requests = []
+        for symbol in rng.choice(universe, queries):
+            start = first + (last - first - pd.Timedelta(days=365)) * rng.random()
+            requests.append((symbol, start.strftime("%Y-%m-%d"),
+                             (start + pd.Timedelta(days=365)).strftime("%Y-%m-%d")))
+        return requests
+
+    cold_requests = random_requests(symbols)
+    warm_requests = random_requests(symbols[:HOT_SYMBOLS])
+
+    def cold():
+        for symbol, start, end in cold_requests:
+            manager.clear_cache()
+            manager.get_stock_data(symbol, start, end)
+
+    def warm():
+        for symbol, start, end in warm_requests:
+            manager.get_stock_data(symbol, start, end)
+
+    cold_runs = _measure(cold, repeats)
+    warm()
+    warm_runs = _measure(warm, repeats)
+    return {
+        "get_stock_data_cold": _result(cold_runs, queries=queries),
+        "get_stock_data_warm": _result(warm_runs, queries=queries, symbols=min(len(symbols), HOT_SYMBOLS)),
+    }
+
+
+def bench_long_range(manager, symbols, queries, repeats, seed):
+    """Gesamte Historie zufälliger Symbole ohne Cache: Tageskurse gegenüber Monatswerten (Übersichtsdiagramm)."""
+    requests = np.random.default_rng(seed).choice(symbols, queries)
+    results = {}
+    for resolution in ("daily", "monthly"):
+        rows = []
+
+        def query():
+            rows.clear()
+            for symbol in requests:
+                manager.clear_cache()
+                rows.append(len(manager.get_stock_data(symbol, resolution=resolution)))
+
+        runs = _measure(query, repeats)
+        results[f"get_stock_data_full_{resolution}"] = _result(runs, queries=queries,
+                                                                 rows_per_query=statistics.mean(rows))
+    return results
+
+
+def bench_price_matrix(manager, symbols, repeats):
+    runs = _measure(lambda: manager.get_price_matrix(symbols, as_array=True), repeats)
+    return _result(runs, symbols=len(symbols))
+
+
+def bench_financial_tools(manager, symbols, repeats):
+    """Alle öffentlichen FinancialTools-Funktionen: Einzelreihe (längste Historie) und Panel."""
+    stock = max((manager.get_stock_data(symbol) for symbol in symbols[:20]), key=len)
+    market = manager.get_stock_data(MARKET_SYMBOL)
+    panel_symbols = symbols[:PANEL_SYMBOLS]
+    panel = manager.get_price_matrix(panel_symbols, as_array=True).to_frame()
+    market_panel = market['adj_close'].reindex(panel.index)
+
+    functions = {
+        "calculate_returns": lambda: FinancialTools.calculate_returns(stock),
+        "calculate_cumulative_returns": lambda: FinancialTools.calculate_cumulative_returns(stock),
+        "calculate_moving_average": lambda: FinancialTools.calculate_moving_average(stock, window=20),
+        "calculate_volatility": lambda: FinancialTools.calculate_volatility(stock, window=20),
+        "calculate_beta": lambda: FinancialTools.calculate_beta(stock, market, window=60),
+        "calculate_returns_panel": lambda: FinancialTools.calculate_returns_panel(panel),
+        "calculate_cumulative_returns_panel": lambda: FinancialTools.calculate_cumulative_returns_panel(panel),
+        "calculate_moving_average_panel": lambda: FinancialTools.calculate_moving_average_panel(panel, window=20),
+        "calculate_volatility_panel": lambda: FinancialTools.calculate_volatility_panel(panel, window=20),
+        "calculate_beta_panel": lambda: FinancialTools.calculate_beta_panel(panel, market_panel, window=60),
+    }
+    results = {}
+    for name, fn in functions.items():
+        rows, columns = (panel.shape if name.endswith("_panel") else (len(stock), 1))
+        results[f"financial_tools.{name}"] = _result(_measure(fn, repeats), rows=rows, columns=columns)
+    return results
+
+
+def bench_correlation(manager, symbols, repeats):
+    """Korrelationsmatrix aller Symbole über das letzte Jahr (Summen aufbauen, Matrix ableiten)."""
+    engine = CorrelationEngine(manager)
+    results = {}
+    stats = []
+
+    def build():
+        stats.append(engine.statistics(symbols, end_date=DEFAULT_END, window=252))
+
+    results["correlation.statistics"] = _result(_measure(build, repeats), symbols=len(symbols))
+    runs = _measure(lambda: engine.correlation(stats[-1]), repeats)
+    results["correlation.correlation"] = _result(runs, symbols=len(symbols))
+    for item in stats:
+        item.close()
+    return results
+
+
+def bench_concurrent_reads(manager, symbols, queries, repeats, seed):
+    """
+    Durchsatz von get_stock_data (ohne Cache, gesamte Historie zufälliger Symbole) mit 1, 2, 4 und
+    8 lesenden Threads, danach mit 4 Lesern während eines Imports (repair) im Hintergrund.
+    Ob mehr Leser den Durchsatz erhöhen, hängt von der Zahl der CPU-Kerne ab (siehe ReaderPool);
+    sie wird daher mit ausgegeben.
+    """
+    rng = np.random.default_rng(seed)
+    requests = list(rng.choice(symbols, queries))
+    cache_bytes, manager.cache_bytes = manager.cache_bytes, 0
+
+    def read_all(readers):
+        def work(part):
+            for symbol in part:
+                manager.get_stock_data(symbol)
+        threads = [threading.Thread(target=work, args=(requests[i::readers],)) for i in range(readers)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    results = {}
+    try:
+        for readers in READER_COUNTS:
+            runs = _measure(lambda: read_all(readers), repeats)
+            results[f"concurrent_reads.{readers}"] = _result(
+                runs, readers=readers, queries=queries, queries_per_second=queries / statistics.median(runs),
+                cpus=os.cpu_count())
+
+        importing = threading.Thread(target=manager.fetch_and_store_many,
+                                     args=(symbols[:max(1, len(symbols) // 4)],),
+                                     kwargs={"period": "max", "repair": True})
+        started = time.perf_counter()
+        importing.start()
+        read_all(4)
+        runs = [time.perf_counter() - started]
+        importing.join()
+        results["concurrent_reads.during_import"] = _result(runs, readers=4, queries=queries,
+                                                             queries_per_second=queries / runs[0],
+                                                             cpus=os.cpu_count())
+    finally:
+        manager.cache_bytes = cache_bytes
+    return results
+
+
+def bench_intraday(manager, symbols, repeats):
+    """
+    1-Minuten-Balken für bis zu INTRADAY_SYMBOLS Symbole speichern (in Abschnitten von 7 Tagen wie bei
+    yfinance) und je Symbol die letzte Woche als NumPy-Arrays lesen; dazu der Speicherbedarf je Balken.
+    """
+    if manager.intraday is None:
+        return {"intraday": {"skipped": "Keine Intraday-Ablage vorhanden."}}
+    symbols = symbols[:INTRADAY_SYMBOLS]
+    started = time.perf_counter()
+    for symbol in symbols:
+        manager.fetch_and_store_data(symbol, period="max", interval="1m")
+    store_runs = [time.perf_counter() - started]
+    bars = sum(len(manager.get_intraday_data(symbol, "1m", as_arrays=True)[0]) for symbol in symbols)
+
+    week_start, today = (pd.Timestamp.today() - pd.Timedelta(days=7)).strftime("%Y-%m-%d"), pd.Timestamp.today().strftime("%Y-%m-%d")
+
+    def read_week():
+        for symbol in symbols:
+            manager.get_intraday_data(symbol, "1m", week_start, today, as_arrays=True)
+
+    return {
+        "intraday.store_1m": _result(store_runs, symbols=len(symbols), bars=bars,
+                                     bytes_per_bar=manager.intraday.size_bytes(interval="1m") / max(bars, 1)),
+        "intraday.read_week": _result(_measure(read_week, repeats), symbols=len(symbols)),
+    }
+
+
+def bench_gui(manager, symbols, repeats):
+    """Headless-Rendering: Symbolwechsel bis der sichtbare Tab gezeichnet ist, danach alle Tabs."""
+    os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+    try:
+        from PyQt6.QtWidgets import QApplication
+        from main_gui import StockAnalyzer
+    except ImportError as e:
+        return {"gui": {"skipped": f"PyQt6/matplotlib nicht verfügbar: {e}"}}
+
+    app = QApplication.instance() or QApplication(sys.argv[:1])
+
+    def settle(window):
+        # Die Datenbank öffnet das Fenster erst nach dem Anzeigen im Hintergrund (ready)
+        while not window.ready or window.jobs.is_running("indicators"):
+            app.processEvents()
+            time.sleep(0.001)
+        app.processEvents()
+
+    window = StockAnalyzer(db_manager=manager)
+    window.market_symbol_input.setText(MARKET_SYMBOL)
+    window.start_date_edit.setDate(window.start_date_edit.date().addYears(-100))
+    window.end_date_edit.setDate(window.end_date_edit.date().addYears(100))
+    window.show()
+    settle(window)
+
+    def switch_symbol(index=[0]):
+        index[0] += 1
+        window.symbol_combo.setCurrentText(symbols[index[0] % min(len(symbols), 10)])
+        settle(window)
+
+    def render_all_tabs():
+        window.plot_all_tabs()
+        settle(window)
+        for i in range(window.tabs.count()):
+            window.tabs.setCurrentIndex(i)
+            app.processEvents()
+        window.tabs.setCurrentIndex(0)
+        app.processEvents()
+
+    switch_runs = _measure(switch_symbol, repeats)
+    render_runs = _measure(render_all_tabs, repeats)
+    window.jobs.shutdown()
+    window.hide()
+    window.deleteLater()
+    app.processEvents()
+    return {
+        "gui.plot_all_tabs_visible_tab": _result(switch_runs),
+        "gui.render_all_tabs": _result(render_runs),
+    }
+
+
+def run(config, storage, workdir, gui=True, log=print):
+    symbols = synthetic_symbols(config["symbols"])
+    manager = StockDataManager(storage=_open_storage(storage, workdir),
+                               data_source=SyntheticDataSource(symbols + [MARKET_SYMBOL], config["years"],
+                                                               seed=config["seed"]))
+    results = {}
+    try:
+        log(f"Speichere {len(symbols)} Symbole x {config['years']} Jahre ...")
+        results["bulk_insert"] = bench_bulk_insert(manager, symbols + [MARKET_SYMBOL])
+        log("Zeitraumabfragen ...")
+        results.update(bench_range_queries(manager, symbols, config["years"], config["queries"],
+                                           config["repeats"], config["seed"]))
+        results.update(bench_long_range(manager, symbols, config["queries"], config["repeats"], config["seed"]))
+        log("Kursmatrix ...")
+        results["get_price_matrix"] = bench_price_matrix(manager, symbols, config["repeats"])
+        log("FinancialTools ...")
+        results.update(bench_financial_tools(manager, symbols, config["repeats"]))
+        log("Korrelationsmatrix ...")
+        results.update(bench_correlation(manager, symbols, config["repeats"]))
+        log("Parallele Leser ...")
+        results.update(bench_concurrent_reads(manager, symbols, config["queries"], config["repeats"],
+                                              config["seed"]))
+        log("Intraday-Balken ...")
+        results.update(bench_intraday(manager, symbols, config["repeats"]))
+        if gui:
+            log("GUI-Rendering ...")
+            results.update(bench_gui(manager, symbols, config["repeats"]))
+    finally:
+        manager.close()
+    return results
+
+
+def compare(old, new, threshold):
+    """Gibt die Änderung der Mediane je Szenario aus und liefert die Namen der Verschlechterungen."""
+    regressions = []
+    print(f"{'Szenario':50} {'alt [s]':>10} {'neu [s]':>10} {'Faktor':>8}")
+    for name, result in new["results"].items():
+        previous = old["results"].get(name)
+        if not previous or "median_s" not in result or "median_s" not in previous:
+            continue
+        ratio = result["median_s"] / previous["median_s"] if previous["median_s"] else float("inf")
+        flag = ""
+        if ratio > 1 + threshold:
+            flag = "  <-- langsamer"
+            regressions.append(name)
+        print(f"{name:50} {previous['median_s']:10.4f} {result['median_s']:10.4f} {ratio:8.2f}{flag}")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Offline-Benchmarks mit synthetischen Kursdaten.")
+    parser.add_argument("--preset", choices=PRESETS, default="smoke")
+    parser.add_argument("--symbols", type=int, help="Anzahl Symbole (überschreibt das Preset)")
+    parser.add_argument("--years", type=int, help="Jahre je Symbol (überschreibt das Preset)")
+    parser.add_argument("--repeats", type=int, help="Wiederholungen je Szenario (überschreibt das Preset)")
+    parser.add_argument("--storage", choices=STORAGES, default="sqlite-compact")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--no-gui", action="store_true", help="GUI-Rendering nicht messen")
+    parser.add_argument("--workdir", help="Verzeichnis für die Benchmark-Datenbank (Standard: temporär)")
+    parser.add_argument("--output", help="JSON-Datei für die Ergebnisse (Standard: benchmark_<preset>.json)")
+    parser.add_argument("--compare", help="Früheres Ergebnis (JSON) zum Vergleich")
+    parser.add_argument("--threshold", type=float, default=0.1,
+                        help="Zulässige Verlangsamung beim Vergleich (0.1 = 10 %%)")
+    parser.add_argument("--metrics", action="store_true",
+                        help="Zeitmessung je Operation (instrumentation.py) aktivieren und mit speichern")
+    parser.add_argument("--log-level", default=None, help="Protokollstufe, z.B. INFO oder DEBUG")
+    args = parser.parse_args(argv)
+    configure_logging(args.log_level)
+    METRICS.enabled = args.metrics
+
+    config = dict(PRESETS[args.preset], seed=args.seed)
+    for key in ("symbols", "years", "repeats"):
+        if getattr(args, key) is not None:
+            config[key] = getattr(args, key)
+
+    started = time.perf_counter()
+    if args.workdir:
+        os.makedirs(args.workdir, exist_ok=True)
+        results = run(config, args.storage, args.workdir, gui=not args.no_gui)
+    else:
+        with tempfile.TemporaryDirectory(prefix="aktien_benchmark_") as workdir:
+            results = run(config, args.storage, workdir, gui=not args.no_gui)
+
+    output = {
+        "meta": {
+            "commit": _git_commit(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "pandas": pd.__version__,
+            "platform": platform.platform(),
+            "total_s": time.perf_counter() - started,
+        },
+        "config": {"preset": args.preset, "storage": args.storage, **config},
+        "results": results,
+    }
+    if args.metrics:
+        output["metrics"] = METRICS.snapshot()
+    output_path = args.output or f"benchmark_{args.preset}.json"
+    with open(output_path, "w", encoding="utf-8") as f:
+        json.dump(output, f, indent=2)
+
+    for name, result in results.items():
+        if "median_s" in result:
+            print(f"{name:50} {result['median_s']:10.4f} s")
+        else:
+            print(f"{name:50} übersprungen ({result.get('skipped')})")
+    print(f"Ergebnisse gespeichert in {output_path} ({output['meta']['total_s']:.1f} s gesamt).")
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            regressions = compare(json.load(f), output, args.threshold)
+        if regressions:
+            print(f"{len(regressions)} Szenario(s) langsamer als {args.threshold:.0%}.")
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
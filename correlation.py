@@ -0,0 +1,329 @@
+"""
+Paarweise Kovarianz- und Korrelationsmatrizen der Tagesrenditen vieler Symbole.
+
+Die Matrizen entstehen aus Summen je Symbolpaar (Anzahl gemeinsamer Tage, Summen, Quadrat- und
+Produktsummen), die kachelweise über Matrixprodukte der Renditen berechnet werden. So wird nie ein
+Zwischenergebnis der Größe Tage x Symbole x Symbole gebildet, fehlende Kurse werden je Paar
+berücksichtigt (wie DataFrame.cov/corr), und ein neuer Tag lässt sich ohne Neuberechnung ergänzen.
+Matrizen, die das Speicherbudget übersteigen, liegen als Memory-Mapped-Dateien auf der Festplatte.
+"""
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import logging
+import os
+from pathlib import Path
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+from financial_tools import FinancialTools
+from instrumentation import span, timed
+
+logger = logging.getLogger(__name__)
+
+# Summen je Symbolpaar (i, j) über die Tage, an denen beide eine Rendite haben (x: verschobene Rendite)
+#   count: Anzahl Tage, sums: Summe x_i, squares: Summe x_i², products: Summe x_i·x_j,
+#   fourth: Summe x_i²·x_j² (nur für die Schätzung der Shrinkage-Intensität)
+STATISTICS = ("count", "sums", "squares", "products", "fourth")
+
+
+class ReturnStatistics:
+    """
+    Summen je Symbolpaar über ein Renditefenster (Ergebnis von CorrelationEngine.statistics).
+    Die Renditen werden um den Spaltenmittelwert beim Aufbau verschoben (numerische Stabilität);
+    Kovarianz und Korrelation hängen davon nicht ab. Mit window werden nur die letzten window
+    Handelstage berücksichtigt: CorrelationEngine.update zieht dann die ältesten Tage wieder ab.
+    """
+
+    def __init__(self, symbols, shift, last_prices, matrices, window=None, directory=None):
+        self.symbols = list(symbols)
+        self.shift = shift
+        self.last_prices = last_prices
+        self.window = window
+        self.dates = []
+        # Renditen des Fensters (verschoben, 0 bei fehlenden Werten), um sie wieder abzuziehen
+        self._rows = deque()
+        self._directory = directory
+        for name in STATISTICS:
+            setattr(self, name, matrices[name])
+
+    @property
+    def last_date(self):
+        return self.dates[-1] if self.dates else None
+
+    def close(self):
+        """Gibt die Matrizen frei und löscht ausgelagerte Dateien (auch ausgelagerte Ergebnisse ohne path)."""
+        for name in STATISTICS:
+            setattr(self, name, None)
+        if self._directory is not None:
+            self._directory.cleanup()
+            self._directory = None
+
+
+class CorrelationEngine:
+    """
+    Berechnet Kovarianz- und Korrelationsmatrizen über die gespeicherten Kurse eines StockDataManager.
+
+    memory_bytes begrenzt den Arbeitsspeicher: Passen die Summenmatrizen (5 x Symbole² float64)
+    nicht in die Hälfte des Budgets, werden sie als Memory-Mapped-Dateien in directory (Standard:
+    temporäres Verzeichnis) abgelegt. Ein Viertel erhalten die Renditen eines Durchgangs (Tage x
+    Symbole), eines die Kacheln der workers Threads (Standard: alle CPU-Kerne). Die Matrixprodukte
+    geben den GIL frei und laufen parallel.
+    """
+
+    def __init__(self, manager, memory_bytes=512 * 1024 * 1024, workers=None, directory=None):
+        self.manager = manager
+        self.memory_bytes = memory_bytes
+        self.workers = workers or os.cpu_count() or 1
+        self.directory = directory
+
+    # --- Kacheln ---
+
+    def _block_size(self, symbols, rows):
+        """Kantenlänge der Kacheln: 6 Spaltenblöcke (rows x b) und 7 Kacheln (b x b) je Thread im Budget."""
+        budget = self.memory_bytes / 4 / self.workers / 8
+        block = int((-6 * rows + np.sqrt(36 * rows * rows + 28 * budget)) / 14)
+        return max(16, min(symbols, block))
+
+    @staticmethod
+    def _tiles(symbols, block):
+        """Kacheln (I, J) der oberen Dreieckshälfte; die untere ergibt sich durch Spiegeln."""
+        starts = range(0, symbols, block)
+        return [(slice(i, min(i + block, symbols)), slice(j, min(j + block, symbols)))
+                for i in starts for j in starts if j >= i]
+
+    def _run_tiles(self, tiles, fn):
+        """Führt fn(I, J) für alle Kacheln aus; Kacheln schreiben in getrennte Bereiche der Matrizen."""
+        if self.workers == 1 or len(tiles) == 1:
+            for tile in tiles:
+                fn(*tile)
+            return
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            for future in [pool.submit(fn, *tile) for tile in tiles]:
+                future.result()
+
+    def _allocate(self, symbols, count, directory=None):
+        """
+        count Matrizen (symbols x symbols, mit 0 initialisiert) im Speicher oder, falls sie die Hälfte
+        des Budgets übersteigen, als Memory-Mapped-Dateien. Gibt (Matrizen, Verzeichnis oder None) zurück.
+        """
+        if count * symbols * symbols * 8 <= self.memory_bytes / 2:
+            return [np.zeros((symbols, symbols)) for _ in range(count)], directory
+        if directory is None:
+            directory = tempfile.TemporaryDirectory(prefix="correlation_", dir=self.directory,
+                                                    ignore_cleanup_errors=True)
+        matrices = []
+        for _ in range(count):
+            handle, path = tempfile.mkstemp(suffix=".npy", dir=directory.name)
+            os.close(handle)
+            matrices.append(np.lib.format.open_memmap(path, mode="w+", dtype='float64', shape=(symbols, symbols)))
+        logger.info("Matrizen (%d x %d) werden in '%s' ausgelagert.", symbols, symbols, directory.name)
+        return matrices, directory
+
+    # --- Summen ---
+
+    def _accumulate(self, stats, values, valid, sign=1.0):
+        """Addiert (sign=-1: subtrahiert) die Summen der Zeilen values/valid (Tage x Symbole) kachelweise."""
+        squares = values * values
+        valid = valid.astype('float64')
+        rows = values.shape[0]
+
+        def tile(I, J):
+            xi, xj, mi, mj, qi, qj = values[:, I], values[:, J], valid[:, I], valid[:, J], squares[:, I], squares[:, J]
+            updates = {"count": mi.T @ mj, "products": xi.T @ xj, "fourth": qi.T @ qj,
+                       "sums": xi.T @ mj, "squares": qi.T @ mj}
+            for name, update in updates.items():
+                matrix = getattr(stats, name)
+                matrix[I, J] += sign * update
+            if I != J:
+                # Symmetrische Summen spiegeln, die übrigen für (j, i) eigens berechnen
+                for name in ("count", "products", "fourth"):
+                    getattr(stats, name)[J, I] += sign * updates[name].T
+                stats.sums[J, I] += sign * (xj.T @ mi)
+                stats.squares[J, I] += sign * (qj.T @ mi)
+
+        with span("correlation.accumulate", rows=rows):
+            self._run_tiles(self._tiles(len(stats.symbols), self._block_size(len(stats.symbols), rows)), tile)
+
+    def _chunk_rows(self, symbols):
+        """Anzahl Tage je Durchgang beim Aufbau (Renditen, Maske und Quadrate im Budget)."""
+        return max(1, int(self.memory_bytes / 4 / (3 * 8 * max(symbols, 1))))
+
+    @timed("correlation.statistics")
+    def statistics(self, symbols, start_date=None, end_date=None, window=None):
+        """
+        Berechnet die Summen je Symbolpaar über die Tagesrenditen (wie FinancialTools.calculate_returns_panel)
+        zwischen start_date und end_date. Mit window (Anzahl Handelstage) werden nur die letzten window
+        Tage verwendet; ohne start_date werden dann nur die dafür nötigen Kurse geladen.
+        Gibt ein ReturnStatistics-Objekt zurück (für covariance, correlation und update).
+        """
+        symbols = list(dict.fromkeys(symbol.upper() for symbol in symbols))
+        if window is not None and start_date is None:
+            # Reicht auch bei Feiertagen und Handelspausen einzelner Tage für window + 1 Kurse
+            end = pd.Timestamp(end_date) if end_date is not None else pd.Timestamp.today()
+            start_date = (end - pd.Timedelta(days=window * 2 + 30)).date().isoformat()
+        with span("correlation.load_prices"):
+            prices = self.manager.get_price_matrix(symbols, start_date, end_date)
+        returns = FinancialTools.calculate_returns_panel(prices, in_percent=False)
+        returns = returns[returns.notna().any(axis=1)]
+        if window is not None:
+            returns = returns.iloc[-window:]
+
+        values = returns.to_numpy(dtype='float64')
+        valid = ~np.isnan(values)
+        counts = valid.sum(axis=0)
+        with np.errstate(invalid='ignore'):
+            shift = np.where(counts > 0, np.nansum(values, axis=0) / np.maximum(counts, 1), 0.0)
+        values = np.where(valid, values - shift, 0.0)
+
+        matrices, directory = self._allocate(len(symbols), len(STATISTICS))
+        last_prices = prices.ffill().iloc[-1].to_numpy(dtype='float64') if len(prices) else np.full(len(symbols), np.nan)
+        stats = ReturnStatistics(symbols, shift, last_prices, dict(zip(STATISTICS, matrices)), window, directory)
+        chunk = self._chunk_rows(len(symbols))
+        for first in range(0, len(values), chunk):
+            self._accumulate(stats, values[first:first + chunk], valid[first:first + chunk])
+        stats.dates = list(returns.index)
+        if window is not None:
+            stats._rows.extend(zip(values, valid))
+        logger.info("Renditesummen für %d Symbole über %d Tage berechnet.", len(symbols), len(values))
+        return stats
+
+    @timed("correlation.update")
+    def update(self, stats, end_date=None):
+        """
+        Ergänzt die Summen um die Tage nach stats.last_date bis end_date (z.B. nach
+        StockDataManager.fetch_and_store_many). Die Kosten hängen nur von der Anzahl neuer Tage ab,
+        nicht von der Länge des Fensters; mit window werden die ältesten Tage wieder abgezogen.
+        Gibt die Anzahl der ergänzten Tage zurück.
+        """
+        start = (stats.last_date + pd.Timedelta(days=1)).date().isoformat() if stats.last_date is not None else None
+        prices = self.manager.get_price_matrix(stats.symbols, start, end_date)
+        if prices.empty:
+            return 0
+
+        # Rendite gegenüber dem letzten bekannten Kurs jedes Symbols (wie calculate_returns_panel)
+        previous = np.vstack([stats.last_prices, prices.ffill().to_numpy(dtype='float64')[:-1]])
+        previous = pd.DataFrame(previous).ffill().to_numpy()
+        current = prices.to_numpy(dtype='float64')
+        with np.errstate(divide='ignore', invalid='ignore'):
+            returns = current / previous - 1
+        valid = ~np.isnan(returns)
+        stats.last_prices = np.where(np.isnan(current[-1]), previous[-1], current[-1])
+        days = valid.any(axis=1)
+        values = np.where(valid, returns - stats.shift, 0.0)[days]
+        valid = valid[days]
+        if not len(values):
+            return 0
+
+        self._accumulate(stats, values, valid)
+        stats.dates.extend(prices.index[days])
+        if stats.window is not None:
+            stats._rows.extend(zip(values, valid))
+            excess = len(stats._rows) - stats.window
+            if excess > 0:
+                old = [stats._rows.popleft() for _ in range(excess)]
+                self._accumulate(stats, np.array([row[0] for row in old]), np.array([row[1] for row in old]),
+                                 sign=-1.0)
+                del stats.dates[:excess]
+        logger.info("Renditesummen um %d Tage ergänzt.", len(values))
+        return len(values)
+
+    # --- Ergebnisse ---
+
+    def _result(self, stats, path, symbols):
+        """Ergebnismatrix im Speicher, als .npy-Datei path oder bei Überschreiten des Budgets ausgelagert."""
+        if path is not None:
+            return np.lib.format.open_memmap(Path(path), mode="w+", dtype='float64', shape=(symbols, symbols))
+        matrices, stats._directory = self._allocate(symbols, 1, stats._directory)
+        return matrices[0]
+
+    def _matrix(self, stats, kind, shrinkage, min_periods, path):
+        symbols = len(stats.symbols)
+        result = self._result(stats, path, symbols)
+        # Summen für die Shrinkage-Intensität: geschätzte Varianz der Einträge und ihre Quadrate
+        totals = []
+
+        def tile(I, J):
+            count = stats.count[I, J]
+            sums_i, sums_j = stats.sums[I, J], stats.sums[J, I].T
+            with np.errstate(divide='ignore', invalid='ignore'):
+                centered = stats.products[I, J] - sums_i * sums_j / count
+                variance_i = stats.squares[I, J] - sums_i * sums_i / count
+                variance_j = stats.squares[J, I].T - sums_j * sums_j / count
+                if kind == "covariance":
+                    values = centered / (count - 1)
+                    scale = 1.0
+                else:
+                    values = centered / np.sqrt(variance_i * variance_j)
+                    scale = (count - 1) ** 2 / (variance_i * variance_j)
+                values[count < max(min_periods, 2)] = np.nan
+                if I == J:
+                    np.fill_diagonal(values, np.where(np.diag(count) >= max(min_periods, 2),
+                                                      1.0 if kind == "correlation" else np.diag(values), np.nan))
+                if shrinkage == "ledoit-wolf":
+                    # Varianz des Schätzers je Paar (Schäfer/Strimmer), aus den Summen x_i²·x_j²
+                    mean_product = centered / count
+                    spread = np.clip(stats.fourth[I, J] - count * mean_product * mean_product, 0, None)
+                    estimate_variance = count / (count - 1) ** 3 * spread * scale
+                    off_diagonal = np.isfinite(values) & np.isfinite(estimate_variance)
+                    if I == J:
+                        np.fill_diagonal(off_diagonal, False)
+                    weight = 1.0 if I == J else 2.0
+                    totals.append((weight * estimate_variance[off_diagonal].sum(),
+                                   weight * (values[off_diagonal] ** 2).sum()))
+            result[I, J] = values
+            if I != J:
+                result[J, I] = values.T
+
+        tiles = self._tiles(symbols, self._block_size(symbols, 0))
+        with span(f"correlation.{kind}", rows=symbols):
+            self._run_tiles(tiles, tile)
+            intensity = self._shrinkage_intensity(shrinkage, totals)
+            if intensity:
+                def shrink(I, J):
+                    diagonal = np.diag(result[I, J]).copy() if I == J else None
+                    result[I, J] *= 1 - intensity
+                    if I != J:
+                        result[J, I] *= 1 - intensity
+                    else:
+                        np.fill_diagonal(result[I, J], diagonal)
+                self._run_tiles(tiles, shrink)
+        if isinstance(result, np.memmap):
+            result.flush()
+        return pd.DataFrame(result, index=pd.Index(stats.symbols, name='Symbol'), columns=stats.symbols, copy=False)
+
+    @staticmethod
+    def _shrinkage_intensity(shrinkage, totals):
+        """Shrinkage-Intensität: fester Wert zwischen 0 und 1 oder 'ledoit-wolf' (geschätzt, siehe covariance)."""
+        if shrinkage is None:
+            return 0.0
+        if shrinkage == "ledoit-wolf":
+            estimate_variance = sum(total[0] for total in totals)
+            squares = sum(total[1] for total in totals)
+            intensity = float(np.clip(estimate_variance / squares, 0, 1)) if squares > 0 else 0.0
+            logger.info("Geschätzte Shrinkage-Intensität: %.4f", intensity)
+            return intensity
+        if not 0 <= shrinkage <= 1:
+            raise ValueError(f"Shrinkage muss zwischen 0 und 1 liegen oder 'ledoit-wolf' sein: {shrinkage}")
+        return float(shrinkage)
+
+    def covariance(self, stats, shrinkage=None, min_periods=20, path=None):
+        """
+        Paarweise Kovarianzmatrix (ddof=1, wie DataFrame.cov) aus ReturnStatistics als DataFrame
+        (Symbol x Symbol). Paare mit weniger als min_periods gemeinsamen Tagen sind NaN.
+        shrinkage: None, eine Intensität zwischen 0 und 1 oder 'ledoit-wolf'; die Einträge außerhalb
+        der Diagonale werden um diesen Anteil Richtung 0 gezogen (Ziel: Diagonalmatrix der Varianzen).
+        'ledoit-wolf' schätzt die Intensität nach Schäfer/Strimmer aus der Streuung der Produkte
+        (bezogen auf die beim Aufbau verschobenen Renditen, daher eine Näherung).
+        path: .npy-Datei für das Ergebnis (Memory-Mapping); sonst im Speicher bzw. ausgelagert, wenn
+        die Matrix die Hälfte von memory_bytes übersteigt.
+        """
+        return self._matrix(stats, "covariance", shrinkage, min_periods, path)
+
+    def correlation(self, stats, shrinkage=None, min_periods=20, path=None):
+        """
+        Paarweise Korrelationsmatrix (wie DataFrame.corr) aus ReturnStatistics als DataFrame; Parameter
+        wie bei covariance, Ziel der Shrinkage ist die Einheitsmatrix.
+        """
+        return self._matrix(stats, "correlation", shrinkage, min_periods, path)
@@ -0,0 +1,436 @@
+from concurrent.futures import Future
+from contextlib import contextmanager
+from datetime import date, timedelta
+import json
+import logging
+import os
+from pathlib import Path
+import random
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+from instrumentation import METRICS
+
+logger = logging.getLogger(__name__)
+
+PRICE_COLUMNS = ['Open', 'High', 'Low', 'Close', 'Adj Close', 'Volume']
+
+# Intraday-Intervalle wie bei yfinance mit der Anzahl Balken je regulärem Handelstag (6,5 Stunden).
+INTRADAY_INTERVALS = {"1m": 390, "2m": 195, "5m": 78, "15m": 26, "30m": 13, "60m": 7, "90m": 5, "1h": 7}
+
+# Yahoo liefert Intraday-Balken nur für die letzten INTRADAY_LOOKBACK_DAYS Tage (Standard 60) und
+# 1-Minuten-Balken höchstens für 7 Tage je Anfrage; Anfragen darüber hinaus bleiben leer.
+INTRADAY_LOOKBACK_DAYS = {"1m": 30}
+INTRADAY_REQUEST_DAYS = {"1m": 7}
+
+# Standardgrenzen von ScheduledDataSource, bemessen für Sammelimporte: 500 Symbole mit je einem
+# Kurs- und Stammdatenabruf dauern damit gut 40 s, mit gecachten Stammdaten etwa 20 s. Drosselt
+# Yahoo dennoch (HTTP 429), greifen die erneuten Versuche mit wachsender Wartezeit.
+DEFAULT_REQUEST_RATE = 25.0
+DEFAULT_REQUEST_BURST = 50
+DEFAULT_MAX_REQUESTS = 8
+
+
+def intraday_earliest(interval, today):
+    """Frühester Tag, für den yfinance noch Balken im Intraday-Intervall liefert (mit einem Tag Reserve)."""
+    return today - timedelta(days=INTRADAY_LOOKBACK_DAYS.get(interval, 60) - 1)
+
+
+def period_start(period, end):
+    """
+    Rechnet einen yfinance-Zeitraum ('5d', '1mo', '1y', 'ytd', 'max', ...) in ein Startdatum um.
+    Gibt None für 'max' zurück.
+    """
+    if period is None or period == 'max':
+        return None
+    if period == 'ytd':
+        return date(end.year, 1, 1)
+    if period.endswith('mo'):
+        return (pd.Timestamp(end) - pd.DateOffset(months=int(period[:-2]))).date()
+    if period.endswith('d'):
+        return end - timedelta(days=int(period[:-1]))
+    if period.endswith('y'):
+        return (pd.Timestamp(end) - pd.DateOffset(years=int(period[:-1]))).date()
+    raise ValueError(f"Unbekannter Zeitraum: {period}")
+
+
+class YFinanceDataSource:
+    """
+    Standard-Datenquelle: lädt Kurse und Stammdaten über yfinance.
+    yfinance (samt requests) wird erst beim ersten Abruf importiert, das verkürzt den Programmstart.
+    """
+
+    def history(self, symbol, period=None, start=None, end=None, interval="1d"):
+        """
+        Gibt die Kurshistorie im yfinance-Format zurück (Spalten wie PRICE_COLUMNS, DatetimeIndex).
+        Entweder period oder start/end angeben. interval: '1d' oder ein Intraday-Intervall
+        (siehe INTRADAY_INTERVALS); Intraday-Balken haben einen Zeitstempel mit Zeitzone.
+        """
+        import yfinance as yf
+        ticker = yf.Ticker(symbol)
+        if start is not None:
+            return ticker.history(start=start, end=end, interval=interval, auto_adjust=False)
+        return ticker.history(period=period or "1y", interval=interval, auto_adjust=False)
+
+    def info(self, symbol):
+        """Gibt die Stammdaten (z.B. 'longName') eines Symbols zurück."""
+        import yfinance as yf
+        return yf.Ticker(symbol).info
+
+
+class FrameDataSource:
+    """
+    Lokale Datenquelle auf Basis vorhandener DataFrames (ohne Netzwerk).
+    Dient als Ersatz für yfinance, z.B. für Offline-Tests und Benchmarks.
+    """
+
+    def __init__(self, frames, infos=None):
+        self.frames = {symbol.upper(): frame for symbol, frame in frames.items()}
+        self.infos = infos or {}
+        self.history_calls = []
+
+    def _frame(self, symbol):
+        return self.frames.get(symbol.upper())
+
+    def _intraday_frame(self, symbol, interval):
+        """Intraday-Balken eines Symbols (None: nicht vorhanden)."""
+        return None
+
+    def history(self, symbol, period=None, start=None, end=None, interval="1d"):
+        """
+        Wie YFinanceDataSource.history. Intraday gelten die Grenzen von Yahoo (siehe
+        INTRADAY_LOOKBACK_DAYS): Anfragen außerhalb liefern einen leeren DataFrame, 'max' wird begrenzt.
+        """
+        self.history_calls.append((symbol, period, start, end))
+        if interval == "1d":
+            hist = self._frame(symbol)
+        elif self._intraday_allowed(interval, period, start, end):
+            hist = self._intraday_frame(symbol, interval)
+            if start is None and (period is None or period == "max"):
+                start = intraday_earliest(interval, date.today()).isoformat()
+        else:
+            hist = None
+        if hist is None or hist.empty:
+            return pd.DataFrame(columns=PRICE_COLUMNS)
+
+        dates = hist.index.date
+        mask = np.ones(len(hist), dtype=bool)
+        if start is not None:
+            mask &= dates >= pd.Timestamp(start).date()
+            if end is not None:
+                # Wie bei yfinance ist das Enddatum exklusiv
+                mask &= dates < pd.Timestamp(end).date()
+        else:
+            first = period_start(period or "1y", dates[-1])
+            if first is not None:
+                mask &= dates >= first
+        return hist[mask]
+
+    @staticmethod
+    def _intraday_allowed(interval, period, start, end):
+        today = date.today()
+        earliest = intraday_earliest(interval, today)
+        if start is None:
+            first = period_start(period or "1mo", today)
+            return first is None or first >= earliest
+        first = pd.Timestamp(start).date()
+        last = pd.Timestamp(end).date() if end is not None else today + timedelta(days=1)
+        return first >= earliest and (last - first).days <= INTRADAY_REQUEST_DAYS.get(interval, 366)
+
+    def info(self, symbol):
+        return self.infos.get(symbol.upper(), {})
+
+
+class CsvDirectoryDataSource(FrameDataSource):
+    """
+    Lokale Datenquelle für Kursdateien im yfinance-Format (eine Datei '<SYMBOL>.csv' je Symbol,
+    erste Spalte Datum). Die Dateien werden erst beim Abruf eingelesen.
+    """
+
+    def __init__(self, directory, infos=None):
+        super().__init__({}, infos)
+        self.directory = Path(directory)
+
+    def symbols(self):
+        """Gibt alle Symbole zurück, für die eine Kursdatei vorhanden ist."""
+        return sorted(path.stem.upper() for path in self.directory.glob("*.csv"))
+
+    def _frame(self, symbol):
+        path = self.directory / f"{symbol.upper()}.csv"
+        if not path.exists():
+            return None
+        hist = pd.read_csv(path, index_col=0)
+        # Zeitzonen-Offsets (z.B. '-05:00') verwerfen, damit das lokale Börsendatum erhalten bleibt
+        hist.index = pd.to_datetime(hist.index.astype(str).str[:19])
+        return hist
+
+
+class RateLimitError(RuntimeError):
+    """Die Datenquelle hat eine Anfrage wegen zu vieler Abrufe abgelehnt (z.B. HTTP 429)."""
+
+
+def is_transient(error):
+    """
+    Ob sich ein erneuter Versuch lohnt: Drosselung (RateLimitError bzw. yfinance' YFRateLimitError)
+    sowie Netzwerk- und Zeitüberschreitungsfehler (OSError, darunter auch die Fehler von requests).
+    """
+    return (isinstance(error, (RateLimitError, OSError))
+            or "RateLimit" in type(error).__name__ or "Too Many Requests" in str(error))
+
+
+class TokenBucket:
+    """
+    Token-Bucket: im Mittel rate Anfragen pro Sekunde, kurzzeitig bis zu burst auf einmal.
+    acquire() wartet auf das nächste Token, try_acquire() gibt ohne Warten False zurück.
+    """
+
+    def __init__(self, rate, burst=1, clock=time.monotonic, sleep=time.sleep):
+        self._check(rate, burst)
+        self.rate = rate
+        self.burst = burst
+        self._clock = clock
+        self._sleep = sleep
+        self._tokens = float(burst)
+        self._updated = clock()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _check(rate, burst):
+        if rate <= 0 or burst < 1:
+            raise ValueError("rate muss größer als 0 und burst mindestens 1 sein.")
+
+    def configure(self, rate=None, burst=None):
+        """Ändert Rate und/oder Burst im laufenden Betrieb (None: unverändert)."""
+        with self._lock:
+            rate = self.rate if rate is None else rate
+            burst = self.burst if burst is None else burst
+            self._check(rate, burst)
+            now = self._clock()
+            # Bis jetzt angesammelte Token gelten noch mit der bisherigen Rate
+            self._tokens = min(burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self.rate, self.burst = rate, burst
+
+    def _take(self):
+        """Nimmt ein Token, falls vorhanden; gibt sonst die Wartezeit bis zum nächsten zurück."""
+        with self._lock:
+            now = self._clock()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return 0.0
+            return (1 - self._tokens) / self.rate
+
+    def try_acquire(self):
+        return self._take() == 0.0
+
+    def acquire(self):
+        """Wartet auf ein Token und gibt die Wartezeit in Sekunden zurück."""
+        waited = 0.0
+        while (delay := self._take()) > 0:
+            self._sleep(delay)
+            waited += delay
+        return waited
+
+
+class MetadataCache:
+    """
+    Stammdaten (info) je Symbol mit Ablaufzeit ttl (Sekunden), optional in der JSON-Datei path
+    gespeichert, sodass sie auch nach einem Neustart gelten. Geschrieben wird höchstens alle
+    flush_interval Sekunden sowie bei flush().
+    """
+
+    def __init__(self, path=None, ttl=30 * 24 * 3600, flush_interval=5.0, clock=time.time):
+        self.path = Path(path) if path is not None else None
+        self.ttl = ttl
+        self.flush_interval = flush_interval
+        self._clock = clock
+        self._entries = {}
+        self._dirty = False
+        self._written = clock()
+        self._lock = threading.Lock()
+        if self.path is not None and self.path.exists():
+            try:
+                self._entries = json.loads(self.path.read_text(encoding="utf-8"))
+            except (OSError, ValueError) as e:
+                logger.warning("Stammdaten-Cache '%s' konnte nicht gelesen werden: %s", self.path, e)
+
+    def get(self, symbol):
+        """Gespeicherte Stammdaten eines Symbols oder None, falls unbekannt bzw. abgelaufen."""
+        with self._lock:
+            entry = self._entries.get(symbol.upper())
+        if entry is None or self._clock() - entry["fetched"] > self.ttl:
+            return None
+        return entry["info"]
+
+    def put(self, symbol, info):
+        # Nur JSON-taugliche Werte speichern (yfinance liefert vereinzelt andere Typen)
+        info = json.loads(json.dumps(info, default=str))
+        with self._lock:
+            self._entries[symbol.upper()] = {"fetched": self._clock(), "info": info}
+            self._dirty = True
+        if self._clock() - self._written >= self.flush_interval:
+            self.flush()
+
+    def flush(self):
+        """Schreibt geänderte Einträge (atomar per Umbenennen) in die Datei."""
+        if self.path is None:
+            return
+        with self._lock:
+            if not self._dirty:
+                return
+            text = json.dumps(self._entries)
+            self._dirty = False
+            self._written = self._clock()
+            try:
+                tmp = self.path.with_name(self.path.name + ".tmp")
+                tmp.write_text(text, encoding="utf-8")
+                os.replace(tmp, self.path)
+            except OSError as e:
+                logger.warning("Stammdaten-Cache '%s' konnte nicht geschrieben werden: %s", self.path, e)
+
+
+class ScheduledDataSource:
+    """
+    Vorgeschaltete Steuerung für eine Datenquelle (z.B. YFinanceDataSource) mit gleicher Schnittstelle:
+
+    - Token-Bucket: höchstens rate Abrufe pro Sekunde (kurzzeitig burst),
+    - höchstens max_concurrency gleichzeitige Abrufe,
+    - erneute Versuche bei vorübergehenden Fehlern (siehe is_transient) mit exponentiell wachsender,
+      zufällig verkürzter Wartezeit (backoff, 2·backoff, 4·backoff, ... bis max_backoff),
+    - gleiche, bereits laufende Anfragen werden nicht doppelt gestellt, sondern teilen das Ergebnis,
+    - Stammdaten kommen aus metadata (MetadataCache), solange sie nicht abgelaufen sind.
+
+    stats() zählt Anfragen an die Quelle, Wiederholungen, zusammengelegte Anfragen und Cache-Treffer.
+    Die Grenzen lassen sich mit configure() bzw. vorübergehend mit limits() ändern.
+    """
+
+    def __init__(self, source, rate=DEFAULT_REQUEST_RATE, burst=DEFAULT_REQUEST_BURST,
+                 max_concurrency=DEFAULT_MAX_REQUESTS, retries=4, backoff=1.0, max_backoff=30.0,
+                 metadata=None, sleep=time.sleep):
+        if max_concurrency < 1:
+            raise ValueError("max_concurrency muss mindestens 1 sein.")
+        self.source = source
+        self.bucket = TokenBucket(rate, burst, sleep=sleep)
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.metadata = metadata if metadata is not None else MetadataCache()
+        self._sleep = sleep
+        self.max_concurrency = max_concurrency
+        self._active = 0
+        self._slot_free = threading.Condition()
+        self._inflight = {}
+        self._lock = threading.Lock()
+        self._stats = {"requests": 0, "retries": 0, "coalesced": 0, "cache_hits": 0}
+
+    def __getattr__(self, name):
+        # Weitere Methoden der Quelle (z.B. CsvDirectoryDataSource.symbols) unverändert durchreichen
+        if name == "source":
+            raise AttributeError(name)
+        return getattr(self.source, name)
+
+    def _count(self, name):
+        with self._lock:
+            self._stats[name] += 1
+        METRICS.count("source." + name)
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats)
+
+    def configure(self, rate=None, burst=None, max_concurrency=None):
+        """
+        Ändert Rate, Burst und/oder die Zahl gleichzeitiger Abrufe im laufenden Betrieb (None: unverändert).
+        Gibt die bisherigen Werte (rate, burst, max_concurrency) zurück.
+        """
+        if max_concurrency is not None and max_concurrency < 1:
+            raise ValueError("max_concurrency muss mindestens 1 sein.")
+        with self._slot_free:
+            previous = (self.bucket.rate, self.bucket.burst, self.max_concurrency)
+            self.bucket.configure(rate, burst)
+            if max_concurrency is not None:
+                self.max_concurrency = max_concurrency
+                self._slot_free.notify_all()
+        return previous
+
+    @contextmanager
+    def limits(self, rate=None, burst=None, max_concurrency=None):
+        """Wie configure, stellt die bisherigen Grenzen aber am Ende des Blocks wieder her."""
+        previous = self.configure(rate, burst, max_concurrency)
+        try:
+            yield self
+        finally:
+            self.configure(*previous)
+
+    @contextmanager
+    def _slot(self):
+        """Wartet, bis weniger als max_concurrency Abrufe laufen, und belegt einen Platz."""
+        with self._slot_free:
+            self._slot_free.wait_for(lambda: self._active < self.max_concurrency)
+            self._active += 1
+        try:
+            yield
+        finally:
+            with self._slot_free:
+                self._active -= 1
+                self._slot_free.notify()
+
+    def _call(self, fn, *args, **kwargs):
+        """Ruft die Quelle im Rahmen von Rate-Limit und Parallelität auf, mit erneuten Versuchen."""
+        for attempt in range(self.retries + 1):
+            with self._slot():
+                self.bucket.acquire()
+                self._count("requests")
+                try:
+                    return fn(*args, **kwargs)
+                except Exception as e:
+                    if attempt == self.retries or not is_transient(e):
+                        raise
+                    error = e
+            delay = min(self.max_backoff, self.backoff * 2 ** attempt) * random.uniform(0.5, 1.0)
+            logger.warning("Abruf fehlgeschlagen (%s), neuer Versuch in %.1f s ...", error, delay)
+            self._count("retries")
+            self._sleep(delay)
+
+    def _coalesced(self, key, fn, *args, **kwargs):
+        """Führt _call aus; läuft dieselbe Anfrage (key) bereits, wird auf deren Ergebnis gewartet."""
+        with self._lock:
+            future = self._inflight.get(key)
+            owner = future is None
+            if owner:
+                future = self._inflight[key] = Future()
+        if not owner:
+            self._count("coalesced")
+            return future.result()
+        try:
+            result = self._call(fn, *args, **kwargs)
+            future.set_result(result)
+            return result
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                del self._inflight[key]
+
+    def history(self, symbol, period=None, start=None, end=None, interval="1d"):
+        return self._coalesced(("history", symbol.upper(), period, start, end, interval),
+                               self.source.history, symbol, period=period, start=start, end=end, interval=interval)
+
+    def info(self, symbol):
+        info = self.metadata.get(symbol)
+        if info is not None:
+            self._count("cache_hits")
+            return info
+        info = self._coalesced(("info", symbol.upper()), self.source.info, symbol)
+        self.metadata.put(symbol, info)
+        return info
+
+    def close(self):
+        """Schreibt den Stammdaten-Cache."""
+        self.metadata.flush()
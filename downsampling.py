@@ -0,0 +1,50 @@
+import numpy as np
+
+
+def min_max_indices(values, buckets):
+    """
+    Wählt Punkte einer Zeitreihe für die Darstellung aus: Die Reihe wird in höchstens 'buckets'
+    gleich große Abschnitte geteilt, aus jedem Abschnitt bleiben Minimum und Maximum erhalten.
+    Bei einem Bucket je Bildschirmpixel entspricht die Linie damit der vollständigen Reihe;
+    Extremwerte (z.B. Crash-Tage) gehen nie verloren.
+
+    Enthält ein Abschnitt fehlende Werte (NaN), bleibt zusätzlich der erste davon erhalten,
+    damit die Linie an dieser Stelle weiterhin unterbrochen ist.
+    Gibt die sortierten Indizes der ausgewählten Punkte zurück (erster und letzter Punkt inklusive).
+    """
+    values = np.asarray(values, dtype='float64')
+    n = len(values)
+    if n <= 2 * buckets:
+        return np.arange(n)
+    size = -(-n // buckets)
+    buckets = -(-n // size)
+
+    blocks = np.full(buckets * size, np.nan)
+    blocks[:n] = values
+    blocks = blocks.reshape(buckets, size)
+    missing = np.isnan(blocks)
+    lows = np.where(missing, np.inf, blocks).argmin(axis=1)
+    highs = np.where(missing, -np.inf, blocks).argmax(axis=1)
+
+    # Die Auffüllung des letzten Abschnitts zählt nicht als Lücke
+    gaps = missing.reshape(-1)
+    gaps[n:] = False
+    gaps = gaps.reshape(buckets, size)
+    has_gap = gaps.any(axis=1)
+
+    offsets = np.arange(buckets) * size
+    indices = np.concatenate([
+        offsets + lows,
+        offsets + highs,
+        offsets[has_gap] + gaps[has_gap].argmax(axis=1),
+        [0, n - 1],
+    ])
+    return np.unique(indices)
+
+
+def downsample_min_max(x, y, buckets):
+    """Reduziert x/y mit min_max_indices auf höchstens etwa 2 * buckets Punkte (+ Lücken)."""
+    x = np.asarray(x)
+    y = np.asarray(y, dtype='float64')
+    indices = min_max_indices(y, buckets)
+    return x[indices], y[indices]
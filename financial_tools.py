@@ -1,19 +1,56 @@
+from dataclasses import dataclass
+
 import pandas as pd
 import numpy as np
 
+from data_sources import INTRADAY_INTERVALS
+from instrumentation import METRICS, span, timed
+
+TRADING_DAYS_PER_YEAR = 252
+
+# Perioden je Jahr für Tages-, Wochen- und Monatskurse (Intraday: siehe bars_per_year)
+PERIODS_PER_YEAR = {"1d": TRADING_DAYS_PER_YEAR, "1wk": 52, "1mo": 12,
+                    "daily": TRADING_DAYS_PER_YEAR, "weekly": 52, "monthly": 12}
+
+# Indikatoren, die über IndicatorSpec angesprochen werden können (wie in den Tabs der Oberfläche)
+INDICATORS = ("returns", "cumulative_returns", "ma", "volatility", "beta")
+DEFAULT_MARKET_SYMBOL = "SPY"
+
+
+def bars_per_year(interval):
+    """
+    Anzahl Kursbalken je Jahr für ein Intervall ('1d', '1wk', '1mo', die Auflösungen 'daily',
+    'weekly', 'monthly' oder ein Intraday-Intervall wie '5m'), z.B. zum Annualisieren der
+    Volatilität. Intraday zählen nur die Balken der regulären Handelszeit.
+    """
+    if interval in PERIODS_PER_YEAR:
+        return PERIODS_PER_YEAR[interval]
+    if interval in INTRADAY_INTERVALS:
+        return TRADING_DAYS_PER_YEAR * INTRADAY_INTERVALS[interval]
+    raise ValueError(f"Unbekanntes Intervall: {interval}")
+
+
 class FinancialTools:
     @staticmethod
+    def _price_series(prices):
+        """Wählt aus einem Kurs-DataFrame die Spalte 'adj_close' bzw. 'close' aus (None, falls keine vorhanden)."""
+        if isinstance(prices, pd.DataFrame):
+            if 'adj_close' in prices.columns:
+                return prices['adj_close']
+            if 'close' in prices.columns:
+                return prices['close']
+            return None
+        return prices
+
+    @staticmethod
+    @timed(rows=len)
     def calculate_returns(prices_series, in_percent=True): 
         """Berechnet die täglichen Renditen."""
         if prices_series.empty:
             return pd.Series(dtype='float64')
-        if isinstance(prices_series, pd.DataFrame):
-            if 'adj_close' in prices_series.columns:
-                prices_series = prices_series['adj_close']
-            elif 'close' in prices_series.columns:
-                prices_series = prices_series['close']
-            else:
-                return pd.Series(dtype='float64')
+        prices_series = FinancialTools._price_series(prices_series)
+        if prices_series is None:
+            return pd.Series(dtype='float64')
         
         returns = prices_series.pct_change().dropna()
         if in_percent:
@@ -21,48 +58,58 @@ class FinancialTools:
         return returns # Für interne Berechnungen (Dezimalwerte)
 
     @staticmethod
+    @timed(rows=len)
     def calculate_cumulative_returns(prices_series):
         """Berechnet die kumulativen Renditen."""
         if prices_series.empty:
             return pd.Series(dtype='float64')
         daily_returns_raw = FinancialTools.calculate_returns(prices_series, in_percent=False)
+        return FinancialTools._cumulative_from_returns(daily_returns_raw)
+
+    @staticmethod
+    def _cumulative_from_returns(daily_returns_raw):
         if daily_returns_raw.empty:
             return pd.Series(dtype='float64')
         return (1 + daily_returns_raw).cumprod() - 1
 
     @staticmethod
+    @timed(rows=len)
     def calculate_moving_average(prices_series, window=20):
         """Berechnet den gleitenden Durchschnitt."""
         if prices_series.empty:
             return pd.Series(dtype='float64')
-        if isinstance(prices_series, pd.DataFrame):
-            if 'adj_close' in prices_series.columns:
-                prices_series = prices_series['adj_close']
-            elif 'close' in prices_series.columns:
-                prices_series = prices_series['close']
-            else:
-                return pd.Series(dtype='float64')
+        prices_series = FinancialTools._price_series(prices_series)
+        if prices_series is None:
+            return pd.Series(dtype='float64')
         
         return prices_series.rolling(window=window).mean()
 
 
     @staticmethod
-    def calculate_volatility(prices_series, window=20):
-        """Berechnet die rollierende Volatilität (Standardabweichung der Renditen)."""
+    @timed(rows=len)
+    def calculate_volatility(prices_series, window=20, periods_per_year=TRADING_DAYS_PER_YEAR):
+        """
+        Berechnet die rollierende Volatilität (Standardabweichung der Renditen), annualisiert mit
+        periods_per_year Kursen je Jahr (Tageskurse: 252; für andere Intervalle siehe bars_per_year).
+        """
         if prices_series.empty:
             return pd.Series(dtype='float64')
         
         # HIER: Rufe calculate_returns mit in_percent=False auf, um Dezimalwerte zu bekommen
         daily_returns_for_vol = FinancialTools.calculate_returns(prices_series, in_percent=False)
-        
+        return FinancialTools._volatility_from_returns(daily_returns_for_vol, window, periods_per_year)
+
+    @staticmethod
+    def _volatility_from_returns(daily_returns_for_vol, window, periods_per_year=TRADING_DAYS_PER_YEAR):
         if daily_returns_for_vol.empty:
             return pd.Series(dtype='float64')
 
         # Annualisiere die Volatilität
-        return daily_returns_for_vol.rolling(window=window).std() * np.sqrt(252)
+        return daily_returns_for_vol.rolling(window=window).std() * np.sqrt(periods_per_year)
 
 
     @staticmethod
+    @timed(rows=len)
     def calculate_beta(stock_prices, market_prices, window=60):
         """
         Berechnet das rollierende Beta eines Wertpapiers relativ zu einem Marktindex.
@@ -73,29 +120,24 @@ class FinancialTools:
             return pd.Series(dtype='float64')
         
         # Sicherstellen, dass es Series sind, falls doch DataFrames übergeben werden
-        if isinstance(stock_prices, pd.DataFrame):
-            if 'adj_close' in stock_prices.columns:
-                stock_prices = stock_prices['adj_close']
-            elif 'close' in stock_prices.columns:
-                stock_prices = stock_prices['close']
-            else:
-                return pd.Series(dtype='float64')
-        
-        if isinstance(market_prices, pd.DataFrame):
-            if 'adj_close' in market_prices.columns:
-                market_prices = market_prices['adj_close']
-            elif 'close' in market_prices.columns:
-                market_prices = market_prices['close']
-            else:
-                return pd.Series(dtype='float64')
+        stock_prices = FinancialTools._price_series(stock_prices)
+        market_prices = FinancialTools._price_series(market_prices)
+        if stock_prices is None or market_prices is None:
+            return pd.Series(dtype='float64')
 
         # HIER: Rufe calculate_returns mit in_percent=False auf, um Dezimalwerte zu bekommen
         returns_stock = FinancialTools.calculate_returns(stock_prices, in_percent=False)
         returns_market = FinancialTools.calculate_returns(market_prices, in_percent=False)
+        combined_returns = FinancialTools._align_returns(returns_stock, returns_market)
+        return FinancialTools._beta_from_aligned(combined_returns, window)
 
+    @staticmethod
+    def _align_returns(returns_stock, returns_market):
         # Kombiniere die Renditen und richte sie an den Daten aus
-        combined_returns = pd.concat([returns_stock.rename('stock'), returns_market.rename('market')], axis=1).dropna()
+        return pd.concat([returns_stock.rename('stock'), returns_market.rename('market')], axis=1, sort=True).dropna()
 
+    @staticmethod
+    def _beta_from_aligned(combined_returns, window):
         if combined_returns.empty:
             return pd.Series(dtype='float64')
 
@@ -107,3 +149,322 @@ class FinancialTools:
         beta = rolling_covariance / rolling_variance
         return beta.dropna()
 
+    # --- Panel-Varianten: Kurs-DataFrame (Datum x Symbol), alle Spalten in einem Durchgang ---
+    #
+    # Jede Spalte wird so behandelt, als würde die Einzelfunktion auf ihre gültigen (nicht-NaN)
+    # Kurse angewendet: Die gültigen Werte werden je Spalte nach oben verdichtet, die rollierenden
+    # Fenster über kumulierte Summen berechnet und die Ergebnisse an die Originaldaten zurückgeschrieben.
+    # Wo die Einzelfunktion keinen Wert liefert, enthält das Ergebnis NaN.
+
+    @staticmethod
+    def _compact(values, valid):
+        """
+        Verdichtet die gültigen Werte jeder Spalte an den Anfang (zeitliche Reihenfolge bleibt erhalten).
+        Gibt (order, compacted, counts) zurück; compacted ist hinter den gültigen Werten mit 0 gefüllt.
+        Sind alle Spalten in denselben Zeilen gültig, ist order ein 1D-Zeilenindex (ohne Sortierung).
+        """
+        rows = np.flatnonzero(valid.any(axis=1))
+        if valid[rows].all():
+            counts = np.full(values.shape[1], len(rows))
+            return rows, values[rows], counts
+        order = np.argsort(~valid, axis=0, kind='stable')
+        compacted = np.take_along_axis(values, order, axis=0)
+        counts = valid.sum(axis=0)
+        compacted[np.arange(values.shape[0])[:, None] >= counts] = 0.0
+        return order, compacted, counts
+
+    @staticmethod
+    def _expand(compacted, order, counts, like, first=0):
+        """
+        Schreibt verdichtete Ergebnisse an ihre ursprünglichen Datumszeilen zurück.
+        Nur die Zeilen first..counts-1 jeder Spalte gelten als Ergebnis, alle anderen Daten werden NaN.
+        """
+        compacted = np.where(FinancialTools._inside(compacted.shape[0], counts, first), compacted, np.nan)
+        values = np.full(like.shape, np.nan)
+        if order.ndim == 1:
+            values[order] = compacted
+        else:
+            np.put_along_axis(values, order, compacted, axis=0)
+        return pd.DataFrame(values, index=like.index, columns=like.columns)
+
+    @staticmethod
+    def _inside(length, counts, first=0):
+        rows = np.arange(length)[:, None]
+        return (rows >= first) & (rows < counts)
+
+    @staticmethod
+    def _rolling_sum(values, window):
+        """Rollierende Summe je Spalte über kumulierte Summen (die ersten window-1 Zeilen sind ungültig)."""
+        sums = np.zeros(values.shape)
+        if window <= values.shape[0]:
+            cumulative = np.cumsum(values, axis=0)
+            sums[window - 1] = cumulative[window - 1]
+            sums[window:] = cumulative[window:] - cumulative[:-window]
+        return sums
+
+    @staticmethod
+    def _compact_returns(prices_panel):
+        """
+        Verdichtete Dezimalrenditen je Spalte: Zeile k ist die Rendite zwischen der k-ten und
+        (k+1)-ten gültigen Beobachtung. Gibt (order, returns, counts) wie _compact zurück.
+        """
+        values = prices_panel.to_numpy(dtype='float64')
+        order, prices, counts = FinancialTools._compact(values, ~np.isnan(values))
+        with np.errstate(divide='ignore', invalid='ignore'):
+            returns = prices[1:] / prices[:-1] - 1
+        counts = np.maximum(counts - 1, 0)
+        returns[~FinancialTools._inside(returns.shape[0], counts)] = 0.0
+        return order[1:], returns, counts
+
+    @staticmethod
+    @timed(rows=len)
+    def calculate_returns_panel(prices_panel, in_percent=True):
+        """Berechnet die täglichen Renditen aller Spalten eines Kurs-DataFrames."""
+        order, returns, counts = FinancialTools._compact_returns(prices_panel)
+        if in_percent:
+            returns = returns * 100
+        return FinancialTools._expand(returns, order, counts, prices_panel)
+
+    @staticmethod
+    @timed(rows=len)
+    def calculate_cumulative_returns_panel(prices_panel):
+        """Berechnet die kumulativen Renditen aller Spalten eines Kurs-DataFrames."""
+        order, returns, counts = FinancialTools._compact_returns(prices_panel)
+        cumulative = np.cumprod(1 + returns, axis=0) - 1
+        return FinancialTools._expand(cumulative, order, counts, prices_panel)
+
+    @staticmethod
+    @timed(rows=len)
+    def calculate_moving_average_panel(prices_panel, window=20):
+        """Berechnet den gleitenden Durchschnitt aller Spalten eines Kurs-DataFrames."""
+        values = prices_panel.to_numpy(dtype='float64')
+        order, prices, counts = FinancialTools._compact(values, ~np.isnan(values))
+        average = FinancialTools._rolling_sum(prices, window) / window
+        return FinancialTools._expand(average, order, counts, prices_panel, first=window - 1)
+
+    @staticmethod
+    def _demean(values, counts):
+        """Zieht den Spaltenmittelwert der gültigen Zeilen ab (verbessert die Stabilität der kumulierten Summen)."""
+        inside = FinancialTools._inside(values.shape[0], counts)
+        return np.where(inside, values - values.sum(axis=0) / np.maximum(counts, 1), 0.0)
+
+    @staticmethod
+    def _rolling_variance(values, counts, window):
+        """Rollierende Stichprobenvarianz (ddof=1) eines verdichteten, mit 0 aufgefüllten Arrays."""
+        values = FinancialTools._demean(values, counts)
+        sums = FinancialTools._rolling_sum(values, window)
+        squares = FinancialTools._rolling_sum(values * values, window)
+        return (squares - sums * sums / window) / (window - 1)
+
+    @staticmethod
+    @timed(rows=len)
+    def calculate_volatility_panel(prices_panel, window=20, periods_per_year=TRADING_DAYS_PER_YEAR):
+        """Berechnet die annualisierte rollierende Volatilität aller Spalten eines Kurs-DataFrames."""
+        order, returns, counts = FinancialTools._compact_returns(prices_panel)
+        variance = FinancialTools._rolling_variance(returns, counts, window)
+        volatility = np.sqrt(np.clip(variance, 0, None)) * np.sqrt(periods_per_year)
+        return FinancialTools._expand(volatility, order, counts, prices_panel, first=window - 1)
+
+    @staticmethod
+    @timed(rows=len)
+    def calculate_beta_panel(prices_panel, market_prices, window=60):
+        """
+        Berechnet das rollierende Beta aller Spalten eines Kurs-DataFrames relativ zu einem Marktindex.
+        market_prices: Pandas Series (oder Kurs-DataFrame) des Marktindex
+        """
+        market_prices = FinancialTools._price_series(market_prices)
+        if market_prices is None:
+            return pd.DataFrame(np.nan, index=prices_panel.index, columns=prices_panel.columns)
+
+        stock_returns = FinancialTools.calculate_returns_panel(prices_panel, in_percent=False).to_numpy()
+        market_returns = FinancialTools.calculate_returns(market_prices, in_percent=False)
+        market_returns = market_returns.reindex(prices_panel.index).to_numpy(dtype='float64')
+
+        # Wie bei calculate_beta zählen nur Tage, an denen Aktie und Markt eine Rendite haben
+        valid = ~np.isnan(stock_returns) & ~np.isnan(market_returns)[:, None]
+        order, stock, counts = FinancialTools._compact(stock_returns, valid)
+        market = np.nan_to_num(market_returns)[order]
+        market_counts = counts
+        if market.ndim == 1:
+            # Alle Spalten teilen sich dieselben Zeilen: die Marktsummen werden nur einmal berechnet
+            market, market_counts = market[:, None], counts[:1]
+
+        # Rollierende Summen von Aktie, Markt und deren Produkten; der Faktor 1/(window-1) kürzt sich
+        stock = FinancialTools._demean(stock, counts)
+        market = FinancialTools._demean(market, market_counts)
+        sum_stock = FinancialTools._rolling_sum(stock, window)
+        sum_market = FinancialTools._rolling_sum(market, window)
+        covariance = FinancialTools._rolling_sum(stock * market, window) - sum_stock * sum_market / window
+        variance = FinancialTools._rolling_sum(market * market, window) - sum_market * sum_market / window
+        with np.errstate(divide='ignore', invalid='ignore'):
+            beta = covariance / variance
+        return FinancialTools._expand(beta, order, counts, prices_panel, first=window - 1)
+
+
+@dataclass(frozen=True)
+class IndicatorSpec:
+    """Ein Indikator mit seinen Parametern, z.B. IndicatorSpec('ma', 20) oder IndicatorSpec('beta', 60, 'SPY')."""
+    name: str
+    window: int | None = None
+    market: str | None = None
+
+    @classmethod
+    def parse(cls, text, default_market=DEFAULT_MARKET_SYMBOL):
+        """
+        Liest eine Angabe wie 'returns', 'ma:20', 'volatility:20', 'beta:60' oder 'beta:SPY:60'.
+        Ungültige Angaben lösen einen ValueError aus.
+        """
+        name, *params = text.split(":")
+        name = name.strip().lower()
+        if name not in INDICATORS:
+            raise ValueError(f"Unbekannter Indikator: {name} (möglich: {', '.join(INDICATORS)})")
+        if name in ("returns", "cumulative_returns"):
+            if params:
+                raise ValueError(f"{name} hat keine Parameter.")
+            return cls(name)
+        market = None
+        if name == "beta":
+            market = params.pop(0).upper() if len(params) == 2 else default_market
+        if len(params) != 1 or not params[0].isdigit() or int(params[0]) < 2:
+            raise ValueError(f"{text}: Fenster (ganze Zahl >= 2) erwartet, z.B. {name}:20.")
+        return cls(name, int(params[0]), market)
+
+    @classmethod
+    def from_key(cls, key):
+        """Gegenstück zu key: 'ma_20' -> IndicatorSpec('ma', 20), 'beta_SPY_60' -> IndicatorSpec('beta', 60, 'SPY')."""
+        name = next((name for name in sorted(INDICATORS, key=len, reverse=True)
+                     if key == name or key.startswith(name + "_")), None)
+        if name is None:
+            raise ValueError(f"Unbekannter Indikator-Schlüssel: {key}")
+        if name in ("returns", "cumulative_returns"):
+            return cls(name)
+        params = key[len(name) + 1:]
+        market, _, window = params.rpartition("_")
+        if not window.isdigit() or (name == "beta") != bool(market):
+            raise ValueError(f"Unbekannter Indikator-Schlüssel: {key}")
+        return cls(name, int(window), market or None)
+
+    @property
+    def key(self):
+        """Spaltenname bzw. Schlüssel in 'indicator_values', z.B. 'ma_20' oder 'beta_SPY_60'."""
+        return "_".join(str(part) for part in (self.name, self.market, self.window) if part is not None)
+
+    def compute(self, context, market_data=None):
+        """
+        Berechnet den Indikator für einen IndicatorContext wie die Tabs der Oberfläche.
+        market_data: Kurs-DataFrame des Markt-Symbols (nur für 'beta'; fehlt es, ist das Ergebnis leer).
+        """
+        if self.name == "returns":
+            return context.returns()
+        if self.name == "cumulative_returns":
+            return context.cumulative_returns()
+        if self.name == "ma":
+            return context.moving_average(window=self.window)
+        if self.name == "volatility":
+            return context.volatility(window=self.window)
+        if market_data is None or market_data.empty:
+            return pd.Series(dtype='float64')
+        return context.beta(self.market, market_data, window=self.window)
+
+
+def compute_indicators(context, specs, market_data=None):
+    """
+    Berechnet die Indikatoren specs für einen IndicatorContext und gibt sie als DataFrame
+    (Datumsindex, eine Spalte je spec.key) zurück. market_data: {Markt-Symbol: Kurs-DataFrame}.
+    """
+    columns = {spec.key: spec.compute(context, (market_data or {}).get(spec.market)) for spec in specs}
+    frame = pd.DataFrame(columns, index=context.data.index, columns=[spec.key for spec in specs])
+    return frame.dropna(how='all')
+
+
+class IndicatorContext:
+    """
+    Gemeinsame Zwischenergebnisse aller Indikatoren für einen Daten-Snapshot (z.B. ein Symbol und
+    einen Zeitraum). Kursreihe, Dezimalrenditen und die am Markt ausgerichteten Renditen werden nur
+    einmal berechnet und unter einem Schlüssel gespeichert; die Indikatoren bauen darauf auf.
+    report() zeigt, welche Ergebnisse berechnet und welche wiederverwendet wurden.
+    Ein Kontext kann in einem Hintergrund-Thread befüllt und danach im GUI-Thread gelesen werden.
+    stored(spec) kann gespeicherte Reihen für gleitenden Durchschnitt, Volatilität und Beta liefern
+    (z.B. StockDataManager.get_indicator für Symbol und Zeitraum des Snapshots); sie ersetzen dann
+    die Berechnung. periods_per_year annualisiert die Volatilität (siehe bars_per_year); gespeicherte
+    Reihen gelten für Tageskurse und werden nur mit dem Standardwert verwendet.
+    """
+
+    def __init__(self, data, stored=None, periods_per_year=TRADING_DAYS_PER_YEAR):
+        self.data = data
+        self.stored = stored if periods_per_year == TRADING_DAYS_PER_YEAR else None
+        self.periods_per_year = periods_per_year
+        self._results = {}
+        self.computed = []
+        self.reused = {}
+
+    def _memo(self, key, compute):
+        if key in self._results:
+            self.reused[key] = self.reused.get(key, 0) + 1
+            METRICS.count("indicator.reused")
+            return self._results[key]
+        # Die Zeit eines Indikators enthält die dabei erstmals berechneten Zwischenergebnisse
+        with span("indicator." + key[0]):
+            result = compute()
+        self._results[key] = result
+        self.computed.append(key)
+        return result
+
+    def _stored_or(self, spec, compute):
+        if self.stored is not None:
+            series = self.stored(spec)
+            if series is not None:
+                return series
+        return compute()
+
+    def prices(self):
+        """Kursreihe ('adj_close' bzw. 'close') des Snapshots."""
+        def compute():
+            prices = FinancialTools._price_series(self.data)
+            return pd.Series(dtype='float64') if prices is None else prices
+        return self._memo(("prices",), compute)
+
+    def returns(self, in_percent=False):
+        """Tägliche Renditen wie FinancialTools.calculate_returns."""
+        if in_percent:
+            return self._memo(("returns", "percent"), lambda: self.returns() * 100)
+        return self._memo(("returns",), lambda: FinancialTools.calculate_returns(self.prices(), in_percent=False))
+
+    def cumulative_returns(self):
+        return self._memo(("cumulative_returns",),
+                          lambda: FinancialTools._cumulative_from_returns(self.returns()))
+
+    def moving_average(self, window=20):
+        return self._memo(("moving_average", window), lambda: self._stored_or(
+            IndicatorSpec("ma", window),
+            lambda: FinancialTools.calculate_moving_average(self.prices(), window=window)))
+
+    def volatility(self, window=20):
+        return self._memo(("volatility", window), lambda: self._stored_or(
+            IndicatorSpec("volatility", window),
+            lambda: FinancialTools._volatility_from_returns(self.returns(), window, self.periods_per_year)))
+
+    def market_data(self, market_symbol, load):
+        """Kursdaten des Marktindex; load() wird je Snapshot und Markt-Symbol nur einmal aufgerufen."""
+        return self._memo(("market_data", market_symbol), load)
+
+    def aligned_market_returns(self, market_symbol, market_data):
+        """Aktien- und Marktrenditen, an gemeinsamen Tagen ausgerichtet (Spalten 'stock' und 'market')."""
+        def compute():
+            market_returns = FinancialTools.calculate_returns(market_data, in_percent=False)
+            return FinancialTools._align_returns(self.returns(), market_returns)
+        return self._memo(("aligned_market_returns", market_symbol), compute)
+
+    def beta(self, market_symbol, market_data, window=60):
+        """Rollierendes Beta wie FinancialTools.calculate_beta; market_symbol dient als Cache-Schlüssel."""
+        if self.prices().empty or market_data.empty:
+            return pd.Series(dtype='float64')
+        def compute():
+            return FinancialTools._beta_from_aligned(self.aligned_market_returns(market_symbol, market_data), window)
+        # Gespeicherte Reihen enthalten auch Tage ohne Wert; calculate_beta lässt diese weg
+        return self._memo(("beta", market_symbol, window), lambda: self._stored_or(
+            IndicatorSpec("beta", window, market_symbol), compute).dropna())
+
+    def report(self):
+        """Gibt die berechneten und die wiederverwendeten Ergebnisse (mit Anzahl) zurück."""
+        return {"computed": list(self.computed), "reused": dict(self.reused)}
@@ -0,0 +1,218 @@
+from functools import wraps
+import json
+import logging
+import os
+import threading
+import time
+
+
+logger = logging.getLogger(__name__)
+
+# Zeitmessungen werden in Buckets mit Zweierpotenzen von Mikrosekunden einsortiert
+# (Bucket k: unter 2**k µs); der letzte Bucket nimmt alles ab etwa 9 Minuten auf.
+HISTOGRAM_BUCKETS = 30
+
+
+class Histogram:
+    """Latenzverteilung einer Operation: Anzahl, Summe, Extremwerte, Zeilen und Bucket-Zähler."""
+
+    __slots__ = ("count", "total", "min", "max", "rows", "buckets")
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.min = float("inf")
+        self.max = 0.0
+        self.rows = 0
+        self.buckets = [0] * HISTOGRAM_BUCKETS
+
+    def add(self, seconds, rows=None):
+        self.count += 1
+        self.total += seconds
+        self.min = min(self.min, seconds)
+        self.max = max(self.max, seconds)
+        if rows:
+            self.rows += rows
+        self.buckets[min(int(seconds * 1e6).bit_length(), HISTOGRAM_BUCKETS - 1)] += 1
+
+    def quantile(self, q):
+        """Schätzt das q-Quantil (0..1) als Obergrenze des Buckets, in dem es liegt (in Sekunden)."""
+        if not self.count:
+            return 0.0
+        target = q * self.count
+        seen = 0
+        for k, hits in enumerate(self.buckets):
+            seen += hits
+            if seen >= target:
+                return min(2 ** k / 1e6, self.max)
+        return self.max
+
+    def as_dict(self):
+        return {
+            "count": self.count,
+            "total": self.total,
+            "mean": self.total / self.count if self.count else 0.0,
+            "min": self.min if self.count else 0.0,
+            "p50": self.quantile(0.5),
+            "p95": self.quantile(0.95),
+            "max": self.max,
+            "rows": self.rows,
+        }
+
+
+class _Span:
+    """Misst die Laufzeit eines with-Blocks; rows kann innerhalb des Blocks gesetzt werden."""
+
+    __slots__ = ("metrics", "name", "rows", "started")
+
+    def __init__(self, metrics, name, rows):
+        self.metrics = metrics
+        self.name = name
+        self.rows = rows
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        self.metrics.record(self.name, time.perf_counter() - self.started, self.rows)
+        return False
+
+
+class _NullSpan:
+    """Ersatz für _Span bei deaktivierter Messung (ein gemeinsames Objekt, keine Zeitmessung)."""
+
+    rows = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        return False
+
+    def __setattr__(self, name, value):
+        pass
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class Metrics:
+    """
+    Thread-sichere Sammlung von Laufzeit-Histogrammen und Zählern je Operation.
+    Solange enabled False ist, kosten span(), count() und @timed nur eine Attributabfrage.
+    """
+
+    def __init__(self, enabled=False):
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._histograms = {}
+        self._counters = {}
+        self._last = {}
+
+    def span(self, name, rows=None):
+        """Kontextmanager, der die Laufzeit des Blocks unter name erfasst."""
+        if not self.enabled:
+            return _NULL_SPAN
+        return _Span(self, name, rows)
+
+    def record(self, name, seconds, rows=None):
+        """Erfasst eine bereits gemessene Laufzeit (in Sekunden) und optional die Anzahl der Zeilen."""
+        with self._lock:
+            histogram = self._histograms.get(name)
+            if histogram is None:
+                histogram = self._histograms[name] = Histogram()
+            histogram.add(seconds, rows)
+            self._last[name] = seconds
+
+    def count(self, name, n=1):
+        """Erhöht den Zähler name um n."""
+        if not self.enabled:
+            return
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + n
+
+    def last(self, name):
+        """Gibt die zuletzt gemessene Laufzeit von name zurück (None, falls noch nicht gemessen)."""
+        with self._lock:
+            return self._last.get(name)
+
+    def reset(self):
+        with self._lock:
+            self._histograms.clear()
+            self._counters.clear()
+            self._last.clear()
+
+    def snapshot(self):
+        """Gibt alle Messwerte als Dictionary zurück: {'timings': {name: {...}}, 'counters': {name: n}}."""
+        with self._lock:
+            return {
+                "timings": {name: histogram.as_dict() for name, histogram in sorted(self._histograms.items())},
+                "counters": dict(sorted(self._counters.items())),
+            }
+
+    def format_stats(self):
+        """Gibt die Messwerte als Texttabelle zurück."""
+        stats = self.snapshot()
+        lines = [f"{'Operation':<48} {'Anzahl':>8} {'Ø [ms]':>9} {'p50 [ms]':>9} {'p95 [ms]':>9} "
+                 f"{'max [ms]':>9} {'Summe [s]':>10} {'Zeilen':>10}"]
+        for name, timing in stats["timings"].items():
+            lines.append(f"{name:<48} {timing['count']:>8} {timing['mean'] * 1e3:>9.2f} "
+                         f"{timing['p50'] * 1e3:>9.2f} {timing['p95'] * 1e3:>9.2f} {timing['max'] * 1e3:>9.2f} "
+                         f"{timing['total']:>10.3f} {timing['rows']:>10}")
+        for name, value in stats["counters"].items():
+            lines.append(f"{name:<48} {value:>8}")
+        return "\n".join(lines)
+
+    def log_stats(self, level=logging.INFO):
+        """Schreibt die Messwerte in das Log (z.B. beim Beenden des Programms)."""
+        if self._histograms or self._counters:
+            logger.log(level, "Messwerte:\n%s", self.format_stats())
+
+    def dump(self, path):
+        """Speichert snapshot() als JSON-Datei."""
+        with open(path, "w", encoding="utf-8") as file:
+            json.dump(self.snapshot(), file, indent=2)
+
+
+# Globale Messwerte; aktivierbar über die Umgebungsvariable AKTIEN_METRICS=1 oder METRICS.enabled
+METRICS = Metrics(enabled=os.environ.get("AKTIEN_METRICS", "0") not in ("", "0"))
+
+
+def span(name, rows=None):
+    """Kurzform für METRICS.span."""
+    return METRICS.span(name, rows)
+
+
+def timed(name=None, rows=None):
+    """
+    Dekorator, der jeden Aufruf der Funktion unter name (Standard: qualifizierter Funktionsname) misst.
+    rows(ergebnis) liefert optional die Anzahl der verarbeiteten Zeilen.
+    """
+    def decorator(fn):
+        label = name or fn.__qualname__
+
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not METRICS.enabled:
+                return fn(*args, **kwargs)
+            started = time.perf_counter()
+            result = None
+            try:
+                result = fn(*args, **kwargs)
+                return result
+            finally:
+                METRICS.record(label, time.perf_counter() - started,
+                               rows(result) if rows is not None and result is not None else None)
+        return wrapper
+    return decorator
+
+
+def configure_logging(level=None):
+    """
+    Richtet die Protokollausgabe auf stderr ein. Ohne level gilt die Umgebungsvariable
+    AKTIEN_LOG_LEVEL (z.B. 'DEBUG', 'INFO'), sonst 'WARNING'.
+    """
+    level = level or os.environ.get("AKTIEN_LOG_LEVEL", "WARNING")
+    logging.basicConfig(level=level.upper() if isinstance(level, str) else level,
+                        format="%(asctime)s %(levelname)-7s %(name)s: %(message)s")
@@ -1,40 +1,65 @@
+import time
+
+# Zeitpunkt des Programmstarts für den Startbericht (vor allen übrigen Importen gemessen)
+STARTED = time.perf_counter()
+
+import argparse
 import datetime
+import logging
 import sys
 
-from PyQt6.QtCore import QDate
+from PyQt6.QtCore import QDate, QTimer
 from PyQt6.QtWidgets import (QApplication, QMainWindow, QTabWidget, QWidget,
                              QVBoxLayout, QHBoxLayout, QPushButton, QLabel,
                              QComboBox, QLineEdit, QListWidget, QListWidgetItem,
-                             QMessageBox, QDateEdit, QSizePolicy)
-from matplotlib.backends.backend_qtagg import FigureCanvasQTAgg as FigureCanvas
-from matplotlib.figure import Figure
+                             QMessageBox, QDateEdit, QSizePolicy, QProgressBar, QCheckBox,
+                             QTableWidget, QTableWidgetItem, QHeaderView)
 
-from financial_tools import FinancialTools
-import pandas as pd
-from stock_data_manager import StockDataManager
+from background_jobs import JobRunner
+from instrumentation import METRICS, configure_logging, span
 
+# pandas, matplotlib, die Datenbank und yfinance werden erst bei Bedarf importiert (siehe
+# _start_up und _canvas), damit das Hauptfenster ohne diese Importe erscheint
 
-class MplCanvas(FigureCanvas):
-    """Matplotlib Canvas für die Einbettung in PyQt."""
-
-    def __init__(self, parent=None, width=5, height=4, dpi=100):
-        fig = Figure(figsize=(width, height), dpi=dpi)
-        self.axes = fig.add_subplot(111)
-        super(MplCanvas, self).__init__(fig)
-        self.setParent(parent)
-        self.setSizePolicy(QSizePolicy.Policy.Expanding, QSizePolicy.Policy.Expanding)
-        self.updateGeometry()
+logger = logging.getLogger(__name__)
 
 
 class StockAnalyzer(QMainWindow):
 
-    def __init__(self):
+    INDICATOR_TABS = ("overview", "returns", "ma", "volatility", "beta")
+    # Die Übersicht lädt die gröbste Auflösung, die noch einen Kurspunkt je PIXELS_PER_POINT Pixel liefert
+    PIXELS_PER_POINT = 3
+    RESOLUTION_LABELS = {"daily": "Tageskurse", "weekly": "Wochenkurse", "monthly": "Monatskurse"}
+
+    def __init__(self, db_manager=None, startup_report=False):
+        """
+        db_manager: vorhandener StockDataManager (z.B. für Benchmarks), sonst 'stock_analysis.db'.
+        Das Fenster erscheint, bevor Daten geladen werden: Die Datenbank wird nach dem ersten Anzeigen
+        im Hintergrund geöffnet (ready wird danach True), die Diagramme entstehen erst, wenn ihr Tab
+        zum ersten Mal sichtbar ist. startup_report=True gibt die Startzeiten aus und beendet das
+        Programm, sobald der erste Tab gezeichnet ist.
+        """
+        self._startup_times = [("Hauptfenster wird erstellt", time.perf_counter())]
+        self._startup_report = startup_report
         super().__init__()
         self.setWindowTitle("Aktienanalyse-Tool")
         self.setGeometry(100, 100, 1200, 800)
 
-        self.db_manager = StockDataManager("stock_analysis.db")
-        self.financial_tools = FinancialTools()
+        self.db_manager = db_manager
+        self._started = False
+        self.ready = False
+        self._indicator_context: "IndicatorContext | None" = None
+        self._indicator_context_key = None
+        # Zuletzt übernommene Tab-Eingaben und Marktdaten sowie noch nicht gezeichnete Tabs
+        self._indicator_values = {}
+        self._dirty_tabs = set()
+        # Bestandsdatei und Zeitraum der angezeigten Portfolio-Bewertung (None: neu berechnen)
+        self._portfolio_key = None
+        # Netzwerkzugriffe und Berechnungen laufen im Hintergrund, damit die Oberfläche bedienbar bleibt
+        self.jobs = JobRunner(parent=self)
+        # Diagramme je Tab: Platzhalter (mit Höhe in Zoll) und die beim ersten Anzeigen angelegten MplCanvas
+        self._canvas_slots = {}
+        self._canvases = {}
 
         self.central_widget = QWidget()
         self.setCentralWidget(self.central_widget)
@@ -42,7 +67,75 @@ class StockAnalyzer(QMainWindow):
 
         self._create_top_panel()
         self._create_tabs()
-        self._load_initial_data()
+        self._create_status_bar()
+        # Bis die Datenbank geöffnet ist, sind keine Eingaben möglich
+        self.central_widget.setEnabled(False)
+        self.statusBar().showMessage("Öffne Datenbank ...")
+        self._mark_startup("Hauptfenster erstellt")
+
+    def showEvent(self, event):
+        super().showEvent(event)
+        if not self._started:
+            self._started = True
+            # Erst nach dem Zeichnen des Fensters starten (nächster Durchlauf der Ereignisschleife)
+            QTimer.singleShot(0, self._start_up)
+
+    def _start_up(self):
+        """Öffnet die Datenbank im Hintergrund; pandas und die Datenmodule werden dort importiert."""
+        self._mark_startup("Fenster angezeigt")
+        self.jobs.submit("startup", self._open_database, self.db_manager,
+                         on_finished=self._startup_finished, on_failed=self._startup_failed)
+
+    def _open_database(self, job, db_manager):
+        """Hintergrund-Job: öffnet die Datenbank (falls nötig) und liest die Symbole für die Auswahl."""
+        with span("gui.startup"):
+            if db_manager is None:
+                from stock_data_manager import StockDataManager
+                # Vorhandene Datenbanken behalten ihr Layout; umgewandelt wird nur ausdrücklich
+                db_manager = StockDataManager("stock_analysis.db", layout=None)
+                if getattr(db_manager.storage, "layout", None) == "legacy":
+                    logger.info("'stock_analysis.db' nutzt das alte Layout; umwandeln mit "
+                                "'python storage_backends.py --compact stock_analysis.db'.")
+            symbols = self._stored_symbols(db_manager)
+            # Module der Indikatoren und Diagramme vorab laden, damit der GUI-Thread nicht auf sie wartet
+            import financial_tools
+            import plot_canvas
+        return db_manager, symbols
+
+    def _startup_finished(self, result):
+        self.db_manager, symbols = result
+        self._mark_startup("Datenbank geöffnet")
+        self.ready = True
+        self.central_widget.setEnabled(True)
+        self.statusBar().clearMessage()
+        self._show_symbols(symbols)
+        self._render_visible_tab()
+        if not symbols:
+            self._finish_startup()
+
+    def _startup_failed(self, message):
+        self.ready = True
+        self.statusBar().clearMessage()
+        QMessageBox.critical(self, "Fehler", f"Die Datenbank konnte nicht geöffnet werden: {message}")
+        self._finish_startup()
+
+    def _mark_startup(self, phase):
+        """Vermerkt den Zeitpunkt einer Startphase für den Startbericht."""
+        if self._startup_times is not None:
+            self._startup_times.append((phase, time.perf_counter()))
+
+    def _finish_startup(self, phase=None):
+        """Schreibt den Startbericht (Zeit je Phase ab Programmstart) in das Log bzw. auf stdout."""
+        if self._startup_times is None:
+            return
+        if phase:
+            self._mark_startup(phase)
+        times, self._startup_times = self._startup_times, None
+        report = "\n".join(f"  {phase:<28} {(moment - STARTED) * 1e3:>8.0f} ms" for phase, moment in times)
+        logger.info("Startzeiten ab Programmstart:\n%s", report)
+        if self._startup_report:
+            print(f"Startzeiten ab Programmstart:\n{report}")
+            self.close()
 
     def _create_top_panel(self):
         """Erstellt das obere Panel für CSV-Import und Symbol-Auswahl."""
@@ -50,7 +143,7 @@ class StockAnalyzer(QMainWindow):
 
         # CSV Import
         csv_group_layout = QVBoxLayout()
-        csv_group_layout.addWidget(QLabel("CSV-Datei mit Symbolen importieren (Symbol,CompanyName):"))
+        csv_group_layout.addWidget(QLabel("CSV-Datei mit Symbolen/Beständen importieren (Symbol,Name,...):"))
         self.csv_path_input = QLineEdit("stocks.csv")
         csv_group_layout.addWidget(self.csv_path_input)
         import_csv_button = QPushButton("CSV importieren & Daten holen")
@@ -72,10 +165,12 @@ class StockAnalyzer(QMainWindow):
         date_range_layout.addWidget(QLabel("Von:"))
         self.start_date_edit = QDateEdit(QDate.currentDate().addYears(-1))
         self.start_date_edit.setCalendarPopup(True)
+        self.start_date_edit.dateChanged.connect(self.plot_all_tabs)
         date_range_layout.addWidget(self.start_date_edit)
         date_range_layout.addWidget(QLabel("Bis:"))
         self.end_date_edit = QDateEdit(QDate.currentDate())
         self.end_date_edit.setCalendarPopup(True)
+        self.end_date_edit.dateChanged.connect(self.plot_all_tabs)
         date_range_layout.addWidget(self.end_date_edit)
         symbol_selection_layout.addLayout(date_range_layout)
 
@@ -113,17 +208,103 @@ class StockAnalyzer(QMainWindow):
         self.tabs.addTab(self.tab_beta, "Beta (Marktabhängigkeit)")
         self._setup_beta_tab()
 
+        self.tab_portfolio = QWidget()
+        self.tabs.addTab(self.tab_portfolio, "Portfolio")
+        self._setup_portfolio_tab()
+
+        self._tab_names = {self.tab_overview: "overview", self.tab_returns: "returns", self.tab_ma: "ma",
+                           self.tab_volatility: "volatility", self.tab_beta: "beta",
+                           self.tab_portfolio: "portfolio"}
+        self._tab_views = {
+            "overview": (self.overview_text, self._plot_overview),
+            "returns": (self.returns_text, self._plot_returns),
+            "ma": (self.ma_text, self._plot_ma),
+            "volatility": (self.vol_text, self._plot_volatility),
+            "beta": (self.beta_text, self._plot_beta),
+        }
+        # Nicht sichtbare Tabs werden erst beim Umschalten gezeichnet
+        self.tabs.currentChanged.connect(lambda index: self._render_visible_tab())
+
+    def _create_status_bar(self):
+        """Erstellt die Statusleiste mit Fortschrittsanzeige für Hintergrund-Jobs und Messwertanzeige."""
+        self.metrics_label = QLabel()
+        self.statusBar().addPermanentWidget(self.metrics_label)
+        self.metrics_checkbox = QCheckBox("Messwerte")
+        self.metrics_checkbox.setChecked(METRICS.enabled)
+        self.metrics_checkbox.toggled.connect(self._toggle_metrics)
+        self.statusBar().addPermanentWidget(self.metrics_checkbox)
+        self.metrics_timer = QTimer(self)
+        self.metrics_timer.setInterval(1000)
+        self.metrics_timer.timeout.connect(self._update_metrics_label)
+        self._toggle_metrics(METRICS.enabled)
+
+        self.progress_bar = QProgressBar()
+        self.progress_bar.setMaximumWidth(250)
+        self.progress_bar.hide()
+        self.statusBar().addPermanentWidget(self.progress_bar)
+        self.cancel_import_button = QPushButton("Abbrechen")
+        self.cancel_import_button.clicked.connect(self._cancel_import)
+        self.cancel_import_button.hide()
+        self.statusBar().addPermanentWidget(self.cancel_import_button)
+
+    def _toggle_metrics(self, enabled):
+        """Schaltet die Zeitmessung ein oder aus; die Anzeige wird jede Sekunde aktualisiert."""
+        METRICS.enabled = enabled
+        if enabled:
+            self.metrics_timer.start()
+            self._update_metrics_label()
+        else:
+            self.metrics_timer.stop()
+            self.metrics_label.clear()
+
+    def _update_metrics_label(self):
+        """Zeigt die letzte Zeichenzeit und die Datenbankzugriffe an; der Tooltip enthält alle Messwerte."""
+        stats = METRICS.snapshot()
+        parts = []
+        name = self._tab_names.get(self.tabs.currentWidget())
+        render = METRICS.last(f"gui.render.{name}")
+        if render is not None:
+            parts.append(f"Zeichnen: {render * 1e3:.0f} ms")
+        indicators = METRICS.last("gui.indicators")
+        if indicators is not None:
+            parts.append(f"Indikatoren: {indicators * 1e3:.0f} ms")
+        queries = [timing for key, timing in stats["timings"].items() if key.endswith(".query_history")]
+        count = sum(timing["count"] for timing in queries)
+        if count:
+            mean = sum(timing["total"] for timing in queries) / count
+            parts.append(f"DB-Abfragen: {count} (Ø {mean * 1e3:.1f} ms)")
+        self.metrics_label.setText(" | ".join(parts))
+        self.metrics_label.setToolTip(METRICS.format_stats())
+
+    def _canvas_slot(self, name, height=6):
+        """Platzhalter für Diagramm und Werkzeugleiste des Tabs name; beides legt _canvas() an."""
+        slot = QWidget()
+        slot.setSizePolicy(QSizePolicy.Policy.Expanding, QSizePolicy.Policy.Expanding)
+        QVBoxLayout(slot).setContentsMargins(0, 0, 0, 0)
+        self._canvas_slots[name] = (slot, height)
+        return slot
+
+    def _canvas(self, name):
+        """Gibt das Diagramm des Tabs name zurück; beim ersten Zugriff wird es angelegt (und matplotlib importiert)."""
+        canvas = self._canvases.get(name)
+        if canvas is None:
+            from plot_canvas import MplCanvas, NavigationToolbar
+            slot, height = self._canvas_slots[name]
+            with span("gui.create_canvas"):
+                canvas = self._canvases[name] = MplCanvas(slot, width=10, height=height)
+                slot.layout().addWidget(NavigationToolbar(canvas, slot))
+                slot.layout().addWidget(canvas)
+        return canvas
+
     def _setup_overview_tab(self):
         layout = QVBoxLayout(self.tab_overview)
-        self.overview_canvas = MplCanvas(self.tab_overview, width=10, height=6)
-        layout.addWidget(self.overview_canvas)
+        layout.addWidget(self._canvas_slot("overview"))
         self.overview_text = QLabel("Kursdaten:")
         layout.addWidget(self.overview_text)
 
     def _setup_returns_tab(self):
         layout = QVBoxLayout(self.tab_returns)
-        self.returns_canvas = MplCanvas(self.tab_returns, width=10, height=6)
-        layout.addWidget(self.returns_canvas)
+        layout.addWidget(self._canvas_slot("returns"))
         self.returns_text = QLabel("Renditen:")
         layout.addWidget(self.returns_text)
 
@@ -135,13 +316,12 @@ class StockAnalyzer(QMainWindow):
         self.ma_window_input.setFixedWidth(50)
         ma_controls_layout.addWidget(self.ma_window_input)
         self.ma_apply_button = QPushButton("Anwenden")
-        self.ma_apply_button.clicked.connect(self._plot_ma)
+        self.ma_apply_button.clicked.connect(lambda: self._schedule_indicators(("ma",)))
         ma_controls_layout.addWidget(self.ma_apply_button)
         ma_controls_layout.addStretch(1)
         layout.addLayout(ma_controls_layout)
 
-        self.ma_canvas = MplCanvas(self.tab_ma, width=10, height=6)
-        layout.addWidget(self.ma_canvas)
+        layout.addWidget(self._canvas_slot("ma"))
         self.ma_text = QLabel("Gleitender Durchschnitt:")
         layout.addWidget(self.ma_text)
 
@@ -153,12 +333,11 @@ class StockAnalyzer(QMainWindow):
         self.vol_window_input.setFixedWidth(50)
         vol_controls_layout.addWidget(self.vol_window_input)
         self.vol_apply_button = QPushButton("Anwenden")
-        self.vol_apply_button.clicked.connect(self._plot_volatility)
+        self.vol_apply_button.clicked.connect(lambda: self._schedule_indicators(("volatility",)))
         vol_controls_layout.addStretch(1)
         layout.addLayout(vol_controls_layout)
 
-        self.vol_canvas = MplCanvas(self.tab_volatility, width=10, height=6)
-        layout.addWidget(self.vol_canvas)
+        layout.addWidget(self._canvas_slot("volatility"))
         self.vol_text = QLabel("Volatilität:")
         layout.addWidget(self.vol_text)
 
@@ -174,84 +353,163 @@ class StockAnalyzer(QMainWindow):
         self.beta_window_input.setFixedWidth(50)
         beta_controls_layout.addWidget(self.beta_window_input)
         self.beta_apply_button = QPushButton("Anwenden")
-        self.beta_apply_button.clicked.connect(self._plot_beta)
+        self.beta_apply_button.clicked.connect(lambda: self._schedule_indicators(("beta",)))
         beta_controls_layout.addStretch(1)
         layout.addLayout(beta_controls_layout)
 
-        self.beta_canvas = MplCanvas(self.tab_beta, width=10, height=6)
-        layout.addWidget(self.beta_canvas)
+        layout.addWidget(self._canvas_slot("beta"))
         self.beta_text = QLabel("Beta-Wert:")
         layout.addWidget(self.beta_text)
 
+    def _setup_portfolio_tab(self):
+        layout = QVBoxLayout(self.tab_portfolio)
+        portfolio_controls_layout = QHBoxLayout()
+        portfolio_controls_layout.addWidget(QLabel("Bestände aus der CSV-Datei oben; Markt-Symbol und Fenster "
+                                                   "wie in den Tabs Volatilität und Beta."))
+        self.portfolio_apply_button = QPushButton("Portfolio berechnen")
+        self.portfolio_apply_button.clicked.connect(self._schedule_portfolio)
+        portfolio_controls_layout.addWidget(self.portfolio_apply_button)
+        portfolio_controls_layout.addStretch(1)
+        layout.addLayout(portfolio_controls_layout)
+
+        layout.addWidget(self._canvas_slot("portfolio", height=4), 2)
+        self.portfolio_table = QTableWidget(0, 8)
+        self.portfolio_table.setHorizontalHeaderLabels(["Symbol", "Name", "Branche", "Anzahl", "Einstandswert",
+                                                        "Marktwert", "Gewinn/Verlust", "Gewicht"])
+        self.portfolio_table.horizontalHeader().setSectionResizeMode(QHeaderView.ResizeMode.Stretch)
+        self.portfolio_table.setEditTriggers(QTableWidget.EditTrigger.NoEditTriggers)
+        layout.addWidget(self.portfolio_table, 1)
+        self.portfolio_text = QLabel("Portfolio:")
+        self.portfolio_text.setWordWrap(True)
+        layout.addWidget(self.portfolio_text)
+
     def _load_initial_data(self):
         """Lädt initial alle Symbole in die ComboBox."""
-        symbols = self.db_manager.get_all_symbols()
+        self._show_symbols(self._stored_symbols(self.db_manager))
+
+    @staticmethod
+    def _stored_symbols(db_manager):
+        """Gibt die gespeicherten Symbole zurück; eine leere Datenbank erhält Standard-Symbole."""
+        symbols = db_manager.get_all_symbols()
         if not symbols:
             default_symbols = ["AAPL", "MSFT", "GOOGL"]
             for s in default_symbols:
-                self.db_manager.add_stock(s)
+                db_manager.add_stock(s)
             symbols = default_symbols
             # Optional: Initialdaten für Standard-Symbole holen
             # for s in symbols:
-            #     self.db_manager.fetch_and_store_data(s, period="1y")
+            #     db_manager.fetch_and_store_data(s, period="1y")
+        return symbols
 
+    def _show_symbols(self, symbols):
         self.symbol_combo.clear()
         self.symbol_combo.addItems(symbols)
         if symbols:
             self._on_symbol_selected(0)
 
     def _import_csv_and_fetch(self):
-        """Importiert Symbole aus CSV und holt Daten."""
+        """Importiert Symbole aus CSV und holt die Daten aller Symbole parallel im Hintergrund."""
+        if self.jobs.is_running("import"):
+            QMessageBox.information(self, "Info", "Es läuft bereits ein Import.")
+            return
         csv_file = self.csv_path_input.text()
+        import pandas as pd
         try:
             df_symbols = pd.read_csv(csv_file)
-            imported_count = 0
-            fetched_count = 0
-            for index, row in df_symbols.iterrows():
-                symbol = row['Symbol'].upper()
-                company_name = row.get('CompanyName', '')
-                if self.db_manager.add_stock(symbol, company_name):
-                    imported_count += 1
-                if self.db_manager.fetch_and_store_data(symbol, period="max"): 
-                    fetched_count += 1
-            
-            QMessageBox.information(self, "Import abgeschlossen",
-                                    f"{imported_count} neue Symbole hinzugefügt.\n{fetched_count} Symbole aktualisiert/Daten geholt.")
-            self._load_initial_data() 
+            symbols = df_symbols['Symbol'].astype(str).str.upper().tolist()
+            # Bestandsdateien wie stocks.csv führen den Firmennamen in der Spalte 'Name'
+            name_column = next((column for column in ('CompanyName', 'Name') if column in df_symbols), None)
+            company_names = df_symbols[name_column].fillna('').tolist() if name_column else [''] * len(symbols)
         except FileNotFoundError:
             QMessageBox.warning(self, "Fehler", f"Datei '{csv_file}' nicht gefunden.")
+            return
         except KeyError:
             QMessageBox.warning(self, "Fehler", f"Die CSV-Datei muss Spalten 'Symbol' und optional 'CompanyName' enthalten.")
+            return
         except Exception as e:
             QMessageBox.critical(self, "Fehler", f"Ein unerwarteter Fehler ist aufgetreten: {e}")
+            return
+
+        self._show_progress(0, len(symbols), "Importiere Symbole ...")
+        self.cancel_import_button.show()
+        self.jobs.submit("import", self._run_import, symbols, company_names,
+                         on_finished=self._import_finished, on_failed=self._import_failed,
+                         on_progress=lambda done, total, symbol: self._show_progress(
+                             done, total, f"Import: {symbol} ({done}/{total})"))
+
+    def _run_import(self, job, symbols, company_names):
+        """Hintergrund-Job: speichert die Symbole und holt deren Kursdaten."""
+        known_symbols = set(self.db_manager.get_all_symbols())
+        self.db_manager.add_stocks(zip(symbols, company_names))
+        imported_count = len(set(symbols) - known_symbols)
+        job.check_cancelled()
+        report = self.db_manager.fetch_and_store_many(symbols, period="max", progress=job.report_progress,
+                                                      cancel_event=job.cancel_event)
+        return imported_count, report
+
+    def _import_finished(self, result):
+        imported_count, report = result
+        self._hide_progress("Import abgeschlossen.")
+        message = (f"{imported_count} neue Symbole hinzugefügt.\n"
+                   f"{len(report.succeeded)} Symbole aktualisiert/Daten geholt "
+                   f"({report.rows} Kurse in {report.elapsed:.1f} s).")
+        if report.failed:
+            message += f"\nFehlgeschlagen: {', '.join(sorted(report.failed))}"
+        QMessageBox.information(self, "Import abgeschlossen", message)
+        self._portfolio_key = None
+        self._load_initial_data()
+
+    def _import_failed(self, message):
+        self._hide_progress("Import fehlgeschlagen.")
+        QMessageBox.critical(self, "Fehler", f"Ein unerwarteter Fehler ist aufgetreten: {message}")
+
+    def _cancel_import(self):
+        """Bricht den laufenden Import ab; bereits geladene Kurse bleiben gespeichert."""
+        self.jobs.cancel("import")
+        self._hide_progress("Import abgebrochen. Bereits geladene Kurse wurden gespeichert.")
+        self._load_initial_data()
 
     def _refresh_selected_stock_data(self):
-        """Holt aktuelle Daten für das gerade ausgewählte Symbol."""
+        """Holt aktuelle Daten für das gerade ausgewählte Symbol im Hintergrund."""
         selected_symbol = self.symbol_combo.currentText()
         if selected_symbol:
-            # Holen der neuesten Daten (yfinance holt automatisch nur die fehlenden)
-            if self.db_manager.fetch_and_store_data(selected_symbol, period="max"):
-                QMessageBox.information(self, "Aktualisiert", f"Daten für {selected_symbol} wurden aktualisiert.")
-                self._on_symbol_selected(self.symbol_combo.currentIndex())  # Ansichten neu laden
-            else:
-                QMessageBox.warning(self, "Fehler", f"Konnte Daten für {selected_symbol} nicht aktualisieren.")
+            self.statusBar().showMessage(f"Aktualisiere {selected_symbol} ...")
+            # Holen der neuesten Daten (es werden nur die noch fehlenden Tage geladen)
+            self.jobs.submit("refresh", lambda job: (selected_symbol, self.db_manager.fetch_and_store_data(
+                                 selected_symbol, period="max")),
+                             on_finished=self._refresh_finished, on_failed=self._job_failed)
         else:
             QMessageBox.information(self, "Info", "Kein Symbol ausgewählt.")
 
-    def _get_current_stock_data(self):
-        """Hilfsfunktion zum Abrufen der aktuellen Aktiendaten basierend auf Auswahl."""
-        selected_symbol = self.symbol_combo.currentText()
-        if not selected_symbol:
-            return pd.DataFrame()
+    def _refresh_finished(self, result):
+        symbol, success = result
+        self.statusBar().clearMessage()
+        if success:
+            QMessageBox.information(self, "Aktualisiert", f"Daten für {symbol} wurden aktualisiert.")
+            if symbol == self.symbol_combo.currentText():
+                self.plot_all_tabs()  # Ansichten neu laden
+        else:
+            QMessageBox.warning(self, "Fehler", f"Konnte Daten für {symbol} nicht aktualisieren.")
+
+    def _job_failed(self, message):
+        self.statusBar().showMessage(f"Fehler: {message}", 10000)
 
-        start_date_q = self.start_date_edit.date()
-        end_date_q = self.end_date_edit.date()
+    def _show_progress(self, done, total, text):
+        self.progress_bar.setRange(0, max(total, 1))
+        self.progress_bar.setValue(done)
+        self.progress_bar.show()
+        self.statusBar().showMessage(text)
 
-        start_date_str = start_date_q.toString("yyyy-MM-dd")
-        end_date_str = end_date_q.toString("yyyy-MM-dd")
+    def _hide_progress(self, text=""):
+        self.progress_bar.hide()
+        self.cancel_import_button.hide()
+        self.statusBar().showMessage(text, 5000)
 
-        data = self.db_manager.get_stock_data(selected_symbol, start_date_str, end_date_str)
-        return data
+    def _current_snapshot(self):
+        """Symbol und Zeitraum der aktuellen Auswahl; bestimmt, welche Daten die Tabs anzeigen."""
+        return (self.symbol_combo.currentText(),
+                self.start_date_edit.date().toString("yyyy-MM-dd"),
+                self.end_date_edit.date().toString("yyyy-MM-dd"))
 
     def _on_symbol_selected(self, index):
         """Wird aufgerufen, wenn ein neues Symbol in der ComboBox ausgewählt wird."""
@@ -259,66 +517,212 @@ class StockAnalyzer(QMainWindow):
 
     def plot_all_tabs(self):
         """Aktualisiert alle Diagramme und Texte in den Tabs."""
-        data = self._get_current_stock_data()
-        if data.empty:
-            self._clear_all_plots()
-            self.overview_text.setText("Keine Daten verfügbar für das ausgewählte Symbol oder den Zeitraum.")
-            self.returns_text.setText("Keine Daten verfügbar.")
-            self.ma_text.setText("Keine Daten verfügbar.")
-            self.vol_text.setText("Keine Daten verfügbar.")
-            self.beta_text.setText("Keine Daten verfügbar.")
-            return
+        self._schedule_indicators()
+
+    def _indicator_params(self, tabs):
+        """Liest die Eingaben der Tabs im GUI-Thread; ungültige Eingaben werden gemeldet und als None übergeben."""
+        params = {}
+        if "ma" in tabs:
+            try:
+                params["ma_window"] = int(self.ma_window_input.text())
+            except ValueError:
+                QMessageBox.warning(self, "Eingabefehler", "Gleitender Durchschnitt: Fenster muss eine Zahl sein.")
+                params["ma_window"] = None
+        if "volatility" in tabs:
+            try:
+                params["vol_window"] = int(self.vol_window_input.text())
+            except ValueError:
+                QMessageBox.warning(self.tab_volatility, "Eingabefehler", "Volatilität: Fenster muss eine Zahl sein.")
+                params["vol_window"] = None
+        if "beta" in tabs:
+            params["market_symbol"] = self.market_symbol_input.text().upper()
+            try:
+                params["beta_window"] = int(self.beta_window_input.text())
+            except ValueError:
+                QMessageBox.warning(self.tab_beta, "Eingabefehler", "Beta: Fenster muss eine Zahl sein.")
+                params["beta_window"] = None
+            if params["beta_window"] is not None and not params["market_symbol"]:
+                QMessageBox.warning(self.tab_beta, "Eingabefehler", "Bitte geben Sie ein Markt-Symbol ein (z.B. SPY).")
+                params["beta_window"] = None
+        return params
+
+    def _schedule_indicators(self, tabs=None):
+        """
+        Lädt die Daten und berechnet die Indikatoren der angegebenen Tabs (Standard: alle) im Hintergrund.
+        Ein neuer Auftrag ersetzt einen noch laufenden: Bei schnellem Wechsel von Symbol oder Zeitraum
+        wird nur die zuletzt gewählte Ansicht berechnet und gezeichnet.
+        """
+        tabs = tuple(tabs or self.INDICATOR_TABS)
+        snapshot = self._current_snapshot()
+        if tabs == self.INDICATOR_TABS:
+            # Neu geladene Daten (z.B. nach einer Aktualisierung) erhalten immer einen frischen Kontext;
+            # Aufträge für einzelne Tabs sind damit ebenfalls überholt
+            context = None
+            for tab in self.INDICATOR_TABS:
+                self.jobs.cancel(f"indicators:{tab}")
+            channel = "indicators"
+        else:
+            # Solange sich der Snapshot nicht ändert, teilen sich alle Tabs dieselben Zwischenergebnisse
+            context = self._indicator_context if self._indicator_context_key == snapshot else None
+            channel = "indicators:" + "+".join(tabs)
+        params = self._indicator_params(tabs)
+        if "overview" in tabs:
+            params["plot_points"] = self._plot_points()
+        self.statusBar().showMessage("Berechne Indikatoren ...")
+        self.jobs.submit(channel, self._prepare_indicators, snapshot, context, tabs, params,
+                         on_finished=self._show_indicators, on_failed=self._job_failed)
+
+    def _plot_points(self):
+        """Anzahl Kurspunkte, die die Breite des Übersichtsdiagramms füllen."""
+        canvas = self._canvases.get("overview")
+        width = canvas.axes.bbox.width if canvas is not None else self.tabs.width() * 0.8
+        return max(int(width / self.PIXELS_PER_POINT), 1)
+
+    def _prepare_indicators(self, job, snapshot, context, tabs, params):
+        """Hintergrund-Job: lädt den Snapshot und berechnet alle benötigten Indikatoren im IndicatorContext."""
+        with span("gui.indicators"):
+            return self._compute_indicators(job, snapshot, context, tabs, params)
+
+    def _compute_indicators(self, job, snapshot, context, tabs, params):
+        import pandas as pd
+        from financial_tools import IndicatorContext
+        symbol, start_date, end_date = snapshot
+        if context is None:
+            data = self.db_manager.get_stock_data(symbol, start_date, end_date) if symbol else pd.DataFrame()
+            # Gleitender Durchschnitt, Volatilität und Beta kommen aus den gespeicherten Reihen der Datenbank
+            context = IndicatorContext(data, stored=lambda spec: self.db_manager.get_indicator(
+                symbol, spec, start_date, end_date))
+        result = {"snapshot": snapshot, "context": context, "tabs": tabs, "params": params,
+                  "market_data": None, "market_error": None, "overview_data": None, "overview_resolution": "daily"}
+        if context.data.empty:
+            return result
+
+        if "overview" in tabs:
+            # Lange Zeiträume zeigt die Übersicht aus den Wochen- bzw. Monatswerten der Datenbank
+            from stock_data_manager import coarsest_resolution
+            resolution = coarsest_resolution(start_date, end_date, params["plot_points"])
+            result["overview_resolution"] = resolution
+            if resolution != "daily":
+                result["overview_data"] = self.db_manager.get_stock_data(symbol, start_date, end_date,
+                                                                         resolution=resolution)
+
+        job.check_cancelled()
+        if "returns" in tabs:
+            context.returns(in_percent=True)
+            context.cumulative_returns()
+        if "ma" in tabs and params["ma_window"] is not None:
+            context.moving_average(window=params["ma_window"])
+        if "volatility" in tabs and params["vol_window"] is not None:
+            context.volatility(window=params["vol_window"])
+        job.check_cancelled()
+        if "beta" in tabs and params["beta_window"] is not None:
+            market_symbol = params["market_symbol"]
+            try:
+                market_data = context.market_data(
+                    market_symbol, lambda: self._load_market_data(job, market_symbol, start_date, end_date))
+            except ValueError as e:
+                result["market_error"] = str(e)
+            else:
+                job.check_cancelled()
+                result["market_data"] = market_data
+                context.beta(market_symbol, market_data, window=params["beta_window"])
+        return result
 
-        self._plot_overview(data)
-        self._plot_returns(data)
-        self._plot_ma(data)  # Kann überschrieben werden, wenn MA-Button geklickt wird
-        self._plot_volatility(data)  # Kann überschrieben werden, wenn Vol-Button geklickt wird
-        self._plot_beta(data)  # Kann überschrieben werden, wenn Beta-Button geklickt wird
-
-    def _clear_plot(self, canvas):
-        """Löscht einen Plot."""
-        canvas.axes.clear()
-        canvas.draw()
-
-    def _clear_all_plots(self):
-        self._clear_plot(self.overview_canvas)
-        self._clear_plot(self.returns_canvas)
-        self._clear_plot(self.ma_canvas)
-        self._clear_plot(self.vol_canvas)
-        self._clear_plot(self.beta_canvas)
-
-    def _plot_overview(self, data):
-        self._clear_plot(self.overview_canvas)
-        ax = self.overview_canvas.axes
-        ax.plot(data.index, data['adj_close'], label='Schlusskurs', color='blue')
-        ax.set_title(f"{self.symbol_combo.currentText()} - Schlusskurs")
-        ax.set_xlabel("Datum")
-        ax.set_ylabel("Kurs")
-        ax.legend()
-        ax.grid(True)
-        self.overview_canvas.draw()
+    def _load_market_data(self, job, market_symbol, start_date, end_date):
+        """Lädt die Marktdaten; fehlt das Markt-Symbol in der DB, werden seine Kurse zuerst geholt."""
+        if not market_symbol in self.db_manager.get_all_symbols():
+            if not self.db_manager.add_stock(market_symbol):
+                raise ValueError(f"Ungültiges Markt-Symbol: {market_symbol}")
+            job.check_cancelled()
+            if not self.db_manager.fetch_and_store_data(market_symbol, period="max"):
+                raise ValueError(f"Konnte Daten für Markt-Symbol {market_symbol} nicht holen.")
+
+        market_data = self.db_manager.get_stock_data(market_symbol, start_date, end_date)
+        if market_data.empty:
+            raise ValueError(f"Keine Daten für Markt-Symbol {market_symbol} im angegebenen Zeitraum.")
+        return market_data
+
+    def _show_indicators(self, result):
+        """
+        Übernimmt die im Hintergrund berechneten Indikatoren (läuft im GUI-Thread).
+        Gezeichnet wird nur der sichtbare Tab; die übrigen Tabs werden als veraltet markiert
+        und erst beim Anzeigen gezeichnet.
+        """
+        self.statusBar().clearMessage()
+        if result["snapshot"] != self._current_snapshot():
+            return  # Auswahl hat sich inzwischen geändert; ein neuerer Auftrag ist unterwegs
+        self._indicator_context = result["context"]
+        self._indicator_context_key = result["snapshot"]
+        self._indicator_values.update(result["params"])
+        if "overview" in result["tabs"]:
+            self._indicator_values["overview_data"] = result["overview_data"]
+            self._indicator_values["overview_resolution"] = result["overview_resolution"]
+        if "beta" in result["tabs"]:
+            self._indicator_values["market_data"] = result["market_data"]
+            self._indicator_values["market_error"] = result["market_error"]
+        self._dirty_tabs.update(result["tabs"])
+        self._render_visible_tab()
+        if self._startup_times is not None:
+            # Die Diagramme zeichnen per draw_idle im nächsten Durchlauf der Ereignisschleife
+            QTimer.singleShot(0, lambda: self._finish_startup("Erster Tab gezeichnet"))
+
+    def _render_visible_tab(self):
+        """Zeichnet den sichtbaren Tab, falls seine Daten sich seit dem letzten Zeichnen geändert haben."""
+        name = self._tab_names.get(self.tabs.currentWidget())
+        if name in self._canvas_slots:
+            self._canvas(name)  # Diagramm beim ersten Anzeigen des Tabs anlegen
+        if name == "portfolio":
+            if self._portfolio_key != self._current_portfolio_key():
+                self._schedule_portfolio()
+            return
+        if name not in self._dirty_tabs or self._indicator_context is None:
+            return
+        self._dirty_tabs.discard(name)
+        context = self._indicator_context
+        text, plot = self._tab_views[name]
+        canvas = self._canvas(name)
+        if context.data.empty:
+            canvas.clear_plot()
+            text.setText("Keine Daten verfügbar für das ausgewählte Symbol oder den Zeitraum."
+                         if name == "overview" else "Keine Daten verfügbar.")
+            return
+        with span(f"gui.render.{name}"):
+            plot(context)
+        if logger.isEnabledFor(logging.DEBUG):
+            report = context.report()
+            logger.debug("Indikatoren berechnet: %d, wiederverwendet: %s", len(report['computed']), report['reused'])
+
+    def _plot_overview(self, context):
+        data = context.data
+        # Bei langen Zeiträumen liegen Wochen- oder Monatswerte vor (siehe _compute_indicators)
+        chart_data = self._indicator_values.get("overview_data")
+        if chart_data is None or chart_data.empty:
+            chart_data = data
+        resolution = self._indicator_values.get("overview_resolution", "daily") if chart_data is not data else "daily"
+        canvas = self._canvas("overview")
+        canvas.begin()
+        canvas.set_line("price", chart_data.index, chart_data['adj_close'], label='Schlusskurs', color='blue')
+        canvas.finish(f"{self.symbol_combo.currentText()} - Schlusskurs", "Datum", "Kurs", legend=True)
         self.overview_text.setText(f"Aktueller Kurs: {data['adj_close'].iloc[-1]:.2f}\n"
                                    f"Datum: {data.index[-1].strftime('%Y-%m-%d')}\n"
-                                   f"Anzahl Datenpunkte: {len(data)}")
+                                   f"Anzahl Datenpunkte: {len(data)} "
+                                   f"(Diagramm: {len(chart_data)} {self.RESOLUTION_LABELS[resolution]})")
 
-    def _plot_returns(self, data):
-        self._clear_plot(self.returns_canvas)
-        ax = self.returns_canvas.axes
+    def _plot_returns(self, context):
+        canvas = self._canvas("returns")
+        canvas.begin()
 
-        # Sicherstellen, dass calculate_returns und calculate_cumulative_returns die Series erhalten
-        # und die Ausgabe der calculate_returns Funktion in Dezimalwerten ist, nicht in Prozent.
-        # Ich habe das in FinancialTools vorgeschlagen, falls du es dort nicht direkt *100 machst.
-        # Hier ist es wichtig, dass 'data['adj_close']' übergeben wird.
-        daily_returns = self.financial_tools.calculate_returns(data['adj_close'])
-        cumulative_returns = self.financial_tools.calculate_cumulative_returns(data['adj_close'])
+        # Tägliche Renditen in Prozent für die Anzeige; die kumulierten Renditen verwenden
+        # die bereits im Kontext berechneten Dezimalrenditen
+        daily_returns = context.returns(in_percent=True)
+        cumulative_returns = context.cumulative_returns()
 
         if not daily_returns.empty:
-            ax.plot(daily_returns.index, daily_returns, label='Tägliche Rendite', color='green', alpha=0.7)
-            ax.set_title(f"{self.symbol_combo.currentText()} - Tägliche Renditen")
-            ax.set_xlabel("Datum")
-            ax.set_ylabel("Rendite (%)")  # Hier ist "%" wichtig
-            ax.grid(True)
-            self.returns_canvas.draw()
+            import pandas as pd
+            canvas.set_line("returns", daily_returns.index, daily_returns, label='Tägliche Rendite',
+                            color='green', alpha=0.7)
+            canvas.finish(f"{self.symbol_combo.currentText()} - Tägliche Renditen", "Datum",
+                          "Rendite (%)")  # Hier ist "%" wichtig
 
             # Jetzt die Fehlerbehebung für die Textausgabe
             avg_daily_return = daily_returns.mean()
@@ -331,122 +735,187 @@ class StockAnalyzer(QMainWindow):
             self.returns_text.setText(f"Durchschn. tägl. Rendite: {avg_daily_return_str}\n"
                                      f"Kumulierte Rendite (Gesamt): {last_cumulative_return_str}")
         else:
-            self._clear_plot(self.returns_canvas)
+            canvas.clear_plot()
             self.returns_text.setText("Nicht genügend Daten für Renditeberechnung.")
 
-    def _plot_ma(self, data: pd.DataFrame):
-        self._clear_plot(self.ma_canvas)
-        ax = self.ma_canvas.axes
-        try:
-            window = int(self.ma_window_input.text())
-        except ValueError:
-            QMessageBox.warning(self, "Eingabefehler", "Gleitender Durchschnitt: Fenster muss eine Zahl sein.")
-            return
-        print(f"data in _plot_ma: {data}")
-        print(f"window in _plot_ma: {window}")
-        ma = self.financial_tools.calculate_moving_average(data, window=window)
+    def _plot_ma(self, context: "IndicatorContext"):
+        data = context.data
+        canvas = self._canvas("ma")
+        window = self._indicator_values.get("ma_window")
+        if window is None:
+            canvas.clear_plot()
+            return  # Ungültige Eingabe wurde bereits gemeldet
+        ma = context.moving_average(window=window)
 
         if not ma.empty:
-            ax.plot(data.index, data['adj_close'], label='Schlusskurs', color='blue', alpha=0.7)
-            ax.plot(ma.index, ma, label=f'MA {window} Tage', color='red')
-            ax.set_title(f"{self.symbol_combo.currentText()} - Gleitender Durchschnitt ({window} Tage)")
-            ax.set_xlabel("Datum")
-            ax.set_ylabel("Kurs")
-            ax.legend()
-            ax.grid(True)
-            self.ma_canvas.draw()
+            canvas.begin()
+            canvas.set_line("price", data.index, data['adj_close'], label='Schlusskurs', color='blue', alpha=0.7)
+            canvas.set_line("ma", ma.index, ma, label=f'MA {window} Tage', color='red')
+            canvas.finish(f"{self.symbol_combo.currentText()} - Gleitender Durchschnitt ({window} Tage)",
+                          "Datum", "Kurs", legend=True)
             self.ma_text.setText(f"Gleitender Durchschnitt ({window} Tage) berechnet.")
         else:
-            self._clear_plot(self.ma_canvas)
+            canvas.clear_plot()
             self.ma_text.setText("Nicht genügend Daten für gleitenden Durchschnitt.")
 
-    def _plot_volatility(self, data):
-        self._clear_plot(self.vol_canvas)
-        ax = self.vol_canvas.axes
-        try:
-            window = int(self.vol_window_input.text())
-        except ValueError:
-            QMessageBox.warning(self.tab_volatility, "Eingabefehler", "Volatilität: Fenster muss eine Zahl sein.")
-            return
+    def _plot_volatility(self, context):
+        canvas = self._canvas("volatility")
+        window = self._indicator_values.get("vol_window")
+        if window is None:
+            canvas.clear_plot()
+            return  # Ungültige Eingabe wurde bereits gemeldet
 
-        volatility = self.financial_tools.calculate_volatility(data, window=window)
+        volatility = context.volatility(window=window)
 
         if not volatility.empty:
-            ax.plot(volatility.index, volatility, label=f'Volatilität {window} Tage (annualisiert)', color='purple')
-            ax.set_title(f"{self.symbol_combo.currentText()} - Rollierende Volatilität ({window} Tage)")
-            ax.set_xlabel("Datum")
-            ax.set_ylabel("Volatilität (annualisiert)")
-            ax.grid(True)
-            self.vol_canvas.draw()
+            canvas.begin()
+            canvas.set_line("volatility", volatility.index, volatility,
+                            label=f'Volatilität {window} Tage (annualisiert)', color='purple')
+            canvas.finish(f"{self.symbol_combo.currentText()} - Rollierende Volatilität ({window} Tage)",
+                          "Datum", "Volatilität (annualisiert)")
             self.vol_text.setText(f"Rollierende Volatilität ({window} Tage) berechnet.")
         else:
-            self._clear_plot(self.vol_canvas)
+            canvas.clear_plot()
             self.vol_text.setText("Nicht genügend Daten für Volatilitätsberechnung.")
 
-    def _plot_beta(self, data):
-        self._clear_plot(self.beta_canvas)
-        ax = self.beta_canvas.axes
-        market_symbol = self.market_symbol_input.text().upper()
-        try:
-            window = int(self.beta_window_input.text())
-        except ValueError:
-            QMessageBox.warning(self.tab_beta, "Eingabefehler", "Beta: Fenster muss eine Zahl sein.")
-            return
-        
-        if not market_symbol:
-            QMessageBox.warning(self.tab_beta, "Eingabefehler", "Bitte geben Sie ein Markt-Symbol ein (z.B. SPY).")
-            return
-
-        # Zuerst das Markt-Symbol zur DB hinzufügen und Daten holen, falls nicht vorhanden
-        if not market_symbol in self.db_manager.get_all_symbols():
-            if not self.db_manager.add_stock(market_symbol):
-                QMessageBox.warning(self.tab_beta, "Datenfehler", f"Ungültiges Markt-Symbol: {market_symbol}")
-                self._clear_plot(self.beta_canvas)
-                self.beta_text.setText("Ungültiges Markt-Symbol.")
-                return
-            if not self.db_manager.fetch_and_store_data(market_symbol, period="max"):
-                QMessageBox.warning(self.tab_beta, "Datenfehler", f"Konnte Daten für Markt-Symbol {market_symbol} nicht holen.")
-                self._clear_plot(self.beta_canvas)
-                self.beta_text.setText("Keine Marktdaten verfügbar.")
-                return
-
-        start_date_q = self.start_date_edit.date()
-        end_date_q = self.end_date_edit.date()
-        start_date_str = start_date_q.toString("yyyy-MM-dd")
-        end_date_str = end_date_q.toString("yyyy-MM-dd")
-
-        market_data = self.db_manager.get_stock_data(market_symbol, start_date_str, end_date_str)
-
-        if market_data.empty:
-            QMessageBox.warning(self.tab_beta, "Datenfehler", f"Keine Daten für Markt-Symbol {market_symbol} im angegebenen Zeitraum.")
-            self._clear_plot(self.beta_canvas)
+    def _plot_beta(self, context):
+        canvas = self._canvas("beta")
+        values = self._indicator_values
+        market_symbol = values.get("market_symbol")
+        window = values.get("beta_window")
+        if window is None:
+            canvas.clear_plot()
+            return  # Ungültige Eingabe wurde bereits gemeldet
+
+        # Die Marktdaten wurden im Hintergrund geladen (und bei Bedarf zuvor geholt)
+        if values.get("market_error"):
+            canvas.clear_plot()
+            QMessageBox.warning(self.tab_beta, "Datenfehler", values["market_error"])
             self.beta_text.setText("Keine Marktdaten für Beta-Berechnung.")
             return
 
-        beta = self.financial_tools.calculate_beta(data, market_data, window=window)
+        beta = context.beta(market_symbol, values["market_data"], window=window)
 
         if not beta.empty:
-            ax.plot(beta.index, beta, label=f'Beta vs {market_symbol} ({window} Tage)', color='orange')
-            ax.set_title(f"{self.symbol_combo.currentText()} - Rollierendes Beta vs {market_symbol} ({window} Tage)")
-            ax.set_xlabel("Datum")
-            ax.set_ylabel("Beta")
-            ax.axhline(1, color='gray', linestyle='--', linewidth=0.8, label='Beta = 1')
-            ax.legend()
-            ax.grid(True)
-            self.beta_canvas.draw()
+            canvas.begin()
+            canvas.set_line("beta", beta.index, beta, label=f'Beta vs {market_symbol} ({window} Tage)', color='orange')
+            canvas.set_hline("reference", 1, color='gray', linestyle='--', linewidth=0.8, label='Beta = 1')
+            canvas.finish(f"{self.symbol_combo.currentText()} - Rollierendes Beta vs {market_symbol} ({window} Tage)",
+                          "Datum", "Beta", legend=True)
             self.beta_text.setText(f"Rollierendes Beta ({window} Tage) vs {market_symbol} berechnet. Aktuelles Beta: {beta.iloc[-1]:.2f}")
         else:
-            self._clear_plot(self.beta_canvas)
+            canvas.clear_plot()
             self.beta_text.setText("Nicht genügend Daten für Beta-Berechnung. Stellen Sie sicher, dass sowohl Aktie als auch Markt ausreichend historische Daten haben.")
 
+    def _current_portfolio_key(self):
+        return (self.csv_path_input.text(),) + self._current_snapshot()[1:]
+
+    def _schedule_portfolio(self):
+        """Bewertet das Portfolio der Bestandsdatei für den gewählten Zeitraum im Hintergrund."""
+        key = self._current_portfolio_key()
+        params = self._indicator_params(("volatility", "beta"))
+        self._portfolio_key = key
+        self.statusBar().showMessage("Bewerte Portfolio ...")
+        self.jobs.submit("portfolio", self._prepare_portfolio, key, params,
+                         on_finished=self._show_portfolio, on_failed=self._portfolio_failed)
+
+    def _prepare_portfolio(self, job, key, params):
+        """Hintergrund-Job: bewertet alle Lots und berechnet Volatilität und Beta des Portfolios."""
+        from portfolio import PortfolioEngine
+        path, start_date, end_date = key
+        valuation = PortfolioEngine(self.db_manager).value(path, start_date, end_date)
+        result = {"key": key, "valuation": valuation, "volatility": None, "beta": None, "market_error": None,
+                  "params": params}
+        if valuation.daily_returns.empty:
+            return result
+        job.check_cancelled()
+        if params["vol_window"] is not None:
+            result["volatility"] = valuation.volatility(window=params["vol_window"])
+        if params["beta_window"] is not None:
+            try:
+                market_data = self._load_market_data(job, params["market_symbol"], start_date, end_date)
+            except ValueError as e:
+                result["market_error"] = str(e)
+            else:
+                result["beta"] = valuation.beta(market_data, window=params["beta_window"])
+        return result
+
+    def _portfolio_failed(self, message):
+        self._portfolio_key = None
+        self._canvas("portfolio").clear_plot()
+        self.portfolio_table.setRowCount(0)
+        self.portfolio_text.setText(f"Portfolio konnte nicht bewertet werden: {message}")
+        self._job_failed(message)
+
+    def _show_portfolio(self, result):
+        """Zeigt Wertentwicklung, Positionen und Kennzahlen des Portfolios an (läuft im GUI-Thread)."""
+        self.statusBar().clearMessage()
+        if result["key"] != self._portfolio_key:
+            return
+        valuation = result["valuation"]
+        canvas = self._canvas("portfolio")
+        if not len(valuation.dates):
+            canvas.clear_plot()
+            self.portfolio_table.setRowCount(0)
+            self.portfolio_text.setText("Keine Kursdaten für die Bestände im gewählten Zeitraum.")
+            return
+
+        with span("gui.render.portfolio"):
+            canvas.begin()
+            canvas.set_line("value", valuation.dates, valuation.total_value, label='Marktwert', color='blue')
+            canvas.set_line("cost", valuation.dates, valuation.total_cost, label='Einstandswert', color='gray')
+            canvas.finish("Portfolio - Marktwert und Einstandswert", "Datum", "Wert", legend=True)
+
+            positions = valuation.positions().sort_values('Marktwert', ascending=False)
+            self.portfolio_table.setRowCount(len(positions))
+            for row, (symbol, position) in enumerate(positions.iterrows()):
+                cells = [symbol, position['Name'], position['Branche'], f"{position['Anzahl_Aktien']:g}",
+                         f"{position['Einstandswert']:,.2f}", f"{position['Marktwert']:,.2f}",
+                         f"{position['Gewinn_Verlust']:,.2f}", f"{position['Gewicht']:.1%}"]
+                for column, cell in enumerate(cells):
+                    self.portfolio_table.setItem(row, column, QTableWidgetItem(cell))
+
+        total_value = valuation.total_value.iloc[-1]
+        total_cost = valuation.total_cost.iloc[-1]
+        lines = [f"Marktwert: {total_value:,.2f}   Einstandswert: {total_cost:,.2f}   "
+                 f"Gewinn/Verlust: {total_value - total_cost:,.2f}"]
+        cumulative = valuation.cumulative_returns()
+        if not cumulative.empty:
+            lines.append(f"Zeitgewichtete Rendite im Zeitraum: {cumulative.iloc[-1]:.2%}")
+        volatility = result["volatility"]
+        if volatility is not None and not volatility.dropna().empty:
+            lines.append(f"Volatilität ({result['params']['vol_window']} Tage, annualisiert): "
+                         f"{volatility.dropna().iloc[-1]:.2%}")
+        beta = result["beta"]
+        if beta is not None and not beta.empty:
+            lines.append(f"Beta ({result['params']['beta_window']} Tage) vs {result['params']['market_symbol']}: "
+                         f"{beta.iloc[-1]:.2f}")
+        elif result["market_error"]:
+            lines.append(f"Beta: {result['market_error']}")
+        exposure = valuation.sector_exposure().iloc[-1].dropna().sort_values(ascending=False)
+        if not exposure.empty:
+            lines.append("Branchen: " + ", ".join(f"{sector} {share:.1%}" for sector, share in exposure.items()))
+        if valuation.missing_prices:
+            lines.append(f"Ohne Kursdaten (Wert 0): {', '.join(valuation.missing_prices)}")
+        self.portfolio_text.setText("\n".join(lines))
+
     def closeEvent(self, event):
         """Wird aufgerufen, wenn das Fenster geschlossen wird."""
-        self.db_manager.close()
+        # Laufende Jobs abbrechen und abwarten, bevor die Datenbankverbindung geschlossen wird
+        self.jobs.shutdown()
+        if self.db_manager is not None:
+            self.db_manager.close()
+        METRICS.log_stats()
         event.accept()
 
 
 if __name__ == "__main__":
-    app = QApplication(sys.argv)
-    window = StockAnalyzer()
+    parser = argparse.ArgumentParser(description="Aktienanalyse-Tool")
+    parser.add_argument("--startup-report", action="store_true",
+                        help="Startzeiten ausgeben und beenden, sobald der erste Tab gezeichnet ist")
+    args, qt_args = parser.parse_known_args()
+    configure_logging()
+    app = QApplication(sys.argv[:1] + qt_args)
+    window = StockAnalyzer(startup_report=args.startup_report)
     window.show()
     sys.exit(app.exec())
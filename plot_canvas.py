@@ -0,0 +1,117 @@
+from PyQt6.QtWidgets import QSizePolicy
+from matplotlib.backends.backend_qtagg import FigureCanvasQTAgg as FigureCanvas
+from matplotlib.backends.backend_qtagg import NavigationToolbar2QT as NavigationToolbar
+import matplotlib.dates as mdates
+from matplotlib.figure import Figure
+import numpy as np
+
+from downsampling import downsample_min_max
+
+
+class MplCanvas(FigureCanvas):
+    """
+    Matplotlib Canvas für die Einbettung in PyQt.
+    Linien werden einmal angelegt und bei neuen Daten nur per set_data aktualisiert;
+    gezeichnet wird gesammelt über draw_idle().
+    Lange Reihen werden je Pixel auf Minimum und Maximum reduziert (siehe downsampling.py),
+    sodass die Zeichenzeit nicht von der Länge der Historie abhängt. Beim Zoomen oder
+    Verschieben wird der sichtbare Ausschnitt aus den vollständigen Daten neu reduziert.
+    """
+
+    def __init__(self, parent=None, width=5, height=4, dpi=100):
+        fig = Figure(figsize=(width, height), dpi=dpi)
+        self.axes = fig.add_subplot(111)
+        self.axes.grid(True)
+        super(MplCanvas, self).__init__(fig)
+        self.setParent(parent)
+        self.setSizePolicy(QSizePolicy.Policy.Expanding, QSizePolicy.Policy.Expanding)
+        self.updateGeometry()
+        self._lines = {}
+        self._series = {}  # Vollständige Daten je Linie: (x, x als Zahl, y)
+        self._legend_labels = None
+        self._autoscaling = False
+        self.axes.callbacks.connect('xlim_changed', self._on_xlim_changed)
+        self.mpl_connect('resize_event', lambda event: self._on_xlim_changed(self.axes))
+
+    def begin(self):
+        """Blendet alle Linien aus; die anschließend gesetzten Linien werden wieder eingeblendet."""
+        for line in self._lines.values():
+            line.set_visible(False)
+
+    def _downsampled(self, key, x_range=None):
+        """Auf die Breite der Achse reduzierte Daten der Linie 'key', optional nur für x_range."""
+        x, x_values, y = self._series[key]
+        if x_range is not None:
+            # Je ein Punkt links und rechts des Ausschnitts, damit die Linie bis zum Rand reicht
+            start = max(np.searchsorted(x_values, x_range[0]) - 1, 0)
+            stop = np.searchsorted(x_values, x_range[1], side='right') + 1
+            x, y = x[start:stop], y[start:stop]
+        return downsample_min_max(x, y, max(int(self.axes.bbox.width), 200))
+
+    def set_line(self, key, x, y, **style):
+        """Setzt die Daten der Linie 'key' und legt sie beim ersten Aufruf an."""
+        x = np.asarray(x)
+        x_values = mdates.date2num(x) if np.issubdtype(x.dtype, np.datetime64) else x.astype('float64')
+        self._series[key] = (x, x_values, np.asarray(y, dtype='float64'))
+        x, y = self._downsampled(key)
+        line = self._lines.get(key)
+        if line is None:
+            line, = self.axes.plot(x, y, **style)
+            self._lines[key] = line
+        else:
+            line.set_data(x, y)
+            if 'label' in style:
+                line.set_label(style['label'])
+            line.set_visible(True)
+        return line
+
+    def set_hline(self, key, y, **style):
+        """Horizontale Referenzlinie (z.B. Beta = 1), die ebenfalls nur einmal angelegt wird."""
+        line = self._lines.get(key)
+        if line is None:
+            line = self.axes.axhline(y, **style)
+            self._lines[key] = line
+        else:
+            line.set_ydata([y, y])
+            line.set_visible(True)
+        return line
+
+    def finish(self, title="", xlabel="", ylabel="", legend=False):
+        """Skaliert die Achsen auf die sichtbaren Linien, aktualisiert die Beschriftung und zeichnet einmal."""
+        ax = self.axes
+        ax.set_title(title)
+        ax.set_xlabel(xlabel)
+        ax.set_ylabel(ylabel)
+        # Neue Daten zeigen wieder den gesamten Zeitraum, auch wenn zuvor gezoomt wurde
+        self._autoscaling = True
+        try:
+            ax.set_autoscale_on(True)
+            ax.relim(visible_only=True)
+            ax.autoscale_view()
+        finally:
+            self._autoscaling = False
+        visible = [line for line in self._lines.values() if line.get_visible()]
+        labels = tuple(line.get_label() for line in visible) if legend and visible else None
+        # Die Legende wird nur neu aufgebaut, wenn sich die Beschriftungen geändert haben
+        if labels != self._legend_labels:
+            if ax.get_legend() is not None:
+                ax.get_legend().remove()
+            if labels:
+                ax.legend(handles=visible)
+            self._legend_labels = labels
+        self.draw_idle()
+
+    def _on_xlim_changed(self, ax):
+        """Reduziert die Linien nach Zoomen/Verschieben neu für den sichtbaren Ausschnitt."""
+        if self._autoscaling:
+            return
+        x_range = ax.get_xlim()
+        for key, line in self._lines.items():
+            if key in self._series and line.get_visible():
+                line.set_data(*self._downsampled(key, x_range))
+        self.draw_idle()
+
+    def clear_plot(self):
+        """Leert den Plot, ohne die Linienobjekte zu verwerfen."""
+        self.begin()
+        self.finish()
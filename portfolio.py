@@ -0,0 +1,196 @@
+from dataclasses import dataclass
+import logging
+
+import numpy as np
+import pandas as pd
+
+from financial_tools import FinancialTools
+from instrumentation import span
+
+logger = logging.getLogger(__name__)
+
+# Spalten der Bestandsdatei (wie stocks.csv); 'Name' und 'Branche' sind optional
+HOLDINGS_COLUMNS = ['Symbol', 'Name', 'Branche', 'Anzahl_Aktien', 'Kaufpreis_pro_Aktie', 'Kaufdatum']
+REQUIRED_HOLDINGS_COLUMNS = ['Symbol', 'Anzahl_Aktien', 'Kaufpreis_pro_Aktie', 'Kaufdatum']
+UNKNOWN_SECTOR = "Unbekannt"
+
+
+def load_holdings(source):
+    """
+    Liest die Positionen aus einer CSV-Datei (oder einem DataFrame) mit den Spalten HOLDINGS_COLUMNS.
+    Jede Zeile ist ein Kauf (Lot); ein Symbol darf mehrfach vorkommen.
+    Gibt einen DataFrame mit bereinigten Typen zurück (Symbol in Großbuchstaben, Kaufdatum als Timestamp).
+    Fehlende Pflichtspalten oder ungültige Werte lösen einen ValueError aus.
+    """
+    holdings = pd.read_csv(source) if not isinstance(source, pd.DataFrame) else source.copy()
+    missing = [column for column in REQUIRED_HOLDINGS_COLUMNS if column not in holdings.columns]
+    if missing:
+        raise ValueError(f"Die Bestandsdatei muss die Spalten {', '.join(missing)} enthalten.")
+
+    holdings = holdings.reindex(columns=HOLDINGS_COLUMNS)
+    holdings['Symbol'] = holdings['Symbol'].astype(str).str.strip().str.upper()
+    holdings['Name'] = holdings['Name'].fillna('').astype(str)
+    holdings['Branche'] = holdings['Branche'].fillna(UNKNOWN_SECTOR).astype(str)
+    holdings['Anzahl_Aktien'] = pd.to_numeric(holdings['Anzahl_Aktien'], errors='coerce')
+    holdings['Kaufpreis_pro_Aktie'] = pd.to_numeric(holdings['Kaufpreis_pro_Aktie'], errors='coerce')
+    holdings['Kaufdatum'] = pd.to_datetime(holdings['Kaufdatum'], errors='coerce')
+    invalid = holdings[['Anzahl_Aktien', 'Kaufpreis_pro_Aktie', 'Kaufdatum']].isna().any(axis=1)
+    if invalid.any():
+        rows = ", ".join(str(row + 2) for row in np.flatnonzero(invalid.to_numpy())[:10])
+        raise ValueError(f"Ungültige Anzahl, Kaufpreis oder Kaufdatum in Zeile(n) {rows} der Bestandsdatei.")
+    return holdings
+
+
+@dataclass
+class PortfolioValuation:
+    """
+    Tägliche Bewertung eines Portfolios (Ergebnis von PortfolioEngine.value).
+    quantities, market_values und cost_basis haben die Form (len(dates), len(symbols)) und enthalten
+    je Tag die gehaltenen Stück, den Marktwert und den Einstandswert aller Lots eines Symbols.
+    daily_returns sind die Dezimalrenditen des Portfolios auf Basis der bereinigten Kurse
+    (Käufe zählen nicht als Rendite).
+    """
+    dates: pd.DatetimeIndex
+    symbols: list
+    names: list
+    sectors: list
+    quantities: np.ndarray
+    market_values: np.ndarray
+    cost_basis: np.ndarray
+    daily_returns: pd.Series
+    missing_prices: list
+
+    @property
+    def total_value(self):
+        return pd.Series(self.market_values.sum(axis=1), index=self.dates, name='market_value')
+
+    @property
+    def total_cost(self):
+        return pd.Series(self.cost_basis.sum(axis=1), index=self.dates, name='cost_basis')
+
+    @property
+    def unrealized_pnl(self):
+        """Nicht realisierter Gewinn/Verlust (Marktwert - Einstandswert) des Portfolios je Tag."""
+        return (self.total_value - self.total_cost).rename('unrealized_pnl')
+
+    def weights(self):
+        """Gewicht jedes Symbols am Marktwert je Tag (Datum x Symbol, NaN solange das Portfolio leer ist)."""
+        total = self.market_values.sum(axis=1, keepdims=True)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            weights = np.where(total > 0, self.market_values / total, np.nan)
+        return pd.DataFrame(weights, index=self.dates, columns=self.symbols)
+
+    def sector_exposure(self, relative=True):
+        """Marktwert je Branche und Tag (Datum x Branche), mit relative=True als Anteil am Gesamtwert."""
+        codes, sectors = pd.factorize(pd.Series(self.sectors), sort=True)
+        membership = np.zeros((len(self.symbols), len(sectors)))
+        membership[np.arange(len(self.symbols)), codes] = 1.0
+        exposure = self.market_values @ membership
+        if relative:
+            total = exposure.sum(axis=1, keepdims=True)
+            with np.errstate(divide='ignore', invalid='ignore'):
+                exposure = np.where(total > 0, exposure / total, np.nan)
+        return pd.DataFrame(exposure, index=self.dates, columns=list(sectors))
+
+    def cumulative_returns(self):
+        """Zeitgewichtete kumulierte Rendite des Portfolios (Dezimalwerte)."""
+        return (1 + self.daily_returns).cumprod() - 1
+
+    def index_series(self):
+        """Wertentwicklung als Index (Startwert 1); Grundlage für Volatilität und Beta."""
+        return (1 + self.daily_returns).cumprod()
+
+    def volatility(self, window=20):
+        """Rollierende, annualisierte Volatilität wie FinancialTools.calculate_volatility."""
+        return FinancialTools.calculate_volatility(self.index_series(), window=window)
+
+    def beta(self, market_prices, window=60):
+        """Rollierendes Beta des Portfolios gegenüber market_prices wie FinancialTools.calculate_beta."""
+        return FinancialTools.calculate_beta(self.index_series(), market_prices, window=window)
+
+    def positions(self, day=-1):
+        """
+        Positionen eines Tages (Standard: letzter Tag) je Symbol: Anzahl, Einstandswert, Marktwert,
+        Gewinn/Verlust und Gewicht. Nicht (mehr) gehaltene Symbole fehlen.
+        """
+        value = self.market_values[day]
+        cost = self.cost_basis[day]
+        total = value.sum()
+        frame = pd.DataFrame({
+            'Name': self.names,
+            'Branche': self.sectors,
+            'Anzahl_Aktien': self.quantities[day],
+            'Einstandswert': cost,
+            'Marktwert': value,
+            'Gewinn_Verlust': value - cost,
+            'Gewicht': value / total if total > 0 else np.nan,
+        }, index=pd.Index(self.symbols, name='Symbol'))
+        return frame[frame['Anzahl_Aktien'] != 0]
+
+
+class PortfolioEngine:
+    """
+    Bewertet Portfolios aus Lots über die gespeicherten Kurse eines StockDataManager.
+    Alle Kennzahlen entstehen als Array-Operationen über eine Datum x Symbol-Matrix: Lots werden
+    als Zugänge am Kaufdatum eingetragen und über die Zeit kumuliert, sodass auch zehntausende
+    Lots über Jahrzehnte ohne Schleife je Position bewertet werden.
+    """
+
+    def __init__(self, manager):
+        self.manager = manager
+
+    def value(self, holdings, start_date=None, end_date=None):
+        """
+        Bewertet die Lots (siehe load_holdings) für jeden Handelstag zwischen start_date und end_date.
+        Der Marktwert verwendet die unbereinigten Schlusskurse ('close', passend zum Kaufpreis),
+        die Portfoliorendite die bereinigten Kurse ('adj_close'). Vor start_date gekaufte Lots sind
+        ab dem ersten Tag enthalten; Tage ohne Kurs übernehmen den letzten bekannten Kurs.
+        """
+        holdings = load_holdings(holdings)
+        if end_date is not None:
+            holdings = holdings[holdings['Kaufdatum'] <= pd.Timestamp(end_date)]
+        first_lots = holdings.drop_duplicates('Symbol')
+        symbols = first_lots['Symbol'].tolist()
+
+        with span("portfolio.load_prices"):
+            close = self.manager.get_price_matrix(symbols, start_date, end_date, field="close")
+            adjusted = self.manager.get_price_matrix(symbols, start_date, end_date, field="adj_close")
+        adjusted = adjusted.reindex(close.index)
+
+        with span("portfolio.value", rows=len(holdings)):
+            dates = close.index
+            prices = close.ffill().to_numpy()
+            missing_prices = [symbol for symbol, valid in zip(symbols, ~np.isnan(prices).all(axis=0)) if not valid]
+            if missing_prices:
+                logger.warning("Keine Kurse für %s im Zeitraum gefunden; Marktwert wird als 0 angesetzt.",
+                               ", ".join(missing_prices))
+            prices = np.nan_to_num(prices)
+
+            # Zugänge je Kauftag und Symbol eintragen und über die Zeit kumulieren
+            rows = dates.searchsorted(holdings['Kaufdatum'].to_numpy())
+            columns = pd.Index(symbols).get_indexer(holdings['Symbol'])
+            inside = rows < len(dates)
+            quantities = np.zeros((len(dates), len(symbols)))
+            cost_basis = np.zeros((len(dates), len(symbols)))
+            lot_quantities = holdings['Anzahl_Aktien'].to_numpy(dtype='float64')
+            np.add.at(quantities, (rows[inside], columns[inside]), lot_quantities[inside])
+            np.add.at(cost_basis, (rows[inside], columns[inside]),
+                      (lot_quantities * holdings['Kaufpreis_pro_Aktie'].to_numpy(dtype='float64'))[inside])
+            np.cumsum(quantities, axis=0, out=quantities)
+            np.cumsum(cost_basis, axis=0, out=cost_basis)
+            market_values = quantities * prices
+
+            # Rendite je Tag: Positionen des Vortags, bewertet mit den Tagesrenditen der Symbole.
+            # Durch das Fortschreiben der Kurse entfällt die Rendite eines fehlenden Tages auf den
+            # nächsten Handelstag (wie bei FinancialTools.calculate_returns_panel)
+            adjusted = adjusted.ffill().to_numpy()
+            with np.errstate(divide='ignore', invalid='ignore'):
+                asset_returns = np.nan_to_num(adjusted[1:] / adjusted[:-1] - 1, posinf=0.0, neginf=0.0)
+            previous_values = market_values[:-1]
+            previous_total = previous_values.sum(axis=1)
+            with np.errstate(divide='ignore', invalid='ignore'):
+                returns = np.einsum('ij,ij->i', previous_values, asset_returns) / previous_total
+            daily_returns = pd.Series(returns, index=dates[1:], name='portfolio')[previous_total > 0]
+
+        return PortfolioValuation(dates, symbols, first_lots['Name'].tolist(), first_lots['Branche'].tolist(),
+                                  quantities, market_values, cost_basis, daily_returns, missing_prices)
@@ -1,159 +1,926 @@
-from datetime import date
-import sqlite3
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
+from contextlib import contextmanager, nullcontext
+from dataclasses import dataclass, field
+from datetime import date, timedelta
+from functools import wraps
+import logging
+from pathlib import Path
+import threading
+import time
 
+import numpy as np
 import pandas as pd
-import yfinance as yf
+
+from data_sources import (DEFAULT_MAX_REQUESTS, DEFAULT_REQUEST_BURST, DEFAULT_REQUEST_RATE, INTRADAY_INTERVALS,
+                          INTRADAY_REQUEST_DAYS, PRICE_COLUMNS, MetadataCache, ScheduledDataSource,
+                          YFinanceDataSource, intraday_earliest, period_start)
+from financial_tools import IndicatorContext, IndicatorSpec
+from instrumentation import METRICS, span, timed
+from storage_backends import (PRICE_FIELDS, ROLLUP_TABLES, STORAGE_ERRORS, IntradayStore, ReaderPool, SQLiteBackend,
+                              WriteQueue, aggregate_rollup, bars_from_frame, frame_to_columns, rollup_period_start)
+
+logger = logging.getLogger(__name__)
+
+# Auflösungen für get_stock_data, von fein nach grob, mit der ungefähren Anzahl Zeilen je Jahr
+RESOLUTIONS = {"daily": 252, "weekly": 52, "monthly": 12}
+
+# Indikatoren, die get_indicator über die gesamte Historie speichert und beim Ergänzen neuer
+# Kurse nur am Ende fortschreibt (ihr Wert hängt nur von den letzten 'window' Kursen ab)
+PERSISTED_INDICATORS = ("ma", "volatility", "beta")
+
+
+EPOCH = date(1970, 1, 1)
+
+
+def _epoch_day(value):
+    """Datum (date, Timestamp oder 'YYYY-MM-DD') als Tage seit 1970-01-01 (None bleibt None)."""
+    return None if value is None else (pd.Timestamp(value).date() - EPOCH).days
+
+
+def _epoch_date(day):
+    """Epochentag als 'YYYY-MM-DD' (None bleibt None)."""
+    return None if day is None else (EPOCH + timedelta(days=int(day))).isoformat()
+
+
+def _rollup_frame(days, columns):
+    """Kurs-DataFrame (wie get_stock_data) aus Epochentagen und verdichteten Spalten."""
+    index = pd.DatetimeIndex(np.asarray(days, dtype=np.int64).astype('datetime64[D]').astype('datetime64[ns]'),
+                             name='date')
+    return pd.DataFrame({field: columns[field] for field in PRICE_FIELDS}, index=index)
+
+
+def coarsest_resolution(start_date, end_date, min_rows):
+    """
+    Gröbste Auflösung aus RESOLUTIONS, die im Zeitraum voraussichtlich noch min_rows Zeilen liefert
+    (z.B. die Anzahl der Punkte, die ein Diagramm in seiner Breite darstellen kann).
+    Ohne Startdatum wird 'daily' gewählt.
+    """
+    if start_date is None:
+        return "daily"
+    end = pd.Timestamp(end_date) if end_date is not None else pd.Timestamp.today()
+    years = (end - pd.Timestamp(start_date)).days / 365.25
+    for resolution in reversed(RESOLUTIONS):
+        if years * RESOLUTIONS[resolution] >= min_rows:
+            return resolution
+    return "daily"
+
+
+@dataclass
+class BulkFetchReport:
+    """Ergebnis von StockDataManager.fetch_and_store_many."""
+    succeeded: list = field(default_factory=list)
+    failed: dict = field(default_factory=dict)  # Symbol -> Fehlermeldung
+    rows: int = 0
+    elapsed: float = 0.0
+    cancelled: bool = False
+
+    @property
+    def symbols_per_second(self):
+        return len(self.succeeded) / self.elapsed if self.elapsed else 0.0
+
+    @property
+    def rows_per_second(self):
+        return self.rows / self.elapsed if self.elapsed else 0.0
+
+
+class _ManagerLock:
+    """Wiedereintrittsfähige Sperre, die weiß, ob der aktuelle Thread sie hält."""
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._local = threading.local()
+
+    def __enter__(self):
+        self._lock.acquire()
+        self._local.depth = getattr(self._local, "depth", 0) + 1
+        return self
+
+    def __exit__(self, *exc_info):
+        self._local.depth -= 1
+        self._lock.release()
+
+    def held(self):
+        return getattr(self._local, "depth", 0) > 0
+
+
+def _synchronized(method):
+    """Serialisiert den Zugriff auf Verbindung und Cache, damit Hintergrund-Threads die Instanz mitnutzen können."""
+    @wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with self._lock:
+            return method(self, *args, **kwargs)
+    return wrapper
+
+
+@dataclass
+class PriceMatrix:
+    """
+    Datumsausgerichtete Kursmatrix mehrerer Symbole (Ergebnis von get_price_matrix mit as_array=True).
+    values hat die Form (len(dates), len(symbols)); mask markiert die tatsächlich vorhandenen Werte.
+    """
+    dates: pd.DatetimeIndex
+    symbols: list
+    values: np.ndarray
+    mask: np.ndarray
+
+    def to_frame(self):
+        return pd.DataFrame(self.values, index=self.dates, columns=self.symbols)
 
 
 class StockDataManager:
 
-    def __init__(self, db_name="stock_data.db"):
-        self.db_name: str = db_name
-        self.conn: sqlite3.Connection | None = None
-        self.cursor: sqlite3.Cursor | None = None
-        self._connect_db()
-        self._create_tables()
+    def __init__(self, db_name="stock_data.db", data_source=None, pragmas=None, layout="legacy",
+                 cache_bytes=256 * 1024 * 1024, storage=None, max_readers=None, intraday=None,
+                 request_rate=DEFAULT_REQUEST_RATE, request_burst=DEFAULT_REQUEST_BURST,
+                 max_requests=DEFAULT_MAX_REQUESTS):
+        """
+        storage: Speicher-Backend (siehe storage_backends.py). Standard ist eine SQLite-Datenbank
+        db_name mit den PRAGMAs pragmas und dem Layout layout ('legacy' oder 'compact', siehe
+        LAYOUT_VERSIONS; None behält das Layout einer vorhandenen Datenbank bei, siehe SQLiteBackend);
+        für Analysen über viele Symbole eignet sich ColumnarBackend.
+        cache_bytes: Speicherbudget des LRU-Caches für get_stock_data (0 deaktiviert den Cache).
+        data_source: Standard ist yfinance hinter einem ScheduledDataSource (Rate-Limit, erneute
+        Versuche); die Stammdaten werden dann neben der Datenbank in '<db_name>.metadata.json' gecacht.
+        request_rate, request_burst, max_requests: Grenzen dieses ScheduledDataSource (Abrufe pro
+        Sekunde, kurzzeitig request_burst, höchstens max_requests gleichzeitig).
+        max_readers: Eine SQLite-Datenbank im WAL-Modus wird von jedem lesenden Thread über eine eigene,
+        nur lesende Verbindung gelesen (siehe snapshot), höchstens max_readers gleichzeitig
+        (None: unbegrenzt, 0: alle Zugriffe über die eine Schreibverbindung).
+        intraday: Ablage für Intraday-Balken (IntradayStore); Standard ist ein Verzeichnis neben der
+        Datenbank bzw. Spaltenablage ('<Name>.intraday').
+        """
+        if data_source is None:
+            metadata_path = None
+            if storage is None and db_name != ":memory:":
+                metadata_path = Path(db_name).with_suffix(".metadata.json")
+            data_source = ScheduledDataSource(YFinanceDataSource(), rate=request_rate, burst=request_burst,
+                                              max_concurrency=max_requests, metadata=MetadataCache(metadata_path))
+        self.data_source = data_source
+        self.storage = storage or SQLiteBackend(db_name, pragmas=pragmas, layout=layout)
+        self.cache_bytes: int = cache_bytes
+        self._history_cache: OrderedDict = OrderedDict()
+        self._history_cache_sizes: dict = {}
+        self._cache_used: int = 0
+        self._cache_stats: dict = {"hits": 0, "misses": 0, "evictions": 0}
+        # Wird bei jedem Verwerfen erhöht; Leser cachen nur, wenn sich zwischendurch nichts geändert hat
+        self._cache_generation: int = 0
+        self._symbols_cache: list | None = None
+        # Symbole, deren Wochen-/Monatswerte geprüft bzw. beim Schreiben aktualisiert wurden
+        self._rollups_checked: set = set()
+        # Schützt Schreibverbindung, Cache und Zustand; Leser mit eigener Verbindung kommen ohne sie aus
+        self._lock = _ManagerLock()
+        self._readers = None
+        if (max_readers != 0 and isinstance(self.storage, SQLiteBackend) and not self.storage.read_only
+                and self.storage.db_name not in ("", ":memory:") and self.storage.journal_mode == "wal"):
+            self._readers = ReaderPool(self.storage.db_name, pragmas=self.storage.pragmas, max_readers=max_readers)
+        # Einzelne Schreibvorgänge (fetch_and_store_data) laufen gesammelt in einem Schreib-Thread
+        self._writer = WriteQueue(self.storage, lock=self._lock)
+        # Eine Sperre je Symbol, damit dasselbe Symbol nicht gleichzeitig zweimal geladen und gespeichert wird
+        self._fetch_locks: dict = {}
+        if intraday is None:
+            location = getattr(self.storage, "directory", None) or getattr(self.storage, "db_name", None)
+            if location not in (None, "", ":memory:"):
+                intraday = IntradayStore(Path(location).with_suffix(".intraday"))
+        self.intraday = intraday
 
-    def _connect_db(self):
-        """Stellt eine Verbindung zur SQLite-Datenbank her."""
-        try:
-            self.conn = sqlite3.connect(self.db_name)
-            self.cursor = self.conn.cursor()
-            print(f"Erfolgreich mit Datenbank '{self.db_name}' verbunden.")
-        except sqlite3.Error as e:
-            print(f"Fehler beim Verbinden mit der Datenbank: {e}")
-
-    def _create_tables(self):
-        """Erstellt die Tabellen für Aktiendaten, falls sie noch nicht existieren."""
-        if not self.conn:
-            print("Keine Datenbankverbindung vorhanden.")
-            return
+    @contextmanager
+    def snapshot(self):
+        """
+        Kontextmanager für zusammengehörige Lesevorgänge, z.B. aus Analyse-Jobs oder der GUI:
+        liefert ein Speicher-Backend, dessen Abfragen innerhalb des Blocks einen gemeinsamen, bestätigten
+        Stand sehen, auch während parallel ein großer Import schreibt. Bei einer SQLite-Datenbank im
+        WAL-Modus ist das die nur lesende Verbindung des Threads (Leser laufen dann parallel), sonst die
+        Schreibverbindung unter der Sperre der Instanz. Nur lesen, nicht schreiben.
+        """
+        if self._readers is None or self._lock.held():
+            # Hält der Thread die Sperre (z.B. beim Schreiben), muss er seine eigenen Änderungen sehen
+            with self._lock:
+                yield self.storage
+        else:
+            with self._readers.snapshot() as storage:
+                yield storage
 
+    def write(self, fn):
+        """
+        Reiht fn(storage) beim Schreib-Thread ein und gibt ein Future mit dessen Ergebnis zurück.
+        Gleichzeitig eingereihte Schreibvorgänge werden in einer Transaktion bestätigt (siehe WriteQueue).
+        Hält der aufrufende Thread die Sperre bereits, läuft fn sofort in seiner Transaktion.
+        """
+        if not self._lock.held():
+            return self._writer.submit(fn)
+        future = Future()
         try:
-            self.cursor.execute('''
-                CREATE TABLE IF NOT EXISTS stocks (
-                    symbol TEXT PRIMARY KEY,
-                    company_name TEXT
-                )
-            ''')
-            self.cursor.execute('''
-                CREATE TABLE IF NOT EXISTS daily_prices (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    symbol TEXT NOT NULL,
-                    date TEXT NOT NULL,
-                    open REAL,
-                    high REAL,
-                    low REAL,
-                    close REAL,
-                    adj_close REAL,
-                    volume INTEGER,
-                    FOREIGN KEY (symbol) REFERENCES stocks (symbol) ON DELETE CASCADE,
-                    UNIQUE (symbol, date)
-                )
-            ''')
-            self.conn.commit()
-            print("Datenbanktabellen überprüft/erstellt.")
-        except sqlite3.Error as e:
-            print(f"Fehler beim Erstellen der Tabellen: {e}")
+            future.set_result(fn(self.storage))
+        except Exception as e:
+            future.set_exception(e)
+        return future
+
+    def _fetch_lock(self, symbol):
+        with self._lock:
+            return self._fetch_locks.setdefault(symbol, threading.Lock())
+
+    def _upsert_stocks(self, stocks):
+        self._symbols_cache = None
+        self.storage.upsert_stocks(stocks)
 
+    @_synchronized
     def add_stock(self, symbol, company_name=""):
         """Fügt ein Aktiensymbol zur 'stocks'-Tabelle hinzu."""
-        if not self.conn: return
+        if not self.storage.is_open: return
         try:
-            self.cursor.execute("INSERT OR IGNORE INTO stocks (symbol, company_name) VALUES (?, ?)", (symbol.upper(), company_name))
-            self.conn.commit()
-            print(f"Aktie '{symbol.upper()}' zur Datenbank hinzugefügt (falls neu).")
+            self._upsert_stocks([(symbol, company_name)])
+            self.storage.commit()
+            logger.info("Aktie '%s' zur Datenbank hinzugefügt (falls neu).", symbol.upper())
             return True
-        except sqlite3.Error as e:
-            print(f"Fehler beim Hinzufügen der Aktie {symbol}: {e}")
+        except STORAGE_ERRORS as e:
+            logger.error("Fehler beim Hinzufügen der Aktie %s: %s", symbol, e)
             return False
 
+    @_synchronized
+    def add_stocks(self, stocks):
+        """Fügt mehrere (Symbol, Firmenname)-Paare in einer Transaktion zur 'stocks'-Tabelle hinzu."""
+        if not self.storage.is_open: return False
+        try:
+            self._upsert_stocks(stocks)
+            self.storage.commit()
+            return True
+        except STORAGE_ERRORS as e:
+            logger.error("Fehler beim Hinzufügen der Aktien: %s", e)
+            return False
+
+    @_synchronized
     def get_all_symbols(self):
-        """Gibt eine Liste aller in der Datenbank gespeicherten Symbole zurück."""
-        if not self.conn: return []
-        self.cursor.execute("SELECT symbol FROM stocks")
-        return [row[0] for row in self.cursor.fetchall()]
+        """Gibt eine Liste aller in der Datenbank gespeicherten Symbole zurück (gecacht bis zur nächsten Änderung)."""
+        if not self.storage.is_open: return []
+        if self._symbols_cache is None:
+            self._symbols_cache = self.storage.symbols()
+        return list(self._symbols_cache)
+
+    def _download_history(self, symbol, period, last_date):
+        """
+        Lädt die fehlenden Kurse eines Symbols über die Datenquelle (ohne Datenbankzugriff).
+        Ohne last_date wird 'period' vollständig geladen, sonst nur die Tage nach last_date.
+        Gibt None zurück, wenn die Daten bereits aktuell sind.
+        """
+        if last_date is None:
+            logger.debug("Hole Daten für %s (Zeitraum: %s)...", symbol, period)
+            with span("source.history") as timing:
+                hist = self.data_source.history(symbol, period=period)
+                timing.rows = len(hist)
+            return hist
+
+        start = last_date + timedelta(days=1)
+        if start > date.today():
+            return None
+        logger.debug("Hole Daten für %s ab %s...", symbol, start.isoformat())
+        with span("source.history") as timing:
+            hist = self.data_source.history(symbol, start=start.isoformat())
+            timing.rows = len(hist)
+        if not hist.empty:
+            hist = hist[hist.index.date > last_date]
+        return hist
 
-    def fetch_and_store_data(self, symbol, period="1y"):
+    def _company_name(self, symbol):
+        """Fragt den Firmennamen eines Symbols bei der Datenquelle ab (ohne Datenbankzugriff)."""
+        with span("source.info"):
+            return self.data_source.info(symbol).get('longName', '')
+
+    def _insert_history(self, symbol, hist, replace=False):
+        """
+        Schreibt eine Kurshistorie im yfinance-Format in das Speicher-Backend (ohne commit)
+        und aktualisiert die Wochen- und Monatswerte der betroffenen Perioden. Gespeicherte
+        Indikatorreihen werden beim Anhängen fortgeschrieben, beim Überschreiben vorhandener
+        Tage (repair) verworfen.
+        """
+        frame = hist[PRICE_COLUMNS].set_axis(PRICE_FIELDS, axis=1)
+        days, columns = frame_to_columns(frame)
+        if not len(days):
+            return self.storage.insert_history(symbol, days, columns, replace=replace)
+        last_day = _epoch_day(self.storage.last_stored_date(symbol))
+        row_count = self.storage.insert_history(symbol, days, columns, replace=replace)
+        first_day = int(days.min())
+        if (last_day is None or last_day < first_day) and np.all(np.diff(days) > 0):
+            # Neue Tage hinter den gespeicherten (Ergänzen, Erstabruf): sie liegen schon im Speicher
+            self._update_rollups(symbol, first_day if last_day is not None else None, (days, columns))
+            self._extend_indicators(symbol)
+        else:
+            self._update_rollups(symbol, first_day)
+            self._invalidate_indicators(symbol)
+        return row_count
+
+    def _update_rollups(self, symbol, first_day=None, appended=None):
+        """
+        Berechnet die Wochen- und Monatswerte eines Symbols ab der Periode neu, in der der Epochentag
+        first_day liegt (None: vollständig), ohne commit. Gelesen werden nur die Tageskurse ab dieser
+        Periode; appended=(Tage, Spalten) sind gerade angehängte Tageskurse ab first_day, dann werden
+        nur die davor liegenden Tage der Periode gelesen (beim täglichen Ergänzen höchstens ein Monat).
+        Mit appended und first_day=None bilden die angehängten Tage die gesamte Historie.
+        """
+        starts = {resolution: rollup_period_start(first_day, resolution) if first_day is not None else None
+                  for resolution in ROLLUP_TABLES}
+        first_start = None if first_day is None else min(starts.values())
+        with span("manager.update_rollups"):
+            if appended is None:
+                days, columns = frame_to_columns(self.storage.query_history(symbol, _epoch_date(first_start)))
+            elif first_day is None:
+                days, columns = appended
+            else:
+                before_days, before = frame_to_columns(
+                    self.storage.query_history(symbol, _epoch_date(first_start), _epoch_date(first_day - 1)))
+                days = np.concatenate([before_days, appended[0]])
+                columns = {field: np.concatenate([before[field], appended[1][field]]) for field in PRICE_FIELDS}
+            for resolution, start in starts.items():
+                offset = np.searchsorted(days, start) if start is not None else 0
+                rollup_days, rollup = aggregate_rollup(
+                    days[offset:], {field: values[offset:] for field, values in columns.items()}, resolution)
+                self.storage.replace_rollups(symbol, resolution, start, rollup_days, rollup)
+        self._rollups_checked.add(symbol)
+
+    @timed("manager.fetch_and_store_data")
+    def fetch_and_store_data(self, symbol, period="1y", repair=False, interval="1d"):
         """
         Holt historische Kursdaten für ein Symbol und speichert sie in der Datenbank.
         period: '1d', '5d', '1mo', '3mo', '6mo', '1y', '2y', '5y', '10y', 'ytd', 'max'
+        interval: '1d' für Tageskurse oder ein Intraday-Intervall (siehe INTRADAY_INTERVALS, z.B.
+        '1m' oder '5m'); Intraday-Balken werden in der Intraday-Ablage gespeichert (siehe
+        get_intraday_data). yfinance liefert sie nur für die letzten 30 bzw. 60 Tage.
+
+        Inkrementell: Sind für das Symbol bereits Kurse gespeichert, wird nur der Zeitraum nach dem
+        letzten gespeicherten Datum geladen. Nur beim ersten Abruf wird 'period' vollständig geladen.
+        repair=True lädt 'period' erneut und überschreibt vorhandene Zeilen, um z.B. nach Splits
+        oder Dividenden geänderte 'adj_close'-Werte zu übernehmen.
         """
         symbol = symbol.upper()
-        print(f"Hole Daten für {symbol}...")
+        # Läuft für das Symbol bereits ein Abruf (z.B. die Aktualisierung aller Symbole), wird darauf
+        # gewartet und danach nur noch nachgeladen, was dieser nicht gespeichert hat
+        if interval != "1d" and interval not in INTRADAY_INTERVALS:
+            raise ValueError(f"Unbekanntes Intervall: {interval}")
+        with self._fetch_lock(symbol):
+            if interval != "1d":
+                return self._fetch_and_store_intraday(symbol, period, repair, interval)
+            return self._fetch_and_store(symbol, period, repair)
+
+    def _intraday_store(self):
+        if self.intraday is None:
+            raise ValueError("Keine Intraday-Ablage vorhanden (Datenbank im Speicher, siehe Parameter 'intraday').")
+        return self.intraday
+
+    def _fetch_and_store_intraday(self, symbol, period, repair, interval):
+        """
+        Wie _fetch_and_store für Intraday-Balken; ergänzt wird ab dem Tag des letzten gespeicherten Balkens.
+        Abgefragt wird nur der Zeitraum, den yfinance liefert (siehe intraday_earliest), 1-Minuten-Balken
+        in Abschnitten von höchstens INTRADAY_REQUEST_DAYS Tagen. Liegt der letzte Balken davor, bleibt
+        eine Lücke (Warnung).
+        """
         try:
-            ticker = yf.Ticker(symbol)
-            hist = ticker.history(period="1y", auto_adjust=False)
+            store = self._intraday_store()
+            last = None if repair else store.last_timestamp(symbol, interval)
+            today = date.today()
+            earliest = intraday_earliest(interval, today)
+            if last is None:
+                first_day = period_start(period, today) or earliest
+            else:
+                first_day = np.datetime64(last, 's').astype('datetime64[D]').item()
+            gap = last is not None and first_day < earliest
+            if gap:
+                logger.warning("%s-Balken für %s fehlen zwischen %s und %s: yfinance liefert nur die letzten Tage.",
+                               interval, symbol, first_day.isoformat(), earliest.isoformat())
+            first_day = max(first_day, earliest)
+
+            frames = []
+            with span("source.history") as timing:
+                for start, end in self._intraday_requests(interval, first_day, today):
+                    logger.debug("Hole %s-Balken für %s von %s bis %s...", interval, symbol, start.isoformat(),
+                                 end.isoformat())
+                    part = self.data_source.history(symbol, start=start.isoformat(), end=end.isoformat(),
+                                                    interval=interval)
+                    if not part.empty:
+                        frames.append(part)
+                hist = pd.concat(frames) if frames else pd.DataFrame(columns=PRICE_COLUMNS)
+                timing.rows = len(hist)
             if hist.empty:
-                print(f"Keine Daten für {symbol} gefunden oder ungültiges Symbol.")
-                return False
+                if last is None or gap:
+                    logger.warning("Keine %s-Balken für %s gefunden.", interval, symbol)
+                    return False
+                logger.info("Keine neuen %s-Balken für %s vorhanden.", interval, symbol)
+                return True
+            ts, columns = bars_from_frame(hist)
+            if last is not None:
+                new = ts > last
+                ts, columns = ts[new], {field: values[new] for field, values in columns.items()}
+            count = store.insert_bars(symbol, interval, ts, columns)
+            logger.info("%d %s-Balken für %s gespeichert.", count, interval, symbol)
+            return True
+        except Exception as e:
+            logger.error("Fehler beim Holen/Speichern der %s-Balken für %s: %s", interval, symbol, e)
+            return False
+
+    @staticmethod
+    def _intraday_requests(interval, first_day, today):
+        """Zerlegt die Tage first_day bis today in Abrufzeiträume (start, end exklusiv) für yfinance."""
+        step = INTRADAY_REQUEST_DAYS.get(interval)
+        end = today + timedelta(days=1)
+        requests = []
+        while first_day < end:
+            stop = min(end, first_day + timedelta(days=step)) if step else end
+            requests.append((first_day, stop))
+            first_day = stop
+        return requests
+
+    @timed("manager.get_intraday_data", rows=lambda result: len(result[0]) if isinstance(result, tuple) else len(result))
+    def get_intraday_data(self, symbol, interval="5m", start=None, end=None, as_arrays=False, tz=None):
+        """
+        Liest gespeicherte Intraday-Balken eines Symbols im Zeitraum (start/end einschließlich; ein
+        reines Datum als Ende umfasst den ganzen Tag, Zeitpunkte ohne Zeitzone gelten als UTC).
+        Gibt einen DataFrame (Spalten open, high, low, close, volume, Zeitstempel in UTC bzw. in der
+        Zeitzone tz) zurück, mit as_arrays=True (Sekunden seit 1970 UTC, Spalten) als NumPy-Arrays.
+        Gelesen wird ohne Sperre, also auch während eines Abrufs.
+        """
+        store = self._intraday_store()
+        if as_arrays:
+            return store.query_bars(symbol.upper(), interval, start, end)
+        return store.query_frame(symbol.upper(), interval, start, end, tz=tz)
+
+    def _fetch_and_store(self, symbol, period, repair):
+        try:
+            # Der Download läuft ohne Datenbanksperre, damit andere Threads währenddessen lesen können
+            with self._lock:
+                last_date = None if repair else self.storage.last_stored_date(symbol)
+            hist = self._download_history(symbol, period, last_date)
+            if hist is None:
+                logger.info("Daten für %s sind bereits aktuell.", symbol)
+                return True
+            if hist.empty:
+                if last_date is None:
+                    logger.warning("Keine Daten für %s gefunden oder ungültiges Symbol.", symbol)
+                    return False
+                logger.info("Keine neuen Daten für %s vorhanden.", symbol)
+                return True
 
-            # Füge das Symbol hinzu, falls es noch nicht existiert (z.B. wenn es direkt per API geholt wird)
-            self.add_stock(symbol, ticker.info.get('longName', ''))
-
-            data_to_insert = []
-            for date, row in hist.iterrows():
-                # Formatiere Datum als YYYY-MM-DD
-                date_str = date.strftime('%Y-%m-%d')
-                data_to_insert.append((
-                    symbol,
-                    date_str,
-                    row['Open'],
-                    row['High'],
-                    row['Low'],
-                    row['Close'],
-                    row['Adj Close'],
-                    row['Volume']
-                ))
-            
-            # Verwende INSERT OR IGNORE, um Duplikate zu vermeiden
-            self.cursor.executemany("""
-                INSERT OR IGNORE INTO daily_prices (symbol, date, open, high, low, close, adj_close, volume)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-            """, data_to_insert)
-            self.conn.commit()
-            print(f"Daten für {symbol} erfolgreich gespeichert/aktualisiert.")
+            # Die Stammdaten werden nur abgefragt, solange noch kein Firmenname gespeichert ist
+            company_name = None
+            with self._lock:
+                has_company_name = self.storage.has_company_name(symbol)
+            if not has_company_name:
+                company_name = self._company_name(symbol)
+
+            def store(storage):
+                # Füge das Symbol hinzu, falls es noch nicht existiert (z.B. wenn es direkt per API geholt wird)
+                if company_name is not None:
+                    self._upsert_stocks([(symbol, company_name)])
+                row_count = self._insert_history(symbol, hist, replace=repair)
+                self._invalidate_cache(symbol)
+                return row_count
+
+            row_count = self.write(store).result()
+            logger.info("%d Zeilen für %s erfolgreich gespeichert/aktualisiert.", row_count, symbol)
             return True
         except Exception as e:
-            print(f"Fehler beim Holen/Speichern der Daten für {symbol}: {e}")
+            logger.error("Fehler beim Holen/Speichern der Daten für %s: %s", symbol, e)
             return False
 
-    def get_stock_data(self, symbol, start_date=None, end_date=None):
+    @timed("manager.fetch_and_store_many")
+    def fetch_and_store_many(self, symbols, period="1y", repair=False, max_workers=8, commit_rows=100_000,
+                             progress=None, cancel_event=None, request_rate=None, request_burst=None):
+        """
+        Holt die Kursdaten vieler Symbole parallel und speichert sie gesammelt.
+
+        Die Downloads laufen in einem Thread-Pool mit höchstens max_workers gleichzeitigen Abrufen.
+        Ist data_source ein ScheduledDataSource, gelten für die Dauer des Imports max_workers gleichzeitige
+        Abrufe und, falls angegeben, request_rate bzw. request_burst statt seiner eigenen Grenzen.
+        Geschrieben wird ausschließlich im aufrufenden Thread, der die Ergebnisse einsammelt und
+        jeweils nach etwa commit_rows Zeilen eine Transaktion abschließt.
+        Inkrementeller Abruf und repair verhalten sich wie bei fetch_and_store_data.
+        progress(erledigt, gesamt, symbol) wird nach jedem Symbol aufgerufen. Wird cancel_event
+        (threading.Event) gesetzt, werden ausstehende Downloads verworfen und die bereits geladenen
+        Kurse gespeichert.
+        Gibt einen BulkFetchReport mit Erfolg/Fehler je Symbol und dem Durchsatz zurück.
+        """
+        symbols = list(dict.fromkeys(symbol.upper() for symbol in symbols))
+        report = BulkFetchReport()
+        if not self.storage.is_open:
+            report.failed = {symbol: "Keine Datenbankverbindung vorhanden." for symbol in symbols}
+            return report
+
+        started = time.perf_counter()
+        with self._lock:
+            last_dates = {} if repair else self.storage.last_stored_dates()
+            named = self.storage.symbols_with_company_name()
+
+        def download(symbol):
+            # Die Symbolsperre bleibt nach einem erfolgreichen Download bis zum Speichern gehalten
+            lock = self._fetch_lock(symbol)
+            if not lock.acquire(blocking=False):
+                lock.acquire()
+                # Ein anderer Abruf hat das Symbol inzwischen gespeichert
+                with self._lock:
+                    if not repair:
+                        last_dates[symbol] = self.storage.last_stored_date(symbol)
+                    if self.storage.has_company_name(symbol):
+                        named.add(symbol)
+            try:
+                last_date = last_dates.get(symbol)
+                hist = self._download_history(symbol, period, last_date)
+                if hist is not None and hist.empty and last_date is None:
+                    raise ValueError("Keine Daten gefunden oder ungültiges Symbol.")
+                company_name = None
+                if hist is not None and not hist.empty and symbol not in named:
+                    company_name = self._company_name(symbol)
+                return hist, company_name
+            except BaseException:
+                lock.release()
+                raise
+
+        limits = nullcontext()
+        if isinstance(self.data_source, ScheduledDataSource):
+            limits = self.data_source.limits(request_rate, request_burst, max_workers)
+        pending_rows = 0
+        processed = set()
+        with limits, ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = {executor.submit(download, symbol): symbol for symbol in symbols}
+            for done, future in enumerate(as_completed(futures), start=1):
+                symbol = futures[future]
+                processed.add(future)
+                try:
+                    hist, company_name = future.result()
+                except Exception as e:
+                    report.failed[symbol] = str(e)
+                else:
+                    try:
+                        # Schlägt das Speichern fehl, bleibt nichts vom Symbol in der Transaktion zurück
+                        with self._lock, self.storage.savepoint():
+                            if company_name is not None:
+                                self._upsert_stocks([(symbol, company_name)])
+                            if hist is not None and not hist.empty:
+                                row_count = self._insert_history(symbol, hist, replace=repair)
+                                self._invalidate_cache(symbol)
+                                report.rows += row_count
+                                pending_rows += row_count
+                        report.succeeded.append(symbol)
+                    except Exception as e:
+                        with self._lock:
+                            self._invalidate_cache(symbol)
+                            self._rollups_checked.discard(symbol)
+                            self._symbols_cache = None
+                        report.failed[symbol] = str(e)
+                    finally:
+                        self._fetch_lock(symbol).release()
+                if pending_rows >= commit_rows:
+                    with self._lock:
+                        self.storage.commit()
+                    pending_rows = 0
+                if progress:
+                    progress(done, len(symbols), symbol)
+                if cancel_event is not None and cancel_event.is_set():
+                    for pending in futures:
+                        pending.cancel()
+                    report.cancelled = True
+                    break
+        # Nach einem Abbruch: Sperren verworfener, aber bereits geladener Symbole freigeben
+        for future, symbol in futures.items():
+            if future not in processed and not future.cancelled() and future.exception() is None:
+                self._fetch_lock(symbol).release()
+        with self._lock:
+            self.storage.commit()
+
+        report.elapsed = time.perf_counter() - started
+        logger.info("%d/%d Symbole und %d Zeilen in %.2f s gespeichert (%.1f Symbole/s, %.0f Zeilen/s).",
+                    len(report.succeeded), len(symbols), report.rows, report.elapsed,
+                    report.symbols_per_second, report.rows_per_second)
+        return report
+
+    def _cached_history(self, symbol):
+        """
+        Gibt die vollständige Kurshistorie eines Symbols aus dem LRU-Cache zurück und lädt sie bei
+        Bedarf einmalig aus der Datenbank. Übersteigt der Cache cache_bytes, werden die am längsten
+        nicht verwendeten Symbole verdrängt; eine einzelne zu große Historie wird nicht gecacht.
+        """
+        writing = self._lock.held()
+        with self._lock:
+            history = self._history_cache.get(symbol)
+            if history is not None:
+                self._history_cache.move_to_end(symbol)
+                self._cache_stats["hits"] += 1
+                METRICS.count("cache.hits")
+                return history
+            self._cache_stats["misses"] += 1
+            METRICS.count("cache.misses")
+            generation = self._cache_generation
+            # Leseverbindungen sehen keine offenen Schreibvorgänge; ihr Stand wäre nach dem commit veraltet
+            cacheable = self._readers is None or writing or not getattr(self.storage, "in_transaction", False)
+
+        with self.snapshot() as storage:
+            history = storage.query_history(symbol)
+        size = int(history.memory_usage(index=True).sum())
+        with self._lock:
+            if (not cacheable or generation != self._cache_generation or symbol in self._history_cache
+                    or size > self.cache_bytes):
+                return history
+            self._history_cache[symbol] = history
+            self._history_cache_sizes[symbol] = size
+            self._cache_used += size
+            while self._cache_used > self.cache_bytes:
+                evicted, _ = self._history_cache.popitem(last=False)
+                self._cache_used -= self._history_cache_sizes.pop(evicted)
+                self._cache_stats["evictions"] += 1
+                METRICS.count("cache.evictions")
+        return history
+
+    def _invalidate_cache(self, symbol):
+        """Entfernt ein Symbol nach Schreibvorgängen aus dem Cache."""
+        self._cache_generation += 1
+        if self._history_cache.pop(symbol, None) is not None:
+            self._cache_used -= self._history_cache_sizes.pop(symbol)
+
+    @_synchronized
+    def clear_cache(self):
+        """Leert den Abfrage-Cache vollständig."""
+        self._history_cache.clear()
+        self._history_cache_sizes.clear()
+        self._cache_used = 0
+        self._cache_generation += 1
+        self._symbols_cache = None
+
+    @_synchronized
+    def cache_stats(self):
+        """Gibt Treffer, Fehlzugriffe, Verdrängungen und Speicherbelegung des Abfrage-Caches zurück."""
+        return {
+            **self._cache_stats,
+            "entries": len(self._history_cache),
+            "bytes": self._cache_used,
+            "max_bytes": self.cache_bytes,
+        }
+
+    @timed("manager.get_stock_data", rows=len)
+    def get_stock_data(self, symbol, start_date=None, end_date=None, resolution="daily"):
         """
         Holt historische Kursdaten für ein Symbol aus der Datenbank als Pandas DataFrame.
         Optional: Filter nach Start- und Enddatum.
+        Ist der Cache aktiv, wird der Zeitraum aus der gecachten Gesamthistorie geschnitten.
+        Der zurückgegebene DataFrame darf daher nicht verändert werden.
+        resolution: 'daily', 'weekly' oder 'monthly' (siehe RESOLUTIONS). Wochen- und Monatswerte
+        stammen aus den beim Speichern gepflegten Verdichtungen; jede Zeile steht unter dem letzten
+        Handelstag ihrer Periode und enthält nur Tageskurse aus dem angefragten Zeitraum.
+        Gelesen wird über snapshot(), also parallel zu anderen Lesern und Schreibvorgängen.
         """
+        if resolution not in RESOLUTIONS:
+            raise ValueError(f"Unbekannte Auflösung: {resolution}")
         symbol = symbol.upper()
-        query = "SELECT date, open, high, low, close, adj_close, volume FROM daily_prices WHERE symbol = ?"
-        params = [symbol]
-
-        if start_date and end_date:
-            query += " AND date BETWEEN ? AND ?"
-            params.append(start_date)
-            params.append(end_date)
-        elif start_date:
-            query += " AND date >= ?"
-            params.append(start_date)
-        elif end_date:
-            query += " AND date <= ?"
-            params.append(end_date)
-
-        query += " ORDER BY date ASC"
-
         try:
-            df = pd.read_sql(query, self.conn, params=params, parse_dates=['date'], index_col='date')
+            if resolution != "daily":
+                with self._lock:
+                    current = self._check_rollups(symbol)
+                with self.snapshot() as storage:
+                    df = self._rollup_history(storage, symbol, resolution, start_date, end_date, current)
+            elif self.cache_bytes:
+                df = self._cached_history(symbol)
+                if not df.empty and (start_date or end_date):
+                    # Binäre Suche auf dem sortierten Datumsindex statt String-Slicing per .loc
+                    first = df.index.searchsorted(pd.Timestamp(start_date)) if start_date else 0
+                    last = df.index.searchsorted(pd.Timestamp(end_date), side='right') if end_date else len(df)
+                    df = df.iloc[first:last]
+            else:
+                with self.snapshot() as storage:
+                    df = storage.query_history(symbol, start_date, end_date)
             if df.empty:
-                print(f"Keine Daten für {symbol} im angegebenen Zeitraum in der Datenbank gefunden.")
+                logger.info("Keine Daten für %s im angegebenen Zeitraum in der Datenbank gefunden.", symbol)
             return df
-        except sqlite3.Error as e:
-            print(f"Fehler beim Abrufen der Daten für {symbol} aus der Datenbank: {e}")
+        except STORAGE_ERRORS as e:
+            logger.error("Fehler beim Abrufen der Daten für %s aus der Datenbank: %s", symbol, e)
             return pd.DataFrame()
 
+    def _check_rollups(self, symbol):
+        """
+        Stellt einmalig je Symbol sicher, dass die Wochen- und Monatswerte bis zum letzten Tageskurs
+        reichen (z.B. bei Datenbanken aus älteren Versionen), und ergänzt sie sonst.
+        Gibt False zurück, wenn sie veraltet sind und nicht geschrieben werden dürfen (read_only).
+        """
+        if symbol in self._rollups_checked:
+            return True
+        last_day = _epoch_day(self.storage.last_stored_date(symbol))
+        rollup_days = [self.storage.last_rollup_day(symbol, resolution) for resolution in ROLLUP_TABLES]
+        stale = [day for day in rollup_days if day != last_day]
+        if stale:
+            if getattr(self.storage, "read_only", False):
+                return False
+            logger.info("Berechne Wochen- und Monatswerte für %s.", symbol)
+            with self.storage.transaction():
+                self._update_rollups(symbol, min(stale) if None not in stale else None)
+        self._rollups_checked.add(symbol)
+        return True
+
+    def _rollup_history(self, storage, symbol, resolution, start_date, end_date, current=True):
+        """
+        Wochen- bzw. Monatswerte im Zeitraum. Perioden, die nur teilweise im Zeitraum liegen
+        (erste und letzte), werden aus den Tageskursen des Zeitraums neu verdichtet.
+        current=False (veraltete Verdichtungen, siehe _check_rollups) verdichtet nur die Tageskurse.
+        """
+        start = _epoch_day(start_date) if start_date else None
+        end = _epoch_day(end_date) if end_date else None
+        if not current:
+            # Nur lesend geöffnete, veraltete Ablage: direkt aus den Tageskursen verdichten
+            days, columns = frame_to_columns(storage.query_history(symbol, start_date, end_date))
+            return _rollup_frame(*aggregate_rollup(days, columns, resolution))
+
+        days, columns = frame_to_columns(storage.query_rollups(symbol, resolution, start_date, end_date))
+        last_covered = int(days[-1]) if len(days) else None
+        parts = []
+        if start is not None and len(days) and rollup_period_start(days[0], resolution) < start:
+            head_days, head = frame_to_columns(storage.query_history(symbol, start_date, _epoch_date(days[0])))
+            parts.append(aggregate_rollup(head_days, head, resolution))
+            days, columns = days[1:], {field: values[1:] for field, values in columns.items()}
+        parts.append((days, columns))
+        if end is not None:
+            # Die letzte Periode endet nach end_date: ihre Tage bis end_date fehlen in den Verdichtungen
+            after = last_covered + 1 if last_covered is not None else start
+            if after is None or after <= end:
+                tail_days, tail = frame_to_columns(storage.query_history(symbol, _epoch_date(after), end_date))
+                parts.append(aggregate_rollup(tail_days, tail, resolution))
+        return _rollup_frame(np.concatenate([part[0] for part in parts]),
+                             {field: np.concatenate([part[1][field] for part in parts]) for field in PRICE_FIELDS})
+
+    @timed("manager.get_indicator", rows=len)
+    @_synchronized
+    def get_indicator(self, symbol, spec, start_date=None, end_date=None):
+        """
+        Holt eine gespeicherte Indikatorreihe (spec: financial_tools.IndicatorSpec, nur
+        PERSISTED_INDICATORS) im Zeitraum als Series; Tage ohne Wert (z.B. vor dem ersten vollen
+        Fenster) sind NaN. Die Reihe wird über die gesamte Historie berechnet, sodass ihre Werte
+        nicht vom Zeitraum abhängen. Fehlt sie oder reicht sie nicht bis zum letzten Kurs (bei Beta
+        auch des Marktes), wird sie berechnet bzw. nur am Ende ergänzt und gespeichert; eine nur
+        lesend geöffnete Ablage berechnet sie dann im Speicher.
+        """
+        if spec.name not in PERSISTED_INDICATORS:
+            raise ValueError(f"Indikator wird nicht gespeichert: {spec.name} (möglich: {', '.join(PERSISTED_INDICATORS)})")
+        symbol = symbol.upper()
+        try:
+            if getattr(self.storage, "read_only", False):
+                if not self._indicator_is_current(symbol, spec):
+                    series = self._compute_indicator(symbol, spec).rename(spec.key)
+                    first = series.index.searchsorted(pd.Timestamp(start_date)) if start_date else 0
+                    last = series.index.searchsorted(pd.Timestamp(end_date), side='right') if end_date else len(series)
+                    return series.iloc[first:last]
+            elif not self._indicator_is_current(symbol, spec):
+                with self.storage.transaction():
+                    self._update_indicator(symbol, spec)
+            return self.storage.query_indicator_values(symbol, spec.key, start_date, end_date)
+        except STORAGE_ERRORS as e:
+            logger.error("Fehler beim Abrufen von %s für %s: %s", spec.key, symbol, e)
+            return pd.Series(dtype='float64', name=spec.key)
+
+    @timed("manager.get_indicator_panel")
+    def get_indicator_panel(self, symbols, spec, start_date=None, end_date=None):
+        """
+        Gespeicherte Indikatorreihen vieler Symbole als DataFrame (Datum x Symbol), z.B. für Screens
+        über das ganze Universum; fehlende oder veraltete Reihen werden wie bei get_indicator ergänzt.
+        """
+        symbols = list(dict.fromkeys(symbol.upper() for symbol in symbols))
+        columns = {symbol: self.get_indicator(symbol, spec, start_date, end_date) for symbol in symbols}
+        return pd.DataFrame(columns, columns=symbols).rename_axis('date')
+
+    def _indicator_end(self, symbol, spec):
+        """Letzter Tag (Epochentag), bis zu dem eine Reihe berechnet werden kann (None: keine Kurse)."""
+        last_day = _epoch_day(self.storage.last_stored_date(symbol))
+        if spec.market and last_day is not None:
+            market_day = _epoch_day(self.storage.last_stored_date(spec.market))
+            last_day = None if market_day is None else min(last_day, market_day)
+        return last_day
+
+    def _indicator_is_current(self, symbol, spec):
+        end_day = self._indicator_end(symbol, spec)
+        stored_day = self.storage.last_indicator_day(symbol, spec.key)
+        return end_day is None or (stored_day is not None and stored_day >= end_day)
+
+    def _update_indicator(self, symbol, spec):
+        """Berechnet die Tage einer gespeicherten Reihe nach ihrem letzten Tag (bzw. alle) und speichert sie (ohne commit)."""
+        end_day = self._indicator_end(symbol, spec)
+        stored_day = self.storage.last_indicator_day(symbol, spec.key)
+        if end_day is None or (stored_day is not None and stored_day >= end_day):
+            return 0
+        with span("manager.update_indicator"):
+            series = self._compute_indicator(symbol, spec, stored_day, end_day)
+            if series.empty:
+                return 0
+            days = series.index.to_numpy().astype('datetime64[D]').astype(np.int64)
+            return self.storage.insert_indicator_values(symbol, spec.key, days, series.to_numpy(dtype='float64'))
+
+    def _compute_indicator(self, symbol, spec, after_day=None, end_day=None):
+        """
+        Berechnet eine Indikatorreihe für alle Handelstage des Symbols nach after_day (None: alle)
+        bis end_day. Für das Ende einer Reihe werden nur die Kurse ab etwa zwei Fensterlängen vor
+        after_day gelesen; reichen sie nicht für ein volles Fenster (z.B. nach einer längeren
+        Handelspause), wird vollständig berechnet.
+        """
+        if after_day is not None:
+            series = self._indicator_from(symbol, spec, after_day - 2 * spec.window - 14, after_day, end_day)
+            if series is not None:
+                return series
+        return self._indicator_from(symbol, spec, None, None, end_day)
+
+    def _indicator_from(self, symbol, spec, first_day, after_day, end_day):
+        """Berechnet spec aus den Kursen ab first_day; None, falls vor after_day kein volles Fenster liegt."""
+        if first_day is None:
+            data = self.get_stock_data(symbol, end_date=_epoch_date(end_day))
+        else:
+            data = self.storage.query_history(symbol, _epoch_date(first_day), _epoch_date(end_day))
+        market_data = None
+        if spec.market:
+            market_data = self.storage.query_history(spec.market, _epoch_date(first_day), _epoch_date(end_day))
+        context = IndicatorContext(data)
+        series = spec.compute(context, market_data).reindex(data.index)
+        if after_day is None:
+            return series
+        # Die Eingangsreihe des Fensters (Kurse, Renditen bzw. am Markt ausgerichtete Renditen) muss
+        # vor den neuen Tagen mindestens 'window' Zeilen enthalten, damit diese wie über die
+        # gesamte Historie berechnet werden
+        if spec.name == "ma":
+            inputs = context.prices()
+        elif spec.name == "volatility":
+            inputs = context.returns()
+        elif market_data is not None and not market_data.empty and not context.prices().empty:
+            inputs = context.aligned_market_returns(spec.market, market_data)
+        else:
+            return None
+        after = pd.Timestamp(_epoch_date(after_day))
+        if inputs.index.searchsorted(after, side='right') < spec.window:
+            return None
+        return series[series.index > after]
+
+    def _extend_indicators(self, symbol):
+        """Schreibt die gespeicherten Reihen eines Symbols nach neuen Kursen am Ende fort (ohne commit)."""
+        keys = [key for _, key in self.storage.indicator_series(symbol)]
+        if not keys:
+            return
+        self._invalidate_cache(symbol)
+        for key in keys:
+            spec = IndicatorSpec.from_key(key)
+            if spec.name in PERSISTED_INDICATORS:
+                self._update_indicator(symbol, spec)
+
+    def _invalidate_indicators(self, symbol):
+        """
+        Verwirft die gespeicherten Reihen eines Symbols und alle Beta-Reihen mit ihm als Markt
+        (ohne commit), z.B. nachdem Kurse rückwirkend korrigiert wurden. Sie werden beim nächsten
+        get_indicator neu berechnet.
+        """
+        for series_symbol, key in self.storage.indicator_series():
+            if series_symbol == symbol or IndicatorSpec.from_key(key).market == symbol:
+                self.storage.delete_indicator_values(series_symbol, key)
+
+    @timed("manager.get_price_matrix")
+    def get_price_matrix(self, symbols, start_date=None, end_date=None, field="adj_close", as_array=False,
+                         chunk_size=500):
+        """
+        Holt ein Kursfeld mehrerer Symbole als breite, datumsausgerichtete Matrix (Datum x Symbol).
+        SQLite lädt alle Symbole mit einer Abfrage (lange Symbollisten in Blöcken von chunk_size),
+        die Spaltenablage liest je Symbol nur das Datum und das angeforderte Feld.
+        Gibt einen DataFrame zurück, mit as_array=True ein PriceMatrix-Objekt (NumPy-Array, gemeinsamer
+        Datumsindex und Maske der gültigen Werte). Fehlende Werte sind NaN.
+        """
+        if field not in PRICE_FIELDS:
+            raise ValueError(f"Unbekanntes Kursfeld: {field}")
+        symbols = list(dict.fromkeys(symbol.upper() for symbol in symbols))
+        try:
+            with self.snapshot() as storage:
+                column_index, days, row_values = storage.load_field(symbols, start_date, end_date, field,
+                                                                    chunk_size=chunk_size)
+        except STORAGE_ERRORS as e:
+            logger.error("Fehler beim Abrufen der Kursmatrix aus der Datenbank: %s", e)
+            days = np.array([], dtype=np.int64)
+
+        if len(days):
+            # Epochentage liegen dicht beieinander: Zeilen über eine Belegungstabelle statt per Sortierung zuordnen
+            first_day = days.min()
+            offsets = days - first_day
+            present = np.zeros(int(offsets.max()) + 1, dtype=bool)
+            present[offsets] = True
+            row_index = (np.cumsum(present) - 1)[offsets]
+            unique_days = (np.flatnonzero(present) + first_day).astype('datetime64[D]')
+            values = np.full((len(unique_days), len(symbols)), np.nan)
+            values[row_index, column_index] = row_values
+            mask = np.zeros(values.shape, dtype=bool)
+            mask[row_index, column_index] = True
+        else:
+            unique_days = np.array([], dtype='datetime64[D]')
+            values = np.full((0, len(symbols)), np.nan)
+            mask = np.zeros(values.shape, dtype=bool)
+
+        matrix = PriceMatrix(pd.DatetimeIndex(unique_days.astype('datetime64[ns]'), name='date'), symbols, values, mask)
+        return matrix if as_array else matrix.to_frame()
+
     def close(self):
-        """Schließt die Datenbankverbindung."""
-        if self.conn:
-            self.conn.close()
-            print("Datenbankverbindung geschlossen.")
+        """
+        Schreibt ausstehende Änderungen, schließt die Datenbankverbindungen und schreibt den
+        Stammdaten-Cache der Datenquelle.
+        """
+        self._writer.close()
+        with self._lock:
+            if hasattr(self.data_source, "close"):
+                self.data_source.close()
+            if self._readers is not None:
+                self._readers.close()
+            self.storage.close()
 
 
 
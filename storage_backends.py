@@ -0,0 +1,1453 @@
+from concurrent.futures import Future
+from contextlib import contextmanager, nullcontext
+from datetime import date, timedelta
+from itertools import chain, repeat
+import json
+import logging
+import os
+from pathlib import Path
+import queue
+import shutil
+import sqlite3
+import threading
+import time
+from urllib.parse import quote, unquote
+
+import numpy as np
+import pandas as pd
+
+from data_sources import INTRADAY_INTERVALS
+from instrumentation import configure_logging, span, timed
+
+logger = logging.getLogger(__name__)
+
+# Spalten der gespeicherten Kurse (in dieser Reihenfolge in beiden Backends)
+PRICE_FIELDS = ["open", "high", "low", "close", "adj_close", "volume"]
+
+# Fehler, die beim Zugriff auf ein Backend auftreten können
+STORAGE_ERRORS = (sqlite3.Error, OSError, ValueError)
+
+# Standard-PRAGMAs für schnelle Massen-Schreibvorgänge; None lässt ein PRAGMA unverändert
+DEFAULT_PRAGMAS = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "cache_size": -64000,  # negativ = KiB, also ca. 64 MB Seitencache
+    "temp_store": "MEMORY",
+}
+
+# PRAGMAs, die bei nur lesend geöffneten Datenbanken nicht gesetzt werden
+READ_WRITE_PRAGMAS = ("journal_mode", "synchronous")
+
+# Speicherlayouts der Tabelle 'daily_prices' (als PRAGMA user_version in der Datenbank vermerkt):
+# 'legacy'  - Surrogat-id, Symbol und Datum als TEXT, zusätzlicher UNIQUE-Index auf (symbol, date)
+# 'compact' - WITHOUT ROWID, gruppiert nach (symbol_id, day), Datum als Tage seit 1970-01-01
+LAYOUT_VERSIONS = {"legacy": 1, "compact": 2}
+
+# Stand der übrigen Tabellen (1: mit 'indicator_values', 2: mit Wochen-/Monatswerten, 3: mit
+# Verzeichnis 'indicator_series'); steht zusammen mit dem Layout in PRAGMA user_version (siehe
+# _schema_version). Ist der Stand aktuell, entfallen beim Öffnen alle CREATE-TABLE-Prüfungen.
+# Bei Änderungen am Schema erhöhen.
+SCHEMA_REVISION = 3
+
+# Verdichtete Kurse je Woche (Montag bis Sonntag) bzw. Kalendermonat; Tabellen im SQLite-Backend.
+# Jede Periode steht unter ihrem letzten Handelstag (Datum des Schlusskurses).
+ROLLUP_TABLES = {"weekly": "weekly_prices", "monthly": "monthly_prices"}
+
+EPOCH = date(1970, 1, 1)
+
+
+def _schema_version(layout):
+    """Wert von PRAGMA user_version für eine Datenbank mit aktuellem Schema im Layout layout."""
+    return SCHEMA_REVISION << 8 | LAYOUT_VERSIONS[layout]
+
+
+def _date_to_day(value):
+    """Wandelt ein Datum (date oder 'YYYY-MM-DD') in Tage seit 1970-01-01 um."""
+    if isinstance(value, str):
+        value = date.fromisoformat(value[:10])
+    return (value - EPOCH).days
+
+
+def _day_to_date(day):
+    return EPOCH + timedelta(days=int(day))
+
+
+def frame_to_columns(frame):
+    """
+    Zerlegt einen Kurs-DataFrame (DatetimeIndex, Spalten wie PRICE_FIELDS) in Epochentage und
+    float64-Spalten, das gemeinsame Schreibformat aller Backends.
+    """
+    index = frame.index
+    if index.tz is not None:
+        # Lokales Börsendatum behalten, nicht nach UTC umrechnen
+        index = index.tz_localize(None)
+    days = index.to_numpy().astype('datetime64[D]').astype(np.int64)
+    return days, {field: frame[field].to_numpy(dtype='float64') for field in PRICE_FIELDS}
+
+
+def rollup_period_start(day, resolution):
+    """Erster Kalendertag (Epochentag) der Woche bzw. des Monats, in dem der Epochentag day liegt."""
+    if resolution == "weekly":
+        # 1970-01-01 war ein Donnerstag; Wochen beginnen am Montag
+        return day - (day + 3) % 7
+    if resolution == "monthly":
+        month = np.datetime64(int(day), 'D').astype('datetime64[M]')
+        return int(month.astype('datetime64[D]').astype(np.int64))
+    raise ValueError(f"Unbekannte Auflösung: {resolution}")
+
+
+def aggregate_rollup(days, columns, resolution):
+    """
+    Verdichtet sortierte Tageskurse (Epochentage und Spalten wie PRICE_FIELDS) zu Wochen- oder
+    Monatswerten: erster Eröffnungskurs, höchstes Hoch, tiefstes Tief, letzter (bereinigter)
+    Schlusskurs und Summe der Volumina. Fehlende Werte (NaN) werden übergangen.
+    Gibt den letzten Handelstag jeder Periode und die verdichteten Spalten zurück.
+    """
+    days = np.asarray(days, dtype=np.int64)
+    if not len(days):
+        return days, {field: np.array([], dtype='float64') for field in PRICE_FIELDS}
+    if resolution == "weekly":
+        periods = (days + 3) // 7
+    elif resolution == "monthly":
+        periods = days.astype('datetime64[D]').astype('datetime64[M]').astype(np.int64)
+    else:
+        raise ValueError(f"Unbekannte Auflösung: {resolution}")
+    starts = np.flatnonzero(np.r_[True, periods[1:] != periods[:-1]])
+    ends = np.r_[starts[1:], len(days)] - 1
+    columns = {field: np.asarray(columns[field], dtype='float64') for field in PRICE_FIELDS}
+    with np.errstate(invalid='ignore'):
+        rollup = {
+            "open": columns["open"][starts],
+            "high": np.fmax.reduceat(columns["high"], starts),
+            "low": np.fmin.reduceat(columns["low"], starts),
+            "close": columns["close"][ends],
+            "adj_close": columns["adj_close"][ends],
+            "volume": np.add.reduceat(np.nan_to_num(columns["volume"]), starts),
+        }
+    return days[ends], rollup
+
+
+def _indicator_series(days, values, name):
+    index = pd.DatetimeIndex(np.asarray(days, dtype=np.int64).astype('datetime64[D]').astype('datetime64[ns]'),
+                             name='date')
+    return pd.Series(values, index=index, name=name, dtype='float64')
+
+
+def _columns_to_frame(days, columns):
+    """Baut aus Epochentagen und Spalten-Arrays einen Kurs-DataFrame, ohne die Arrays zu kopieren."""
+    index = pd.DatetimeIndex(np.asarray(days, dtype=np.int64).astype('datetime64[D]').astype('datetime64[ns]'),
+                             name='date')
+    return pd.DataFrame({field: columns[field] for field in PRICE_FIELDS}, index=index, copy=False)
+
+
+class SQLiteBackend:
+    """
+    Speichert Stammdaten und Tageskurse in einer SQLite-Datenbank
+    (Layout 'legacy' oder 'compact', siehe LAYOUT_VERSIONS).
+    """
+
+    def __init__(self, db_name="stock_data.db", pragmas=None, layout="legacy", read_only=False):
+        """
+        Eine bestehende Datenbank im alten Layout wird bei layout='compact' beim Öffnen migriert.
+        Eine bereits kompakte Datenbank bleibt kompakt, auch wenn 'legacy' angefordert wird.
+        layout=None übernimmt das Layout einer vorhandenen Datenbank ohne Migration und legt eine
+        neue kompakt an (zum Umwandeln siehe migrate_to_compact).
+        read_only=True öffnet eine vorhandene Datenbank nur lesend (z.B. je Prozess eines
+        Batchlaufs): Tabellen werden nicht angelegt, das Layout wird aus der Datenbank gelesen.
+        """
+        if layout is not None and layout not in LAYOUT_VERSIONS:
+            raise ValueError(f"Unbekanntes Speicherlayout: {layout}")
+        self.db_name: str = db_name
+        self.pragmas: dict = {**DEFAULT_PRAGMAS, **(pragmas or {})}
+        self.layout: str = layout
+        self.read_only: bool = read_only
+        self.conn: sqlite3.Connection | None = None
+        self.cursor: sqlite3.Cursor | None = None
+        self._symbol_ids: dict = {}
+        self._connect_db()
+        if read_only:
+            if self.conn:
+                self.layout = self._existing_layout() or layout or "compact"
+        else:
+            self._create_tables()
+
+    def __repr__(self):
+        return f"SQLiteBackend({self.db_name!r}, layout={self.layout!r})"
+
+    @property
+    def is_open(self):
+        return self.conn is not None
+
+    @property
+    def in_transaction(self):
+        """Ob noch nicht bestätigte Schreibvorgänge offen sind (für andere Verbindungen unsichtbar)."""
+        return self.conn is not None and self.conn.in_transaction
+
+    @property
+    def journal_mode(self):
+        if not self.conn:
+            return None
+        return self.conn.execute("PRAGMA journal_mode").fetchone()[0].lower()
+
+    def _connect_db(self):
+        """Stellt eine Verbindung zur SQLite-Datenbank her."""
+        try:
+            with span("sqlite.connect"):
+                # Die Verbindung wird von mehreren Threads genutzt; der Aufrufer serialisiert den Zugriff
+                if self.read_only:
+                    uri = f"file:{quote(os.path.abspath(self.db_name))}?mode=ro"
+                    self.conn = sqlite3.connect(uri, uri=True, check_same_thread=False)
+                else:
+                    self.conn = sqlite3.connect(self.db_name, check_same_thread=False)
+                self.cursor = self.conn.cursor()
+                for pragma, value in self.pragmas.items():
+                    # Journal-Modus und Synchronisierung betreffen nur Schreibvorgänge
+                    if value is not None and not (self.read_only and pragma in READ_WRITE_PRAGMAS):
+                        self.cursor.execute(f"PRAGMA {pragma} = {value}")
+            logger.info("Erfolgreich mit Datenbank '%s' verbunden.", self.db_name)
+        except sqlite3.Error as e:
+            logger.error("Fehler beim Verbinden mit der Datenbank: %s", e)
+
+    def _create_tables(self):
+        """
+        Erstellt die Tabellen für Aktiendaten, falls sie noch nicht existieren.
+        Steht PRAGMA user_version bereits auf dem aktuellen Schema-Stand, entfällt die Prüfung.
+        """
+        if not self.conn:
+            logger.warning("Keine Datenbankverbindung vorhanden.")
+            return
+
+        try:
+            self.cursor.execute("PRAGMA user_version")
+            version = self.cursor.fetchone()[0]
+            current_layout = next((layout for layout in LAYOUT_VERSIONS if _schema_version(layout) == version), None)
+            if self.layout is None:
+                self.layout = current_layout or self._existing_layout() or "compact"
+            # Eine kompakte Datenbank bleibt kompakt; eine alte muss für 'compact' noch migriert werden
+            if current_layout in (self.layout, "compact"):
+                self.layout = current_layout
+                logger.debug("Datenbankschema ist aktuell (Layout: %s).", self.layout)
+                return
+            self.cursor.execute('''
+                CREATE TABLE IF NOT EXISTS stocks (
+                    symbol TEXT PRIMARY KEY,
+                    company_name TEXT
+                )
+            ''')
+            existing_layout = self._existing_layout()
+            if existing_layout == "compact":
+                self.layout = "compact"
+            if self.layout == "compact":
+                self._create_compact_tables()
+                if existing_layout == "legacy":
+                    self._migrate_to_compact()
+            else:
+                self.cursor.execute('''
+                    CREATE TABLE IF NOT EXISTS daily_prices (
+                        id INTEGER PRIMARY KEY AUTOINCREMENT,
+                        symbol TEXT NOT NULL,
+                        date TEXT NOT NULL,
+                        open REAL,
+                        high REAL,
+                        low REAL,
+                        close REAL,
+                        adj_close REAL,
+                        volume INTEGER,
+                        FOREIGN KEY (symbol) REFERENCES stocks (symbol) ON DELETE CASCADE,
+                        UNIQUE (symbol, date)
+                    )
+                ''')
+            for table in ROLLUP_TABLES.values():
+                self.cursor.execute(f'''
+                    CREATE TABLE IF NOT EXISTS {table} (
+                        symbol TEXT NOT NULL,
+                        day INTEGER NOT NULL,
+                        open REAL,
+                        high REAL,
+                        low REAL,
+                        close REAL,
+                        adj_close REAL,
+                        volume INTEGER,
+                        PRIMARY KEY (symbol, day)
+                    ) WITHOUT ROWID
+                ''')
+            # Berechnete Indikatorreihen, z.B. aus batch_analytics.py (Schlüssel wie 'ma_20' oder 'beta_SPY_60')
+            self.cursor.execute('''
+                CREATE TABLE IF NOT EXISTS indicator_values (
+                    symbol TEXT NOT NULL,
+                    indicator TEXT NOT NULL,
+                    day INTEGER NOT NULL,
+                    value REAL,
+                    PRIMARY KEY (symbol, indicator, day)
+                ) WITHOUT ROWID
+            ''')
+            # Verzeichnis der gespeicherten Reihen je Symbol (erspart das Durchsuchen von 'indicator_values')
+            self.cursor.execute('''
+                CREATE TABLE IF NOT EXISTS indicator_series (
+                    symbol TEXT NOT NULL,
+                    indicator TEXT NOT NULL,
+                    PRIMARY KEY (symbol, indicator)
+                ) WITHOUT ROWID
+            ''')
+            self.cursor.execute('''
+                INSERT OR IGNORE INTO indicator_series (symbol, indicator)
+                SELECT DISTINCT symbol, indicator FROM indicator_values
+            ''')
+            self.cursor.execute(f"PRAGMA user_version = {_schema_version(self.layout)}")
+            self.conn.commit()
+            logger.debug("Datenbanktabellen überprüft/erstellt (Layout: %s).", self.layout)
+        except sqlite3.Error as e:
+            logger.error("Fehler beim Erstellen der Tabellen: %s", e)
+
+    def _existing_layout(self):
+        """Erkennt das Layout einer vorhandenen 'daily_prices'-Tabelle (None, falls sie noch nicht existiert)."""
+        self.cursor.execute("PRAGMA table_info(daily_prices)")
+        columns = {row[1] for row in self.cursor.fetchall()}
+        if not columns:
+            return None
+        return "compact" if "symbol_id" in columns else "legacy"
+
+    def _create_compact_tables(self, table="daily_prices"):
+        self.cursor.execute('''
+            CREATE TABLE IF NOT EXISTS symbol_ids (
+                id INTEGER PRIMARY KEY,
+                symbol TEXT NOT NULL UNIQUE
+            )
+        ''')
+        self.cursor.execute(f'''
+            CREATE TABLE IF NOT EXISTS {table} (
+                symbol_id INTEGER NOT NULL,
+                day INTEGER NOT NULL,
+                open REAL,
+                high REAL,
+                low REAL,
+                close REAL,
+                adj_close REAL,
+                volume INTEGER,
+                PRIMARY KEY (symbol_id, day)
+            ) WITHOUT ROWID
+        ''')
+
+    def _migrate_to_compact(self):
+        """
+        Überführt 'daily_prices' vom alten in das kompakte Layout (in einer Transaktion)
+        und gibt den frei gewordenen Speicher anschließend per VACUUM zurück.
+        """
+        logger.info("Migriere 'daily_prices' in das kompakte Layout...")
+        started = time.perf_counter()
+        with self.transaction():
+            self._create_compact_tables("daily_prices_compact")
+            self.cursor.execute("""
+                INSERT OR IGNORE INTO symbol_ids (symbol)
+                SELECT DISTINCT symbol FROM daily_prices ORDER BY symbol
+            """)
+            # julianday('1970-01-01') = 2440587.5
+            self.cursor.execute("""
+                INSERT OR IGNORE INTO daily_prices_compact
+                    (symbol_id, day, open, high, low, close, adj_close, volume)
+                SELECT s.id, CAST(julianday(p.date) - 2440587.5 AS INTEGER),
+                       p.open, p.high, p.low, p.close, p.adj_close, p.volume
+                FROM daily_prices p JOIN symbol_ids s ON s.symbol = p.symbol
+                ORDER BY s.id, p.date
+            """)
+            self.cursor.execute("DROP TABLE daily_prices")
+            self.cursor.execute("ALTER TABLE daily_prices_compact RENAME TO daily_prices")
+        self.cursor.execute("VACUUM")
+        logger.info("Migration abgeschlossen (%.1f s).", time.perf_counter() - started)
+
+    def _symbol_id(self, symbol, create=False):
+        """Gibt die interne Symbol-ID im kompakten Layout zurück (legt sie bei create=True an)."""
+        symbol_id = self._symbol_ids.get(symbol)
+        if symbol_id is None:
+            self.cursor.execute("SELECT id FROM symbol_ids WHERE symbol = ?", (symbol,))
+            row = self.cursor.fetchone()
+            if row:
+                symbol_id = row[0]
+            elif create:
+                self.cursor.execute("INSERT INTO symbol_ids (symbol) VALUES (?)", (symbol,))
+                symbol_id = self.cursor.lastrowid
+            else:
+                return None
+            self._symbol_ids[symbol] = symbol_id
+        return symbol_id
+
+    @contextmanager
+    def transaction(self):
+        """Führt alle Schreibvorgänge des Blocks in einer Transaktion aus (commit bei Erfolg, sonst rollback)."""
+        try:
+            with self.conn:
+                yield self.cursor
+        except Exception:
+            # Im zurückgerollten Block angelegte Symbol-IDs existieren nicht mehr
+            self._symbol_ids.clear()
+            raise
+
+    @contextmanager
+    def savepoint(self):
+        """
+        Nimmt die Schreibvorgänge des Blocks in die laufende Transaktion auf (ohne commit); schlägt der
+        Block fehl, werden nur seine Änderungen zurückgerollt.
+        """
+        if not self.conn.in_transaction:
+            # Sonst würde das Freigeben des äußersten Savepoints bereits bestätigen
+            self.conn.execute("BEGIN")
+        self.conn.execute("SAVEPOINT block")
+        try:
+            yield self.cursor
+        except BaseException:
+            self.conn.execute("ROLLBACK TO block")
+            self.conn.execute("RELEASE block")
+            # Im zurückgerollten Block angelegte Symbol-IDs existieren nicht mehr
+            self._symbol_ids.clear()
+            raise
+        self.conn.execute("RELEASE block")
+
+    def commit(self):
+        self.conn.commit()
+
+    def upsert_stocks(self, stocks):
+        """Fügt (Symbol, Firmenname)-Paare hinzu (ohne commit)."""
+        # Ein bereits gespeicherter Firmenname wird nur ergänzt, nicht überschrieben
+        self.cursor.executemany("""
+            INSERT INTO stocks (symbol, company_name) VALUES (?, ?)
+            ON CONFLICT (symbol) DO UPDATE SET company_name = excluded.company_name
+            WHERE COALESCE(stocks.company_name, '') = '' AND excluded.company_name != ''
+        """, [(symbol.upper(), company_name) for symbol, company_name in stocks])
+
+    def stocks(self):
+        """Gibt alle gespeicherten (Symbol, Firmenname)-Paare zurück."""
+        self.cursor.execute("SELECT symbol, COALESCE(company_name, '') FROM stocks")
+        return self.cursor.fetchall()
+
+    def symbols(self):
+        self.cursor.execute("SELECT symbol FROM stocks")
+        return [row[0] for row in self.cursor.fetchall()]
+
+    def has_company_name(self, symbol):
+        self.cursor.execute("SELECT company_name FROM stocks WHERE symbol = ?", (symbol,))
+        row = self.cursor.fetchone()
+        return bool(row and row[0])
+
+    def symbols_with_company_name(self):
+        self.cursor.execute("SELECT symbol FROM stocks WHERE COALESCE(company_name, '') != ''")
+        return {row[0] for row in self.cursor.fetchall()}
+
+    def last_stored_date(self, symbol):
+        """Gibt das letzte gespeicherte Datum eines Symbols zurück (None, falls noch keine Kurse vorhanden)."""
+        if self.layout == "compact":
+            symbol_id = self._symbol_id(symbol)
+            if symbol_id is None:
+                return None
+            self.cursor.execute("SELECT MAX(day) FROM daily_prices WHERE symbol_id = ?", (symbol_id,))
+            row = self.cursor.fetchone()
+            return _day_to_date(row[0]) if row and row[0] is not None else None
+        self.cursor.execute("SELECT MAX(date) FROM daily_prices WHERE symbol = ?", (symbol,))
+        row = self.cursor.fetchone()
+        return date.fromisoformat(row[0]) if row and row[0] else None
+
+    def last_stored_dates(self):
+        """Gibt das letzte gespeicherte Datum aller Symbole als Dictionary zurück."""
+        if self.layout == "compact":
+            self.cursor.execute("""
+                SELECT s.symbol, MAX(p.day) FROM daily_prices p JOIN symbol_ids s ON s.id = p.symbol_id
+                GROUP BY p.symbol_id
+            """)
+            return {symbol: _day_to_date(last) for symbol, last in self.cursor.fetchall()}
+        self.cursor.execute("SELECT symbol, MAX(date) FROM daily_prices GROUP BY symbol")
+        return {symbol: date.fromisoformat(last) for symbol, last in self.cursor.fetchall()}
+
+    @timed("sqlite.insert_history", rows=int)
+    def insert_history(self, symbol, days, columns, replace=False):
+        """
+        Schreibt Kurse (Epochentage und Spalten wie PRICE_FIELDS) in 'daily_prices' (ohne commit).
+        Die NumPy-Werte werden einmalig per tolist() in Python-Objekte umgewandelt (NaN wird von
+        SQLite als NULL gespeichert, ganzzahlige Volumina landen durch die INTEGER-Affinität als
+        Ganzzahl in der Tabelle).
+        """
+        if self.layout == "compact":
+            key, key_column, date_column = self._symbol_id(symbol, create=True), "symbol_id", "day"
+            dates = np.asarray(days, dtype=np.int64).tolist()
+        else:
+            key, key_column, date_column = symbol, "symbol", "date"
+            dates = np.asarray(days, dtype=np.int64).astype('datetime64[D]').astype(str).tolist()
+        values = [np.asarray(columns[field], dtype='float64').tolist() for field in PRICE_FIELDS]
+        data_to_insert = list(zip(repeat(key, len(dates)), dates, *values))
+
+        # INSERT OR IGNORE vermeidet Duplikate, im Reparaturmodus werden vorhandene Zeilen ersetzt
+        conflict = "REPLACE" if replace else "IGNORE"
+        self.cursor.executemany(f"""
+            INSERT OR {conflict} INTO daily_prices ({key_column}, {date_column}, open, high, low, close, adj_close, volume)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        """, data_to_insert)
+        return len(data_to_insert)
+
+    @timed("sqlite.query_history", rows=len)
+    def query_history(self, symbol, start_date=None, end_date=None):
+        """
+        Liest die Kurse eines Symbols per SQL aus 'daily_prices' (optional auf einen Zeitraum begrenzt).
+        Die Zeilen werden als Zahlen (Datum als Epochentag) direkt in ein NumPy-Array übernommen; das hält
+        den GIL deutlich kürzer als pd.read_sql, sodass sich parallele Leser weniger gegenseitig bremsen.
+        """
+        compact = self.layout == "compact"
+        if compact:
+            key, key_column, date_column = self._symbol_id(symbol), "symbol_id", "day"
+            start_date = _date_to_day(start_date) if start_date else None
+            end_date = _date_to_day(end_date) if end_date else None
+        else:
+            key, key_column, date_column = symbol, "symbol", "date"
+        day_expression = "day" if compact else "CAST(julianday(date) - 2440587.5 AS INTEGER)"
+        query = (f"SELECT {day_expression}, open, high, low, close, adj_close, volume FROM daily_prices "
+                 f"WHERE {key_column} = ?")
+        params = [key]
+
+        if start_date is not None and end_date is not None:
+            query += f" AND {date_column} BETWEEN ? AND ?"
+            params.append(start_date)
+            params.append(end_date)
+        elif start_date is not None:
+            query += f" AND {date_column} >= ?"
+            params.append(start_date)
+        elif end_date is not None:
+            query += f" AND {date_column} <= ?"
+            params.append(end_date)
+
+        self.cursor.execute(query + f" ORDER BY {date_column} ASC", params)
+        rows = self.cursor.fetchall()
+        width = len(PRICE_FIELDS) + 1
+        data = np.fromiter(chain.from_iterable(rows), dtype='float64', count=width * len(rows)).reshape(-1, width)
+        return _columns_to_frame(data[:, 0].astype(np.int64),
+                                 {field: data[:, i + 1] for i, field in enumerate(PRICE_FIELDS)})
+
+    @timed("sqlite.load_field", rows=lambda result: len(result[1]))
+    def load_field(self, symbols, start_date=None, end_date=None, field="adj_close", chunk_size=500):
+        """
+        Liest ein Kursfeld mehrerer Symbole mit einer Abfrage je chunk_size Symbole.
+        Gibt (Spaltenposition in symbols, Epochentag, Wert) als NumPy-Arrays zurück; NULL-Werte fehlen.
+        """
+        compact = self.layout == "compact"
+        if compact:
+            key_column, date_column = "symbol_id", "day"
+            keys = [self._symbol_id(symbol) for symbol in symbols]
+            start_date = _date_to_day(start_date) if start_date else None
+            end_date = _date_to_day(end_date) if end_date else None
+        else:
+            key_column, date_column = "symbol", "date"
+            keys = list(symbols)
+        known = [(i, key) for i, key in enumerate(keys) if key is not None]
+        positions = np.array([i for i, _ in known], dtype=np.intp)
+        known_keys = [key for _, key in known]
+
+        # Das Datum wird in beiden Layouts als Epochentag gelesen, NULL-Werte gelten als fehlend
+        day_expression = "day" if compact else "CAST(julianday(date) - 2440587.5 AS INTEGER)"
+        range_filter, range_params = f" AND {field} IS NOT NULL", []
+        if start_date is not None:
+            range_filter += f" AND {date_column} >= ?"
+            range_params.append(start_date)
+        if end_date is not None:
+            range_filter += f" AND {date_column} <= ?"
+            range_params.append(end_date)
+
+        rows = []
+        for i in range(0, len(known_keys), chunk_size):
+            chunk = known_keys[i:i + chunk_size]
+            placeholders = ", ".join("?" * len(chunk))
+            self.cursor.execute(f"""
+                SELECT {key_column}, {day_expression}, {field} FROM daily_prices
+                WHERE {key_column} IN ({placeholders}){range_filter}
+            """, chunk + range_params)
+            rows.extend(self.cursor.fetchall())
+
+        if not rows:
+            return np.array([], dtype=np.intp), np.array([], dtype=np.int64), np.array([], dtype='float64')
+        if compact:
+            # Rein numerische Zeilen: in einem Durchgang in ein (n, 3)-Array umwandeln
+            data = np.fromiter(chain.from_iterable(rows), dtype='float64', count=3 * len(rows)).reshape(-1, 3)
+            row_keys, days, values = data[:, 0].astype(np.int64), data[:, 1].astype(np.int64), data[:, 2]
+        else:
+            data = pd.DataFrame.from_records(rows, columns=['key', 'day', 'value'])
+            row_keys = data['key'].to_numpy()
+            days, values = data['day'].to_numpy(dtype='int64'), data['value'].to_numpy(dtype='float64')
+        return positions[pd.Index(known_keys).get_indexer(row_keys)], days, values
+
+    def _rollup_table(self, resolution):
+        if resolution not in ROLLUP_TABLES:
+            raise ValueError(f"Unbekannte Auflösung: {resolution}")
+        return ROLLUP_TABLES[resolution]
+
+    @timed("sqlite.replace_rollups", rows=int)
+    def replace_rollups(self, symbol, resolution, from_day, days, columns):
+        """
+        Ersetzt die Wochen- bzw. Monatswerte eines Symbols ab dem Epochentag from_day (None: alle)
+        durch days/columns (siehe aggregate_rollup), ohne commit.
+        """
+        table = self._rollup_table(resolution)
+        if from_day is None:
+            self.cursor.execute(f"DELETE FROM {table} WHERE symbol = ?", (symbol,))
+        else:
+            self.cursor.execute(f"DELETE FROM {table} WHERE symbol = ? AND day >= ?", (symbol, int(from_day)))
+        days = np.asarray(days, dtype=np.int64).tolist()
+        values = [np.asarray(columns[field], dtype='float64').tolist() for field in PRICE_FIELDS]
+        self.cursor.executemany(f"""
+            INSERT INTO {table} (symbol, day, open, high, low, close, adj_close, volume)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        """, zip(repeat(symbol), days, *values))
+        return len(days)
+
+    @timed("sqlite.query_rollups", rows=len)
+    def query_rollups(self, symbol, resolution, start_date=None, end_date=None):
+        """Liest Wochen- bzw. Monatswerte eines Symbols (Periode im Zeitraum, falls ihr letzter Handelstag darin liegt)."""
+        query = f"SELECT day, open, high, low, close, adj_close, volume FROM {self._rollup_table(resolution)} WHERE symbol = ?"
+        params = [symbol]
+        if start_date is not None:
+            query += " AND day >= ?"
+            params.append(_date_to_day(start_date))
+        if end_date is not None:
+            query += " AND day <= ?"
+            params.append(_date_to_day(end_date))
+        self.cursor.execute(query + " ORDER BY day", params)
+        rows = self.cursor.fetchall()
+        data = np.array(rows, dtype='float64').reshape(-1, len(PRICE_FIELDS) + 1)
+        return _columns_to_frame(data[:, 0].astype(np.int64),
+                                 {field: data[:, i + 1] for i, field in enumerate(PRICE_FIELDS)})
+
+    def last_rollup_day(self, symbol, resolution):
+        """Letzter Handelstag (Epochentag) der gespeicherten Wochen- bzw. Monatswerte (None, falls keine)."""
+        try:
+            self.cursor.execute(f"SELECT MAX(day) FROM {self._rollup_table(resolution)} WHERE symbol = ?", (symbol,))
+        except sqlite3.OperationalError:
+            # Nur lesend geöffnete Datenbank aus einer älteren Version (ohne Tabelle)
+            return None
+        row = self.cursor.fetchone()
+        return row[0] if row else None
+
+    @timed("sqlite.insert_indicator_values", rows=int)
+    def insert_indicator_values(self, symbol, indicator, days, values):
+        """Speichert eine Indikatorreihe (Epochentage und Werte); vorhandene Tage werden ersetzt (ohne commit)."""
+        days = np.asarray(days, dtype=np.int64).tolist()
+        values = np.asarray(values, dtype='float64').tolist()
+        self.cursor.execute("INSERT OR IGNORE INTO indicator_series (symbol, indicator) VALUES (?, ?)",
+                            (symbol, indicator))
+        self.cursor.executemany("""
+            INSERT OR REPLACE INTO indicator_values (symbol, indicator, day, value) VALUES (?, ?, ?, ?)
+        """, zip(repeat(symbol), repeat(indicator), days, values))
+        return len(days)
+
+    def delete_indicator_values(self, symbol, indicator):
+        """Löscht eine gespeicherte Indikatorreihe vollständig (ohne commit)."""
+        self.cursor.execute("DELETE FROM indicator_values WHERE symbol = ? AND indicator = ?", (symbol, indicator))
+        self.cursor.execute("DELETE FROM indicator_series WHERE symbol = ? AND indicator = ?", (symbol, indicator))
+
+    def indicator_series(self, symbol=None):
+        """Gespeicherte Indikatorreihen als Liste von (Symbol, Schlüssel), optional nur für ein Symbol."""
+        query = "SELECT symbol, indicator FROM indicator_series"
+        try:
+            if symbol is None:
+                self.cursor.execute(query + " ORDER BY symbol, indicator")
+            else:
+                self.cursor.execute(query + " WHERE symbol = ? ORDER BY indicator", (symbol,))
+        except sqlite3.OperationalError:
+            # Nur lesend geöffnete Datenbank aus einer älteren Version (ohne Tabelle)
+            return []
+        return self.cursor.fetchall()
+
+    def last_indicator_day(self, symbol, indicator):
+        """Letzter gespeicherter Tag (Epochentag) einer Indikatorreihe (None, falls keine)."""
+        try:
+            self.cursor.execute("SELECT MAX(day) FROM indicator_values WHERE symbol = ? AND indicator = ?",
+                                (symbol, indicator))
+        except sqlite3.OperationalError:
+            return None
+        row = self.cursor.fetchone()
+        return row[0] if row else None
+
+    def query_indicator_values(self, symbol, indicator, start_date=None, end_date=None):
+        """Liest eine gespeicherte Indikatorreihe als Series (Datumsindex, leer falls nicht vorhanden)."""
+        query = "SELECT day, value FROM indicator_values WHERE symbol = ? AND indicator = ?"
+        params = [symbol, indicator]
+        if start_date is not None:
+            query += " AND day >= ?"
+            params.append(_date_to_day(start_date))
+        if end_date is not None:
+            query += " AND day <= ?"
+            params.append(_date_to_day(end_date))
+        self.cursor.execute(query + " ORDER BY day", params)
+        rows = self.cursor.fetchall()
+        days = np.array([row[0] for row in rows], dtype=np.int64)
+        values = np.array([row[1] for row in rows], dtype='float64')
+        return _indicator_series(days, values, indicator)
+
+    def close(self):
+        """Schließt die Datenbankverbindung."""
+        if self.conn:
+            self.conn.close()
+            self.conn = None
+            logger.info("Datenbankverbindung geschlossen.")
+
+
+class ReaderPool:
+    """
+    Nur lesende Verbindungen zu einer SQLite-Datenbank im WAL-Modus, eine je Thread (höchstens
+    max_readers gleichzeitig lesende Threads). Im WAL-Modus blockieren sich Leser und der Schreiber
+    nicht: Leser lesen parallel, während z.B. ein großer Import schreibt. Ohne GIL läuft dabei nur die
+    Arbeit in SQLite selbst; das Umwandeln der Zeilen in Python-Objekte bleibt serialisiert. Mehr Leser
+    verkürzen daher vor allem Wartezeiten, der Gesamtdurchsatz steigt höchstens mit freien CPU-Kernen.
+
+    snapshot() öffnet eine Lesetransaktion; alle Abfragen darin sehen denselben, bestätigten Stand
+    der Datenbank, auch wenn zwischendurch Schreibvorgänge bestätigt werden.
+    """
+
+    def __init__(self, db_name, pragmas=None, max_readers=None):
+        self.db_name = db_name
+        self.pragmas = pragmas
+        self._slots = threading.BoundedSemaphore(max_readers) if max_readers else None
+        self._local = threading.local()
+        self._readers: list = []
+        self._lock = threading.Lock()
+
+    def _reader(self):
+        reader = getattr(self._local, "reader", None)
+        if reader is None or not reader.is_open:
+            reader = SQLiteBackend(self.db_name, pragmas=self.pragmas, read_only=True)
+            if not reader.is_open:
+                raise sqlite3.OperationalError(f"Datenbank '{self.db_name}' konnte nicht gelesen werden.")
+            self._local.reader, self._local.depth = reader, 0
+            with self._lock:
+                self._readers.append(reader)
+        return reader
+
+    @contextmanager
+    def snapshot(self):
+        """Gibt das nur lesende SQLiteBackend des aktuellen Threads in einer Lesetransaktion zurück (verschachtelbar)."""
+        reader = self._reader()
+        outer = self._local.depth == 0
+        with self._slots if self._slots is not None and outer else nullcontext():
+            if outer:
+                # Der Stand wird mit der ersten Abfrage festgelegt und gilt bis zum Ende des Blocks
+                reader.conn.execute("BEGIN")
+            self._local.depth += 1
+            try:
+                yield reader
+            finally:
+                self._local.depth -= 1
+                if outer:
+                    reader.conn.rollback()
+
+    @property
+    def size(self):
+        """Anzahl geöffneter Leseverbindungen."""
+        with self._lock:
+            return sum(reader.is_open for reader in self._readers)
+
+    def close(self):
+        """Schließt alle Leseverbindungen (nur aufrufen, wenn keine Lesevorgänge mehr laufen)."""
+        with self._lock:
+            readers, self._readers = self._readers, []
+        for reader in readers:
+            reader.close()
+
+
+class WriteQueue:
+    """
+    Serialisiert Schreibvorgänge auf ein Backend in einem eigenen Schreib-Thread.
+
+    submit(fn) reiht fn(storage) ein und gibt ein Future mit dessen Ergebnis zurück. Der Schreib-Thread
+    führt alle bis dahin eingereihten Aufträge (höchstens max_batch) in einer gemeinsamen Transaktion
+    aus, sodass viele gleichzeitige kleine Schreibvorgänge mit einem commit auskommen. Schlägt ein
+    Auftrag fehl, wird der Block zurückgerollt und jeder Auftrag einzeln wiederholt, damit nur der
+    fehlerhafte scheitert. lock (z.B. die Sperre des StockDataManager) wird je Block gehalten.
+    """
+
+    def __init__(self, storage, lock=None, max_batch=256):
+        self.storage = storage
+        self.max_batch = max_batch
+        self._lock = lock if lock is not None else threading.Lock()
+        self._queue: queue.Queue = queue.Queue()
+        self._thread = None
+        self._start_lock = threading.Lock()
+        self.batches = 0
+        self.jobs = 0
+
+    def submit(self, fn):
+        future = Future()
+        with self._start_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="storage-writer", daemon=True)
+                self._thread.start()
+            self._queue.put((fn, future))
+        return future
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            batch = [item]
+            while len(batch) < self.max_batch:
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is None:
+                    # Nach dem Block beenden
+                    self._queue.put(None)
+                    break
+                batch.append(item)
+            self._write(batch)
+
+    def _write(self, batch):
+        batch = [(fn, future) for fn, future in batch if future.set_running_or_notify_cancel()]
+        if not batch:
+            return
+        results = None
+        with self._lock:
+            try:
+                with span("storage.write_batch", rows=len(batch)), self.storage.transaction():
+                    results = [fn(self.storage) for fn, _ in batch]
+            except Exception as e:
+                if len(batch) == 1:
+                    batch[0][1].set_exception(e)
+                else:
+                    logger.debug("Schreibblock fehlgeschlagen, wiederhole %d Aufträge einzeln.", len(batch))
+                    for fn, future in batch:
+                        self._write_one(fn, future)
+            self.batches += 1
+            self.jobs += len(batch)
+        if results is not None:
+            for (_, future), result in zip(batch, results):
+                future.set_result(result)
+
+    def _write_one(self, fn, future):
+        try:
+            with self.storage.transaction():
+                result = fn(self.storage)
+        except Exception as e:
+            future.set_exception(e)
+        else:
+            future.set_result(result)
+
+    def close(self):
+        """Führt alle eingereihten Aufträge aus und beendet den Schreib-Thread."""
+        with self._start_lock:
+            thread, self._thread = self._thread, None
+            if thread is not None:
+                self._queue.put(None)
+        if thread is not None:
+            thread.join()
+
+
+class ColumnarBackend:
+    """
+    Spaltenorientierte Ablage in einem Verzeichnis: je Symbol ein Unterverzeichnis von 'prices' mit
+    einer .npy-Datei je Spalte ('day' als int32-Epochentage, Kursfelder als float64), nach Datum
+    sortiert. Stammdaten liegen in 'stocks.json'.
+
+    Gelesen wird per Memory-Mapping: get_stock_data und Kursmatrizen verwenden die Dateiinhalte
+    ohne Kopie, und Scans über viele Symbole lesen nur die benötigten Spalten.
+    Ein Schreibvorgang ersetzt das Verzeichnis eines Symbols vollständig (neu schreiben, dann
+    umbenennen), sodass Leser nie halb geschriebene Dateien sehen. Unter Windows lassen sich
+    gemappte Dateien nicht ersetzen; dort wird standardmäßig ohne Memory-Mapping gelesen.
+    """
+
+    STOCKS_FILE = "stocks.json"
+    # Kurse: 'prices/<Symbol>/<Feld>.npy'. Ältere Ablagen hatten die Symbolverzeichnisse direkt im
+    # Hauptverzeichnis, wo z.B. 'INDICATORS' auf Dateisystemen ohne Groß-/Kleinschreibung mit
+    # 'indicators' kollidiert; sie werden beim Öffnen verschoben.
+    PRICES_DIR = "prices"
+    # Indikatorreihen: 'indicators/<Symbol>/<Schlüssel>.npy'
+    INDICATORS_DIR = "indicators"
+    # Wochen-/Monatswerte: 'rollups/<Auflösung>/<Symbol>.npy' mit den Feldern 'day' und PRICE_FIELDS
+    ROLLUPS_DIR = "rollups"
+
+    def __init__(self, directory="stock_data_columns", mmap=None, read_only=False):
+        """read_only=True öffnet eine vorhandene Ablage nur lesend (ohne Aufräumen unterbrochener Schreibvorgänge)."""
+        self.directory = Path(directory)
+        self.prices_directory = self.directory / self.PRICES_DIR
+        self.mmap = os.name != "nt" if mmap is None else mmap
+        self.read_only = read_only
+        self._stocks: dict = {}
+        self._stocks_dirty = False
+        self._open = False
+        try:
+            with span("columnar.open"):
+                if read_only:
+                    if not self.directory.is_dir():
+                        raise FileNotFoundError(f"Verzeichnis '{self.directory}' nicht gefunden")
+                    if not self.prices_directory.is_dir():
+                        # Ältere Ablage, die nicht verschoben werden darf
+                        self.prices_directory = self.directory
+                else:
+                    self.prices_directory.mkdir(parents=True, exist_ok=True)
+                    self._upgrade()
+                    self._recover()
+                stocks_path = self.directory / self.STOCKS_FILE
+                if stocks_path.exists():
+                    self._stocks = json.loads(stocks_path.read_text(encoding="utf-8"))
+            self._open = True
+            logger.info("Spaltenablage '%s' geöffnet (%d Symbole).", self.directory, len(self._stocks))
+        except (OSError, ValueError) as e:
+            logger.error("Fehler beim Öffnen der Spaltenablage: %s", e)
+
+    def __repr__(self):
+        return f"ColumnarBackend({str(self.directory)!r})"
+
+    @property
+    def is_open(self):
+        return self._open
+
+    def _check_writable(self):
+        if self.read_only:
+            raise ValueError(f"Spaltenablage '{self.directory}' ist nur lesend geöffnet.")
+
+    def _upgrade(self):
+        """Verschiebt die Symbolverzeichnisse einer älteren Ablage aus dem Hauptverzeichnis nach 'prices'."""
+        internal = (self.PRICES_DIR, self.INDICATORS_DIR, self.ROLLUPS_DIR)
+        moved = [path for path in self.directory.iterdir() if path.is_dir() and path.name not in internal]
+        for path in moved:
+            path.rename(self.prices_directory / path.name)
+        if moved:
+            logger.info("%d Symbolverzeichnisse nach '%s' verschoben.", len(moved), self.prices_directory)
+
+    def _recover(self):
+        """Räumt nach einem Abbruch während eines Schreibvorgangs auf."""
+        for path in self.prices_directory.glob("*.tmp"):
+            shutil.rmtree(path)
+        for path in self.prices_directory.glob("*.old"):
+            target = path.with_suffix("")
+            if target.exists():
+                shutil.rmtree(path)
+            else:
+                path.rename(target)
+
+    def _symbol_path(self, symbol):
+        # Symbole wie 'BRK/B' oder '^GSPC' als gültigen Verzeichnisnamen kodieren
+        return self.prices_directory / quote(symbol, safe="")
+
+    def _read(self, symbol, fields=PRICE_FIELDS):
+        """Gibt Epochentage und die angeforderten Spalten eines Symbols zurück (None, falls keine Kurse)."""
+        path = self._symbol_path(symbol)
+        if not path.exists():
+            return None
+        mmap_mode = "r" if self.mmap else None
+        days = np.load(path / "day.npy", mmap_mode=mmap_mode)
+        return days, {field: np.load(path / f"{field}.npy", mmap_mode=mmap_mode) for field in fields}
+
+    def _write(self, symbol, days, columns):
+        path = self._symbol_path(symbol)
+        tmp, old = path.with_name(path.name + ".tmp"), path.with_name(path.name + ".old")
+        if tmp.exists():
+            shutil.rmtree(tmp)
+        tmp.mkdir()
+        np.save(tmp / "day.npy", np.asarray(days, dtype=np.int32))
+        for field in PRICE_FIELDS:
+            np.save(tmp / f"{field}.npy", np.asarray(columns[field], dtype='float64'))
+        if path.exists():
+            path.rename(old)
+        tmp.rename(path)
+        if old.exists():
+            shutil.rmtree(old)
+
+    @contextmanager
+    def transaction(self):
+        """Kursdaten sind nach jedem insert_history gespeichert; die Stammdaten beim Verlassen des Blocks."""
+        yield self
+        self.commit()
+
+    @contextmanager
+    def savepoint(self):
+        """
+        Wie SQLiteBackend.savepoint; Kurs- und Indikatordateien sind jedoch sofort geschrieben und
+        lassen sich nicht zurückrollen.
+        """
+        yield self
+
+    def commit(self):
+        """Schreibt geänderte Stammdaten nach 'stocks.json'."""
+        if not self._stocks_dirty:
+            return
+        path = self.directory / self.STOCKS_FILE
+        tmp = path.with_name(path.name + ".tmp")
+        tmp.write_text(json.dumps(self._stocks, ensure_ascii=False), encoding="utf-8")
+        os.replace(tmp, path)
+        self._stocks_dirty = False
+
+    def upsert_stocks(self, stocks):
+        """Fügt (Symbol, Firmenname)-Paare hinzu (ohne commit); vorhandene Firmennamen bleiben erhalten."""
+        self._check_writable()
+        for symbol, company_name in stocks:
+            symbol = symbol.upper()
+            if symbol not in self._stocks or (not self._stocks[symbol] and company_name):
+                self._stocks[symbol] = company_name or ""
+                self._stocks_dirty = True
+
+    def stocks(self):
+        return list(self._stocks.items())
+
+    def symbols(self):
+        # Wie bei SQLite (Primärschlüssel-Index) alphabetisch sortiert
+        return sorted(self._stocks)
+
+    def has_company_name(self, symbol):
+        return bool(self._stocks.get(symbol))
+
+    def symbols_with_company_name(self):
+        return {symbol for symbol, company_name in self._stocks.items() if company_name}
+
+    def _price_symbols(self):
+        return [unquote(path.name) for path in self.prices_directory.iterdir()
+                if path.is_dir() and path.suffix not in (".tmp", ".old")
+                and path.name not in (self.PRICES_DIR, self.INDICATORS_DIR, self.ROLLUPS_DIR)]
+
+    def last_stored_date(self, symbol):
+        stored = self._read(symbol, fields=())
+        if stored is None or not len(stored[0]):
+            return None
+        return _day_to_date(stored[0][-1])
+
+    def last_stored_dates(self):
+        return {symbol: last for symbol in self._price_symbols()
+                if (last := self.last_stored_date(symbol)) is not None}
+
+    @timed("columnar.insert_history", rows=int)
+    def insert_history(self, symbol, days, columns, replace=False):
+        """
+        Ergänzt die Kurse eines Symbols und schreibt seine Spalten neu.
+        Wie bei SQLite bleiben vorhandene Tage erhalten, bei replace=True werden sie überschrieben.
+        """
+        self._check_writable()
+        days = np.asarray(days, dtype=np.int64)
+        columns = {field: np.asarray(columns[field], dtype='float64') for field in PRICE_FIELDS}
+        # Doppelte Tage innerhalb der neuen Kurse: wie INSERT OR IGNORE/REPLACE den ersten bzw. letzten behalten
+        if replace:
+            _, last = np.unique(days[::-1], return_index=True)
+            keep = len(days) - 1 - last
+        else:
+            _, keep = np.unique(days, return_index=True)
+        days, columns = days[keep], {field: values[keep] for field, values in columns.items()}
+
+        stored = self._read(symbol)
+        if stored is not None:
+            old_days, old_columns = stored
+            if replace:
+                old_keep = ~np.isin(old_days, days)
+                new_keep = np.ones(len(days), dtype=bool)
+            else:
+                old_keep = np.ones(len(old_days), dtype=bool)
+                new_keep = ~np.isin(days, old_days)
+            days = np.concatenate([np.asarray(old_days, dtype=np.int64)[old_keep], days[new_keep]])
+            columns = {field: np.concatenate([old_columns[field][old_keep], columns[field][new_keep]])
+                       for field in PRICE_FIELDS}
+            order = np.argsort(days, kind="stable")
+            days, columns = days[order], {field: values[order] for field, values in columns.items()}
+        self._write(symbol, days, columns)
+        return len(keep)
+
+    @timed("columnar.query_history", rows=len)
+    def query_history(self, symbol, start_date=None, end_date=None):
+        """Liest die Kurse eines Symbols; die Spalten verweisen ohne Kopie auf die gemappten Dateien."""
+        stored = self._read(symbol)
+        if stored is None:
+            return _columns_to_frame([], {field: np.array([], dtype='float64') for field in PRICE_FIELDS})
+        days, columns = stored
+        first = np.searchsorted(days, _date_to_day(start_date)) if start_date else 0
+        last = np.searchsorted(days, _date_to_day(end_date), side='right') if end_date else len(days)
+        return _columns_to_frame(days[first:last], {field: values[first:last] for field, values in columns.items()})
+
+    @timed("columnar.load_field", rows=lambda result: len(result[1]))
+    def load_field(self, symbols, start_date=None, end_date=None, field="adj_close", chunk_size=None):
+        """
+        Liest ein Kursfeld mehrerer Symbole; je Symbol werden nur 'day' und das Feld gelesen.
+        Gibt (Spaltenposition in symbols, Epochentag, Wert) als NumPy-Arrays zurück; NaN-Werte fehlen.
+        """
+        start = _date_to_day(start_date) if start_date else None
+        end = _date_to_day(end_date) if end_date else None
+        positions, all_days, all_values = [], [], []
+        for position, symbol in enumerate(symbols):
+            stored = self._read(symbol, fields=(field,))
+            if stored is None:
+                continue
+            days, columns = stored
+            first = np.searchsorted(days, start) if start is not None else 0
+            last = np.searchsorted(days, end, side='right') if end is not None else len(days)
+            days, values = days[first:last], columns[field][first:last]
+            valid = ~np.isnan(values)
+            all_days.append(days[valid])
+            all_values.append(values[valid])
+            positions.append(np.full(int(valid.sum()), position, dtype=np.intp))
+        if not positions:
+            return np.array([], dtype=np.intp), np.array([], dtype=np.int64), np.array([], dtype='float64')
+        return np.concatenate(positions), np.concatenate(all_days).astype(np.int64), np.concatenate(all_values)
+
+    def _indicator_path(self, symbol, indicator):
+        return self.directory / self.INDICATORS_DIR / quote(symbol, safe="") / f"{quote(indicator, safe='')}.npy"
+
+    def _read_indicator(self, symbol, indicator):
+        path = self._indicator_path(symbol, indicator)
+        if not path.exists():
+            return None
+        return np.load(path, mmap_mode="r" if self.mmap else None)
+
+    @timed("columnar.insert_indicator_values", rows=int)
+    def insert_indicator_values(self, symbol, indicator, days, values):
+        """
+        Speichert eine Indikatorreihe; vorhandene Tage werden ersetzt. Die Reihe liegt als eine
+        .npy-Datei (Felder 'day' und 'value') vor und wird per Umbenennen atomar ersetzt.
+        """
+        self._check_writable()
+        days = np.asarray(days, dtype=np.int64)
+        values = np.asarray(values, dtype='float64')
+        count = len(days)
+        stored = self._read_indicator(symbol, indicator)
+        if stored is not None:
+            keep = ~np.isin(stored['day'], days)
+            days = np.concatenate([stored['day'][keep].astype(np.int64), days])
+            values = np.concatenate([stored['value'][keep], values])
+        order = np.argsort(days, kind="stable")
+        series = np.empty(len(days), dtype=[('day', '<i4'), ('value', '<f8')])
+        series['day'], series['value'] = days[order], values[order]
+
+        path = self._indicator_path(symbol, indicator)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(path.name + ".tmp")
+        with open(tmp, "wb") as file:
+            np.save(file, series)
+        os.replace(tmp, path)
+        return count
+
+    def query_indicator_values(self, symbol, indicator, start_date=None, end_date=None):
+        """Liest eine gespeicherte Indikatorreihe als Series (Datumsindex, leer falls nicht vorhanden)."""
+        stored = self._read_indicator(symbol, indicator)
+        if stored is None:
+            return _indicator_series([], [], indicator)
+        first = np.searchsorted(stored['day'], _date_to_day(start_date)) if start_date else 0
+        last = np.searchsorted(stored['day'], _date_to_day(end_date), side='right') if end_date else len(stored)
+        return _indicator_series(stored['day'][first:last], np.array(stored['value'][first:last]), indicator)
+
+    def delete_indicator_values(self, symbol, indicator):
+        """Löscht eine gespeicherte Indikatorreihe vollständig."""
+        self._check_writable()
+        path = self._indicator_path(symbol, indicator)
+        if path.exists():
+            path.unlink()
+
+    def indicator_series(self, symbol=None):
+        """Gespeicherte Indikatorreihen als Liste von (Symbol, Schlüssel), optional nur für ein Symbol."""
+        root = self.directory / self.INDICATORS_DIR
+        folders = [root / quote(symbol, safe="")] if symbol is not None else sorted(root.glob("*"))
+        return [(unquote(folder.name), unquote(path.stem))
+                for folder in folders if folder.is_dir() for path in sorted(folder.glob("*.npy"))]
+
+    def last_indicator_day(self, symbol, indicator):
+        stored = self._read_indicator(symbol, indicator)
+        return int(stored['day'][-1]) if stored is not None and len(stored) else None
+
+    def _rollup_path(self, symbol, resolution):
+        if resolution not in ROLLUP_TABLES:
+            raise ValueError(f"Unbekannte Auflösung: {resolution}")
+        return self.directory / self.ROLLUPS_DIR / resolution / f"{quote(symbol, safe='')}.npy"
+
+    def _read_rollups(self, symbol, resolution):
+        path = self._rollup_path(symbol, resolution)
+        if not path.exists():
+            return None
+        return np.load(path, mmap_mode="r" if self.mmap else None)
+
+    @timed("columnar.replace_rollups", rows=int)
+    def replace_rollups(self, symbol, resolution, from_day, days, columns):
+        """
+        Ersetzt die Wochen- bzw. Monatswerte eines Symbols ab dem Epochentag from_day (None: alle).
+        Die Werte liegen als eine .npy-Datei vor, die per Umbenennen atomar ersetzt wird.
+        """
+        self._check_writable()
+        stored = self._read_rollups(symbol, resolution) if from_day is not None else None
+        kept = stored[stored['day'] < from_day] if stored is not None else None
+        count = len(days)
+        rollups = np.empty(count + (len(kept) if kept is not None else 0),
+                           dtype=[('day', '<i4')] + [(field, '<f8') for field in PRICE_FIELDS])
+        if kept is not None:
+            rollups[:len(kept)] = kept
+        rollups['day'][len(rollups) - count:] = days
+        for field in PRICE_FIELDS:
+            rollups[field][len(rollups) - count:] = columns[field]
+
+        path = self._rollup_path(symbol, resolution)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(path.name + ".tmp")
+        with open(tmp, "wb") as file:
+            np.save(file, rollups)
+        os.replace(tmp, path)
+        return count
+
+    @timed("columnar.query_rollups", rows=len)
+    def query_rollups(self, symbol, resolution, start_date=None, end_date=None):
+        """Liest Wochen- bzw. Monatswerte eines Symbols (Periode im Zeitraum, falls ihr letzter Handelstag darin liegt)."""
+        stored = self._read_rollups(symbol, resolution)
+        if stored is None:
+            return _columns_to_frame([], {field: np.array([], dtype='float64') for field in PRICE_FIELDS})
+        first = np.searchsorted(stored['day'], _date_to_day(start_date)) if start_date else 0
+        last = np.searchsorted(stored['day'], _date_to_day(end_date), side='right') if end_date else len(stored)
+        stored = stored[first:last]
+        return _columns_to_frame(stored['day'], {field: np.array(stored[field]) for field in PRICE_FIELDS})
+
+    def last_rollup_day(self, symbol, resolution):
+        stored = self._read_rollups(symbol, resolution)
+        return int(stored['day'][-1]) if stored is not None and len(stored) else None
+
+    def close(self):
+        """Schreibt ausstehende Stammdaten und schließt die Ablage."""
+        if self._open:
+            self.commit()
+            self._open = False
+            logger.info("Spaltenablage '%s' geschlossen.", self.directory)
+
+
+def _epoch_seconds(value, end=False):
+    """
+    Wandelt einen Zeitpunkt (Timestamp, datetime, Zeichenkette oder Sekunden seit 1970) in Sekunden
+    seit 1970-01-01 UTC um; Zeitpunkte ohne Zeitzone gelten als UTC. Mit end=True zählt ein reines
+    Datum ('YYYY-MM-DD' bzw. date) bis zum Ende des Tages.
+    """
+    if isinstance(value, (int, np.integer)):
+        return int(value)
+    whole_day = (isinstance(value, str) and len(value) == 10) or type(value) is date
+    timestamp = pd.Timestamp(value)
+    if timestamp.tz is None:
+        timestamp = timestamp.tz_localize("UTC")
+    seconds = timestamp.value // 1_000_000_000
+    return seconds + 86_399 if end and whole_day else seconds
+
+
+def bars_from_frame(frame):
+    """
+    Zerlegt Intraday-Balken im yfinance-Format (Spalten wie PRICE_COLUMNS, Zeitstempel mit Zeitzone)
+    in Sekunden seit 1970-01-01 UTC und die Spalten von IntradayStore.FIELDS.
+    """
+    index = frame.index if frame.index.tz is not None else frame.index.tz_localize("UTC")
+    ts = index.as_unit("s").asi8.astype(np.int64)
+    columns = {field: frame[field.capitalize()].to_numpy(dtype='float64') for field in IntradayStore.FIELDS}
+    return ts, columns
+
+
+class IntradayStore:
+    """
+    Ablage für Intraday-Balken (siehe INTRADAY_INTERVALS) in einem Verzeichnis, aufgeteilt nach
+    Intervall, Symbol und Kalendermonat (UTC): '<Intervall>/<Symbol>/<JJJJ-MM>.npz'.
+
+    Jede Monatsdatei enthält die Zeitstempel als Sekunden seit 1970-01-01 UTC (als Differenzen
+    gespeichert, komprimiert fast kostenlos), die Kurse open, high, low, close als float32 (oder
+    float64, siehe dtype) und das Volumen als int64, standardmäßig zlib-komprimiert. Ein Balken
+    belegt so etwa 15 Bytes (synthetische 1-Minuten-Balken) statt rund 110 Bytes je Zeile in
+    'daily_prices' (Layout 'legacy', Tabelle und UNIQUE-Index); float32 genügt für Kurse mit etwa
+    sieben signifikanten Stellen.
+    Geschrieben wird je Monat: vorhandene Balken lesen, neue einfügen (gleiche Zeitstempel werden
+    ersetzt), neu schreiben und umbenennen. Leser sehen daher nie halb geschriebene Dateien und
+    brauchen keine Sperre; gleichzeitige Schreibvorgänge auf dasselbe Symbol muss der Aufrufer
+    ausschließen (StockDataManager: Symbolsperre).
+    """
+
+    FIELDS = ("open", "high", "low", "close", "volume")
+
+    def __init__(self, directory, dtype="float32", compress=True):
+        if np.dtype(dtype) not in (np.float32, np.float64):
+            raise ValueError(f"Nicht unterstützter Datentyp für Kurse: {dtype}")
+        self.directory = Path(directory)
+        self.dtype = np.dtype(dtype)
+        self.compress = compress
+
+    def __repr__(self):
+        return f"IntradayStore({str(self.directory)!r}, dtype={self.dtype.name!r})"
+
+    def _symbol_dir(self, symbol, interval):
+        if interval not in INTRADAY_INTERVALS:
+            raise ValueError(f"Unbekanntes Intraday-Intervall: {interval} (möglich: {', '.join(INTRADAY_INTERVALS)})")
+        return self.directory / interval / quote(symbol.upper(), safe="")
+
+    def _months(self, symbol, interval):
+        """Vorhandene Monatsdateien eines Symbols, aufsteigend sortiert."""
+        folder = self._symbol_dir(symbol, interval)
+        return sorted(folder.glob("*.npz")) if folder.is_dir() else []
+
+    def _read(self, path):
+        with np.load(path) as stored:
+            ts = np.cumsum(stored["ts"])
+            return ts, {field: stored[field] for field in self.FIELDS}
+
+    def _write(self, path, ts, columns):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        arrays = {"ts": np.diff(ts, prepend=0)}
+        arrays.update({field: columns[field].astype(self.dtype) for field in self.FIELDS if field != "volume"})
+        arrays["volume"] = np.nan_to_num(columns["volume"]).astype(np.int64)
+        tmp = path.with_name(path.name + ".tmp")
+        with open(tmp, "wb") as file:
+            (np.savez_compressed if self.compress else np.savez)(file, **arrays)
+        os.replace(tmp, path)
+
+    @timed("intraday.insert_bars", rows=int)
+    def insert_bars(self, symbol, interval, ts, columns):
+        """
+        Speichert Balken (ts: Sekunden seit 1970 UTC, columns: Arrays je FIELDS) und ersetzt dabei
+        gespeicherte Balken mit gleichem Zeitstempel. Gibt die Anzahl der übergebenen Balken zurück.
+        """
+        ts = np.asarray(ts, dtype=np.int64)
+        if not len(ts):
+            return 0
+        folder = self._symbol_dir(symbol, interval)
+        months = ts.astype('datetime64[s]').astype('datetime64[M]')
+        for month in np.unique(months):
+            selected = months == month
+            month_ts = ts[selected]
+            month_columns = {field: np.asarray(columns[field])[selected] for field in self.FIELDS}
+            path = folder / f"{month}.npz"
+            if path.exists():
+                stored_ts, stored = self._read(path)
+                month_ts = np.concatenate([stored_ts, month_ts])
+                month_columns = {field: np.concatenate([stored[field].astype('float64'), month_columns[field]])
+                                 for field in self.FIELDS}
+            # Letztes Vorkommen je Zeitstempel behalten (neue Balken stehen hinten), aufsteigend sortiert
+            _, last = np.unique(month_ts[::-1], return_index=True)
+            keep = len(month_ts) - 1 - last
+            self._write(path, month_ts[keep], {field: values[keep] for field, values in month_columns.items()})
+        return len(ts)
+
+    @timed("intraday.query_bars", rows=lambda result: len(result[0]))
+    def query_bars(self, symbol, interval, start=None, end=None):
+        """
+        Liest die Balken eines Symbols im Zeitraum (start/end einschließlich, siehe _epoch_seconds)
+        und gibt (Sekunden seit 1970 UTC, Spalten je FIELDS) als NumPy-Arrays zurück. Gelesen werden
+        nur die Monatsdateien im Zeitraum.
+        """
+        first = _epoch_seconds(start) if start is not None else None
+        last = _epoch_seconds(end, end=True) if end is not None else None
+        first_month = str(np.datetime64(first, 's').astype('datetime64[M]')) if first is not None else None
+        last_month = str(np.datetime64(last, 's').astype('datetime64[M]')) if last is not None else None
+        parts = []
+        for path in self._months(symbol, interval):
+            if (first_month and path.stem < first_month) or (last_month and path.stem > last_month):
+                continue
+            ts, columns = self._read(path)
+            lo = np.searchsorted(ts, first) if first is not None else 0
+            hi = np.searchsorted(ts, last, side='right') if last is not None else len(ts)
+            parts.append((ts[lo:hi], {field: values[lo:hi] for field, values in columns.items()}))
+        if not parts:
+            return np.array([], dtype=np.int64), {field: np.array([], dtype=np.int64 if field == "volume" else self.dtype)
+                                                   for field in self.FIELDS}
+        return (np.concatenate([part[0] for part in parts]),
+                {field: np.concatenate([part[1][field] for part in parts]) for field in self.FIELDS})
+
+    def query_frame(self, symbol, interval, start=None, end=None, tz=None):
+        """Wie query_bars, aber als DataFrame mit Zeitstempel-Index (UTC bzw. in der Zeitzone tz)."""
+        ts, columns = self.query_bars(symbol, interval, start, end)
+        index = pd.DatetimeIndex(ts.astype('datetime64[s]'), name='timestamp').tz_localize("UTC")
+        if tz is not None:
+            index = index.tz_convert(tz)
+        return pd.DataFrame(columns, index=index, copy=False)
+
+    def last_timestamp(self, symbol, interval):
+        """Zeitstempel (Sekunden seit 1970 UTC) des letzten gespeicherten Balkens oder None."""
+        months = self._months(symbol, interval)
+        if not months:
+            return None
+        ts, _ = self._read(months[-1])
+        return int(ts[-1]) if len(ts) else None
+
+    def symbols(self, interval):
+        folder = self.directory / interval
+        if not folder.is_dir():
+            return []
+        return sorted(unquote(path.name) for path in folder.iterdir() if path.is_dir())
+
+    def delete(self, symbol, interval):
+        """Entfernt alle Balken eines Symbols im Intervall."""
+        shutil.rmtree(self._symbol_dir(symbol, interval), ignore_errors=True)
+
+    def size_bytes(self, symbol=None, interval=None):
+        """Belegter Speicher der Monatsdateien (optional nur eines Symbols bzw. Intervalls) in Bytes."""
+        intervals = [interval] if interval else INTRADAY_INTERVALS
+        total = 0
+        for name in intervals:
+            pattern = f"{quote(symbol.upper(), safe='')}/*.npz" if symbol else "*/*.npz"
+            total += sum(path.stat().st_size for path in (self.directory / name).glob(pattern))
+        return total
+
+
+def open_storage(path, **kwargs):
+    """Öffnet ein Backend anhand des Pfads: ein Verzeichnis (ohne '.db') als Spaltenablage, sonst SQLite."""
+    path = Path(path)
+    if path.is_dir() or (not path.exists() and path.suffix != ".db"):
+        return ColumnarBackend(path, **kwargs)
+    return SQLiteBackend(str(path), **kwargs)
+
+
+def migrate_to_compact(db_name):
+    """
+    Überführt eine SQLite-Datenbank im alten Layout ausdrücklich in das kompakte Layout und legt
+    vorher eine Sicherung '<db_name>.bak' an. Gibt deren Pfad zurück (None, falls die Datenbank
+    bereits kompakt ist).
+    """
+    storage = SQLiteBackend(db_name, layout=None)
+    if not storage.is_open:
+        raise RuntimeError(f"Datenbank '{db_name}' konnte nicht geöffnet werden.")
+    try:
+        if storage.layout == "compact":
+            logger.info("'%s' ist bereits kompakt.", db_name)
+            return None
+        backup_path = f"{db_name}.bak"
+        backup = sqlite3.connect(backup_path)
+        try:
+            # Online-Sicherung: auch Änderungen, die erst im WAL stehen, sind enthalten
+            storage.conn.backup(backup)
+        finally:
+            backup.close()
+        logger.info("Sicherung in '%s' angelegt.", backup_path)
+    finally:
+        storage.close()
+    SQLiteBackend(db_name, layout="compact").close()
+    return backup_path
+
+
+def convert_storage(source, target, symbols=None, commit_rows=100_000, progress=None):
+    """
+    Kopiert Stammdaten und Kurse von einem Backend in ein anderes (z.B. SQLite -> Spaltenablage).
+    Vorhandene Kurse im Ziel werden überschrieben. progress(erledigt, gesamt, symbol) wird nach
+    jedem Symbol aufgerufen. Gibt die Anzahl der kopierten Zeilen zurück.
+    """
+    stocks = source.stocks()
+    symbols = [symbol for symbol, _ in stocks] if symbols is None else [symbol.upper() for symbol in symbols]
+    wanted = set(symbols)
+    started = time.perf_counter()
+    rows = pending_rows = 0
+    with target.transaction():
+        target.upsert_stocks([(symbol, name) for symbol, name in stocks if symbol in wanted])
+    for done, symbol in enumerate(symbols, start=1):
+        frame = source.query_history(symbol)
+        if not frame.empty:
+            days, columns = frame_to_columns(frame)
+            count = target.insert_history(symbol, days, columns, replace=True)
+            rows += count
+            pending_rows += count
+        if pending_rows >= commit_rows:
+            target.commit()
+            pending_rows = 0
+        if progress:
+            progress(done, len(symbols), symbol)
+    target.commit()
+    logger.info("%d Symbole und %d Zeilen von %r nach %r kopiert (%.1f s).",
+                len(symbols), rows, source, target, time.perf_counter() - started)
+    return rows
+
+
+if __name__ == "__main__":
+    import sys
+
+    if len(sys.argv) != 3:
+        print("Aufruf: python storage_backends.py QUELLE ZIEL\n"
+              "  z.B. python storage_backends.py stock_analysis.db stock_analysis_columns\n"
+              "       python storage_backends.py --compact DATENBANK  (in das kompakte Layout umwandeln)")
+        sys.exit(1)
+    configure_logging("INFO")
+    if sys.argv[1] == "--compact":
+        migrate_to_compact(sys.argv[2])
+        sys.exit(0)
+    source_backend, target_backend = open_storage(sys.argv[1]), open_storage(sys.argv[2])
+    convert_storage(source_backend, target_backend)
+    source_backend.close()
+    target_backend.close()
@@ -0,0 +1,277 @@
+from collections import deque
+import math
+
+import pandas as pd
+
+from financial_tools import TRADING_DAYS_PER_YEAR, FinancialTools
+
+
+class StreamingIndicator:
+    """
+    Basisklasse für Indikatoren, die Kurs für Kurs aktualisiert werden.
+    Der Zustand umfasst höchstens ein Fenster an Werten; update() kostet O(1).
+    Optional wird das Datum des letzten Kurses mitgeführt, damit bereits verarbeitete
+    Kurse (z.B. nach dem Laden eines gespeicherten Zustands) übersprungen werden.
+    """
+
+    def __init__(self, window):
+        if window < 2:
+            raise ValueError("Das Fenster muss mindestens 2 Werte umfassen.")
+        self.window = window
+        self.last_date = None
+        self.value = math.nan
+
+    def _is_new(self, date):
+        if date is None:
+            return True
+        date = pd.Timestamp(date)
+        if self.last_date is not None and date <= self.last_date:
+            return False
+        self.last_date = date
+        return True
+
+    def update_many(self, values, dates=None):
+        """Verarbeitet mehrere neue Kurse nacheinander und gibt den aktuellen Indikatorwert zurück."""
+        dates = [None] * len(values) if dates is None else dates
+        for value, date in zip(values, dates):
+            self.update(value, date=date)
+        return self.value
+
+    def to_dict(self):
+        """Gibt den Zustand als JSON-serialisierbares Dictionary zurück."""
+        return {
+            "type": type(self).__name__,
+            "window": self.window,
+            "last_date": self.last_date.isoformat() if self.last_date is not None else None,
+            **self._state(),
+        }
+
+    @classmethod
+    def from_dict(cls, state):
+        """Stellt einen mit to_dict() gespeicherten Zustand wieder her."""
+        indicator_cls = STREAMING_INDICATORS[state["type"]]
+        if cls is not StreamingIndicator and indicator_cls is not cls:
+            raise ValueError(f"Zustand gehört zu {state['type']}, nicht zu {cls.__name__}.")
+        indicator = indicator_cls(state["window"])
+        indicator.last_date = pd.Timestamp(state["last_date"]) if state["last_date"] else None
+        indicator._restore(state)
+        return indicator
+
+
+class StreamingMovingAverage(StreamingIndicator):
+    """Gleitender Durchschnitt; entspricht FinancialTools.calculate_moving_average."""
+
+    def __init__(self, window=20):
+        super().__init__(window)
+        self._prices = deque(maxlen=window)
+        self._sum = 0.0
+        self._updates = 0
+
+    @classmethod
+    def from_history(cls, prices, window=20):
+        """Initialisiert den Indikator aus einer Kurshistorie (Series oder Kurs-DataFrame)."""
+        indicator = cls(window)
+        prices = FinancialTools._price_series(prices).dropna()
+        indicator.update_many(prices.iloc[-window:].tolist())
+        if not prices.empty:
+            indicator.last_date = pd.Timestamp(prices.index[-1])
+        return indicator
+
+    def update(self, price, date=None):
+        if not self._is_new(date) or math.isnan(price):
+            return self.value
+        if len(self._prices) == self.window:
+            self._sum -= self._prices[0]
+        self._prices.append(price)
+        self._sum += price
+        self._updates += 1
+        if self._updates % self.window == 0:
+            # Rundungsfehler der laufenden Summe regelmäßig verwerfen
+            self._sum = math.fsum(self._prices)
+        self.value = self._sum / self.window if len(self._prices) == self.window else math.nan
+        return self.value
+
+    def _state(self):
+        return {"prices": list(self._prices)}
+
+    def _restore(self, state):
+        self.update_many(state["prices"])
+
+
+class _RollingMoments:
+    """Rollierender Mittelwert und (Ko-)Momente nach Welford, mit Entfernen des ältesten Werts."""
+
+    def __init__(self):
+        self.count = 0
+        self.mean_x = 0.0
+        self.mean_y = 0.0
+        self.m2_y = 0.0   # Summe der quadrierten Abweichungen von y
+        self.c_xy = 0.0   # Summe der Abweichungsprodukte von x und y
+
+    def add(self, x, y):
+        self.count += 1
+        dx = x - self.mean_x
+        dy = y - self.mean_y
+        self.mean_x += dx / self.count
+        self.mean_y += dy / self.count
+        self.m2_y += dy * (y - self.mean_y)
+        self.c_xy += dx * (y - self.mean_y)
+
+    def rebuild(self, pairs):
+        """Berechnet die Momente neu aus den Werten im Fenster (verwirft aufgelaufene Rundungsfehler)."""
+        self.__init__()
+        for x, y in pairs:
+            self.add(x, y)
+
+    def remove(self, x, y):
+        if self.count == 1:
+            self.__init__()
+            return
+        self.count -= 1
+        dx = x - self.mean_x
+        dy = y - self.mean_y
+        self.mean_x -= dx / self.count
+        self.mean_y -= dy / self.count
+        self.m2_y -= dy * (y - self.mean_y)
+        self.c_xy -= dx * (y - self.mean_y)
+
+
+class StreamingVolatility(StreamingIndicator):
+    """
+    Annualisierte rollierende Volatilität; entspricht FinancialTools.calculate_volatility.
+    periods_per_year: Kurse je Jahr (Tageskurse: 252; für Intraday-Balken siehe bars_per_year).
+    """
+
+    def __init__(self, window=20, periods_per_year=TRADING_DAYS_PER_YEAR):
+        super().__init__(window)
+        self.periods_per_year = periods_per_year
+        self._returns = deque(maxlen=window)
+        self._moments = _RollingMoments()
+        self._last_price = None
+        self._updates = 0
+
+    @classmethod
+    def from_history(cls, prices, window=20, periods_per_year=TRADING_DAYS_PER_YEAR):
+        """Initialisiert den Indikator aus einer Kurshistorie (Series oder Kurs-DataFrame)."""
+        indicator = cls(window, periods_per_year)
+        prices = FinancialTools._price_series(prices).dropna()
+        indicator.update_many(prices.iloc[-(window + 1):].tolist())
+        if not prices.empty:
+            indicator.last_date = pd.Timestamp(prices.index[-1])
+        return indicator
+
+    def update(self, price, date=None):
+        if not self._is_new(date) or math.isnan(price):
+            return self.value
+        if self._last_price is not None:
+            self._add_return(price / self._last_price - 1)
+        self._last_price = price
+        return self.value
+
+    def _add_return(self, value):
+        if len(self._returns) == self.window:
+            oldest = self._returns[0]
+            self._moments.remove(oldest, oldest)
+        self._returns.append(value)
+        self._moments.add(value, value)
+        self._updates += 1
+        if self._updates % self.window == 0:
+            self._moments.rebuild((r, r) for r in self._returns)
+        if len(self._returns) == self.window:
+            variance = max(self._moments.m2_y, 0.0) / (self.window - 1)
+            self.value = math.sqrt(variance) * math.sqrt(self.periods_per_year)
+        else:
+            self.value = math.nan
+
+    def _state(self):
+        return {"returns": list(self._returns), "last_price": self._last_price,
+                "periods_per_year": self.periods_per_year}
+
+    def _restore(self, state):
+        # Ältere Zustände enthalten noch keine periods_per_year (Tageskurse)
+        self.periods_per_year = state.get("periods_per_year", TRADING_DAYS_PER_YEAR)
+        for value in state["returns"]:
+            self._add_return(value)
+        self._last_price = state["last_price"]
+
+
+class StreamingBeta(StreamingIndicator):
+    """
+    Rollierendes Beta gegenüber einem Marktindex; entspricht FinancialTools.calculate_beta.
+    update() erwartet je Kurstag ein Paar (Aktienkurs, Marktkurs). Fehlt einer der Kurse (NaN),
+    geht der Tag wie in der Batch-Berechnung nicht in das Fenster ein.
+    """
+
+    def __init__(self, window=60):
+        super().__init__(window)
+        self._pairs = deque(maxlen=window)
+        self._moments = _RollingMoments()
+        self._last_stock = None
+        self._last_market = None
+        self._updates = 0
+
+    @classmethod
+    def from_history(cls, stock_prices, market_prices, window=60):
+        """Initialisiert den Indikator aus den Kurshistorien von Aktie und Markt."""
+        indicator = cls(window)
+        stock_prices = FinancialTools._price_series(stock_prices).dropna()
+        market_prices = FinancialTools._price_series(market_prices).dropna()
+        returns = pd.concat([
+            FinancialTools.calculate_returns(stock_prices, in_percent=False).rename('stock'),
+            FinancialTools.calculate_returns(market_prices, in_percent=False).rename('market'),
+        ], axis=1, sort=True).dropna()
+        for stock_return, market_return in returns.iloc[-window:].itertuples(index=False):
+            indicator._add_pair(stock_return, market_return)
+        if not stock_prices.empty:
+            indicator._last_stock = float(stock_prices.iloc[-1])
+        if not market_prices.empty:
+            indicator._last_market = float(market_prices.iloc[-1])
+        dates = stock_prices.index.union(market_prices.index)
+        if len(dates):
+            indicator.last_date = pd.Timestamp(dates[-1])
+        return indicator
+
+    def update(self, prices, date=None):
+        stock_price, market_price = prices
+        if not self._is_new(date):
+            return self.value
+        stock_return = market_return = None
+        if not math.isnan(stock_price):
+            if self._last_stock is not None:
+                stock_return = stock_price / self._last_stock - 1
+            self._last_stock = stock_price
+        if not math.isnan(market_price):
+            if self._last_market is not None:
+                market_return = market_price / self._last_market - 1
+            self._last_market = market_price
+        if stock_return is not None and market_return is not None:
+            self._add_pair(stock_return, market_return)
+        return self.value
+
+    def _add_pair(self, stock_return, market_return):
+        if len(self._pairs) == self.window:
+            self._moments.remove(*self._pairs[0])
+        self._pairs.append((stock_return, market_return))
+        self._moments.add(stock_return, market_return)
+        self._updates += 1
+        if self._updates % self.window == 0:
+            self._moments.rebuild(self._pairs)
+        if len(self._pairs) == self.window and self._moments.m2_y > 0:
+            self.value = self._moments.c_xy / self._moments.m2_y
+        else:
+            self.value = math.nan
+
+    def _state(self):
+        return {"pairs": [list(pair) for pair in self._pairs],
+                "last_stock": self._last_stock, "last_market": self._last_market}
+
+    def _restore(self, state):
+        for stock_return, market_return in state["pairs"]:
+            self._add_pair(stock_return, market_return)
+        self._last_stock = state["last_stock"]
+        self._last_market = state["last_market"]
+
+
+STREAMING_INDICATORS = {
+    cls.__name__: cls for cls in (StreamingMovingAverage, StreamingVolatility, StreamingBeta)
+}
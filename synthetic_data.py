@@ -0,0 +1,203 @@
+from datetime import date
+from functools import lru_cache
+import threading
+import time
+import zlib
+
+import numpy as np
+import pandas as pd
+
+from data_sources import INTRADAY_INTERVALS, PRICE_COLUMNS, FrameDataSource, RateLimitError, TokenBucket
+from financial_tools import TRADING_DAYS_PER_YEAR
+from stock_data_manager import BulkFetchReport
+
+
+# Fester Endzeitpunkt, damit die Daten unabhängig vom Ausführungstag identisch sind
+DEFAULT_END = "2024-12-31"
+
+
+def synthetic_symbols(count):
+    """Gibt count eindeutige Symbolnamen zurück ('SYN00000', 'SYN00001', ...)."""
+    return [f"SYN{i:05d}" for i in range(count)]
+
+
+@lru_cache(maxsize=8)
+def _business_days(end, periods):
+    # Der Kalender ist für alle Symbole gleich; bdate_range mit Zeitzone ist vergleichsweise teuer
+    return pd.bdate_range(end=end, periods=periods, tz="America/New_York", name="Date")
+
+
+def synthetic_history(symbol, years=10, end=DEFAULT_END, seed=0):
+    """
+    Erzeugt eine deterministische Kurshistorie im yfinance-Format (Spalten wie PRICE_COLUMNS).
+
+    Die Kurse folgen einer geometrischen Brownschen Bewegung mit je Symbol zufälliger Drift und
+    Volatilität sowie seltenen Crash-Tagen. Dazu kommen:
+    - spätere Börsengänge (etwa jedes fünfte Symbol beginnt erst innerhalb des Zeitraums),
+    - einzelne fehlende Handelstage (Handelsaussetzungen),
+    - Aktiensplits: 'Close', 'Open', 'High', 'Low' und 'Volume' sind unbereinigt und springen am
+      Split-Tag, 'Adj Close' ist durchgehend bereinigt.
+    Gleiche Argumente liefern immer identische Daten.
+    """
+    rng = np.random.default_rng([seed, zlib.crc32(symbol.upper().encode())])
+    dates = _business_days(end, int(years * TRADING_DAYS_PER_YEAR))
+    if rng.random() < 0.2:
+        dates = dates[rng.integers(0, len(dates) // 2):]
+    dates = dates[rng.random(len(dates)) >= 0.002]
+    n = len(dates)
+
+    drift = rng.normal(0.06, 0.04)
+    sigma = rng.uniform(0.15, 0.6)
+    dt = 1 / TRADING_DAYS_PER_YEAR
+    log_returns = rng.normal((drift - 0.5 * sigma ** 2) * dt, sigma * np.sqrt(dt), n)
+    crashes = rng.random(n) < 0.001
+    log_returns[crashes] -= rng.uniform(0.1, 0.3, crashes.sum())
+    adjusted = rng.uniform(10, 500) * np.exp(np.cumsum(log_returns))
+
+    # Vor einem Split notiert die Aktie um das Split-Verhältnis höher (bei entsprechend weniger Volumen)
+    ratios = np.where(rng.random(n) < 0.03 / TRADING_DAYS_PER_YEAR, rng.choice([2.0, 3.0, 4.0], n), 1.0)
+    later_splits = np.append(np.cumprod(ratios[::-1])[::-1][1:], 1.0)
+    close = adjusted * later_splits
+
+    open_ = np.append(close[0], close[:-1] * (ratios[1:] ** -1)) * np.exp(rng.normal(0, sigma * 0.1 * np.sqrt(dt), n))
+    high = np.maximum(open_, close) * (1 + np.abs(rng.normal(0, sigma * 0.3 * np.sqrt(dt), n)))
+    low = np.minimum(open_, close) * (1 - np.abs(rng.normal(0, sigma * 0.3 * np.sqrt(dt), n)))
+    volume = np.round(rng.lognormal(13, 0.5, n) * (1 + np.abs(log_returns) / (sigma * np.sqrt(dt))) / later_splits)
+
+    return pd.DataFrame(
+        dict(zip(PRICE_COLUMNS, (open_, high, low, close, adjusted, volume))),
+        index=dates,
+    )
+
+
+def synthetic_intraday(symbol, interval="5m", days=60, end=DEFAULT_END, seed=0):
+    """
+    Erzeugt deterministische Intraday-Balken im yfinance-Format für die letzten days Handelstage
+    bis end: je Tag die Balken der regulären Handelszeit (9:30 bis 16:00 New York, siehe
+    INTRADAY_INTERVALS) mit Zeitzone, Kurse als geometrische Brownsche Bewegung mit Übernacht-Lücken.
+    """
+    bars = INTRADAY_INTERVALS[interval]
+    minutes = int(interval[:-1]) * (60 if interval.endswith("h") else 1)
+    rng = np.random.default_rng([seed, zlib.crc32(f"{symbol.upper()}/{interval}".encode())])
+    sessions = pd.bdate_range(end=end, periods=days)
+    offsets = pd.to_timedelta(570 + minutes * np.arange(bars), unit="min")  # 9:30 Uhr
+    local = (sessions.values[:, None] + offsets.values[None, :]).ravel()
+    index = pd.DatetimeIndex(local).tz_localize("America/New_York").rename("Datetime")
+    n = len(index)
+
+    sigma = rng.uniform(0.15, 0.6) * np.sqrt(minutes / (390 * TRADING_DAYS_PER_YEAR))
+    log_returns = rng.normal(0, sigma, n)
+    log_returns[::bars] += rng.normal(0, sigma * 5, days)  # Übernacht-Lücke am Tagesanfang
+    close = rng.uniform(10, 500) * np.exp(np.cumsum(log_returns))
+    open_ = np.append(close[0], close[:-1])
+    high = np.maximum(open_, close) * (1 + np.abs(rng.normal(0, sigma * 0.3, n)))
+    low = np.minimum(open_, close) * (1 - np.abs(rng.normal(0, sigma * 0.3, n)))
+    volume = np.round(rng.lognormal(13, 0.5, n) / bars)
+    return pd.DataFrame(dict(zip(PRICE_COLUMNS, (open_, high, low, close, close, volume))), index=index)
+
+
+class SyntheticDataSource(FrameDataSource):
+    """
+    Offline-Datenquelle mit synthetischen Kursen (siehe synthetic_history) für Benchmarks und Tests.
+    Die Historien werden erst beim Abruf erzeugt und nicht im Speicher gehalten.
+    Intraday-Balken (siehe synthetic_intraday) reichen intraday_days Handelstage bis intraday_end
+    (Standard: heute, damit die Grenzen von Yahoo wie bei yfinance greifen) zurück.
+    """
+
+    def __init__(self, symbols, years=10, end=DEFAULT_END, seed=0, intraday_days=60, intraday_end=None):
+        super().__init__({})
+        self.universe = {symbol.upper() for symbol in symbols}
+        self.years = years
+        self.end = end
+        self.seed = seed
+        self.intraday_days = intraday_days
+        self.intraday_end = intraday_end
+
+    def _frame(self, symbol):
+        if symbol.upper() not in self.universe:
+            return None
+        return synthetic_history(symbol, self.years, self.end, self.seed)
+
+    def _intraday_frame(self, symbol, interval):
+        if symbol.upper() not in self.universe:
+            return None
+        end = self.intraday_end or date.today().isoformat()
+        return synthetic_intraday(symbol, interval, self.intraday_days, end, self.seed)
+
+    def info(self, symbol):
+        return {"longName": f"Synthetic {symbol.upper()}"} if symbol.upper() in self.universe else {}
+
+
+class SimulatedRemoteSource:
+    """
+    Lokaler Ersatz für einen entfernten Kursdienst vor einer Datenquelle source (z.B. SyntheticDataSource),
+    um ScheduledDataSource und die Abrufe des StockDataManager ohne Netzwerk zu prüfen:
+
+    - jede Anfrage dauert latency Sekunden (info: info_latency, Standard ebenfalls latency),
+    - mehr als rate Anfragen pro Sekunde (kurzzeitig burst) lehnt der Dienst mit RateLimitError ab,
+    - mit Wahrscheinlichkeit error_rate schlägt eine Anfrage mit ConnectionError fehl.
+
+    Mitgezählt werden Anfragen je Symbol, Ablehnungen, Fehler und die höchste Zahl gleichzeitiger Anfragen.
+    """
+
+    def __init__(self, source, latency=0.05, rate=None, burst=5, error_rate=0.0, info_latency=None, seed=0):
+        self.source = source
+        self.latency = latency
+        self.info_latency = latency if info_latency is None else info_latency
+        self.bucket = TokenBucket(rate, burst) if rate else None
+        self.error_rate = error_rate
+        self._rng = np.random.default_rng(seed)
+        self._lock = threading.Lock()
+        self._active = 0
+        self.calls = {"history": {}, "info": {}}
+        self.rejected = 0
+        self.errors = 0
+        self.max_concurrent = 0
+
+    def _request(self, kind, symbol, latency):
+        with self._lock:
+            self.calls[kind][symbol.upper()] = self.calls[kind].get(symbol.upper(), 0) + 1
+            if self.bucket is not None and not self.bucket.try_acquire():
+                self.rejected += 1
+                raise RateLimitError(f"Too Many Requests ({symbol})")
+            failed = self._rng.random() < self.error_rate
+            self._active += 1
+            self.max_concurrent = max(self.max_concurrent, self._active)
+        try:
+            time.sleep(latency)
+            if failed:
+                with self._lock:
+                    self.errors += 1
+                raise ConnectionError(f"Verbindung abgebrochen ({symbol})")
+        finally:
+            with self._lock:
+                self._active -= 1
+
+    def history(self, symbol, period=None, start=None, end=None, interval="1d"):
+        self._request("history", symbol, self.latency)
+        return self.source.history(symbol, period=period, start=start, end=end, interval=interval)
+
+    def info(self, symbol):
+        self._request("info", symbol, self.info_latency)
+        return self.source.info(symbol)
+
+
+def populate(manager, symbols, batch_size=500, max_workers=8, progress=None):
+    """
+    Speichert die Historien der Symbole über manager.fetch_and_store_many (dessen data_source
+    die Symbole liefern muss, z.B. eine SyntheticDataSource). Gearbeitet wird in Blöcken von
+    batch_size Symbolen, damit auch sehr große Universen nicht vollständig im Speicher liegen.
+    Gibt einen zusammengefassten BulkFetchReport zurück.
+    """
+    symbols = list(symbols)
+    total = BulkFetchReport()
+    for first in range(0, len(symbols), batch_size):
+        report = manager.fetch_and_store_many(symbols[first:first + batch_size], period="max",
+                                              max_workers=max_workers)
+        total.succeeded.extend(report.succeeded)
+        total.failed.update(report.failed)
+        total.rows += report.rows
+        total.elapsed += report.elapsed
+        if progress:
+            progress(min(first + batch_size, len(symbols)), len(symbols))
+    return total
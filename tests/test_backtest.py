@@ -0,0 +1,78 @@
+"""sweep_prices muss je Kombination einem einfachen Backtest mit pandas entsprechen."""
+import numpy as np
+import pandas as pd
+import pytest
+
+from backtest import METRICS, SweepGrid, run_sweep, sweep_prices
+from financial_tools import TRADING_DAYS_PER_YEAR
+from stock_data_manager import StockDataManager
+from synthetic_data import SyntheticDataSource, populate, synthetic_history, synthetic_symbols
+
+
+GRID = SweepGrid(fast_windows=(5, 20), slow_windows=(20, 60), vol_thresholds=(0.3, 0.6, np.inf))
+
+
+def naive_backtest(prices, fast, slow, threshold, grid):
+    """Eine Kombination Tag für Tag: Signal am Schlusskurs, Position ab dem Folgetag."""
+    prices = prices.dropna().reset_index(drop=True)
+    daily = prices.pct_change()
+    signal = prices.rolling(fast).mean() > prices.rolling(slow).mean()
+    volatility = daily.rolling(grid.vol_window).std() * np.sqrt(TRADING_DAYS_PER_YEAR)
+    if np.isfinite(threshold):
+        signal &= volatility <= threshold
+    position = signal.astype('float64').iloc[grid.warmup():-1].to_numpy()
+    strategy = position * daily.iloc[grid.warmup() + 1:].to_numpy()
+    years = len(strategy) / TRADING_DAYS_PER_YEAR
+    equity = np.cumprod(1 + strategy)
+    peak = np.maximum(np.maximum.accumulate(equity), 1.0)
+    changes = np.count_nonzero(np.diff(position)) + position[0]
+    return {"annual_return": equity[-1] ** (1 / years) - 1,
+            "volatility": strategy.std(ddof=1) * np.sqrt(TRADING_DAYS_PER_YEAR),
+            "max_drawdown": (1 - equity / peak).max(),
+            "turnover": changes / years}
+
+
+@pytest.mark.parametrize("symbol", synthetic_symbols(3))
+def test_sweep_matches_naive_backtest(symbol):
+    prices = synthetic_history(symbol, years=2)["Adj Close"]
+    result = sweep_prices(prices, GRID, combo_chunk=1)
+    for v, threshold in enumerate(GRID.vol_thresholds):
+        for f, fast in enumerate(GRID.fast_windows):
+            for s, slow in enumerate(GRID.slow_windows):
+                if fast >= slow:
+                    assert all(np.isnan(result[metric][v, f, s]) for metric in METRICS)
+                    continue
+                expected = naive_backtest(prices, fast, slow, threshold, GRID)
+                for metric in METRICS:
+                    np.testing.assert_allclose(result[metric][v, f, s], expected[metric], rtol=1e-9, atol=1e-12,
+                                               err_msg=f"{metric} {fast}/{slow}/{threshold}")
+
+
+def test_sweep_needs_enough_prices():
+    prices = synthetic_history("SYN00000", years=2)["Adj Close"]
+    assert sweep_prices(prices.iloc[:GRID.warmup() + 2], GRID) is None
+    # Fehlende Kurse werden übersprungen statt als Lücke in den Durchschnitten zu stehen
+    gaps = pd.concat([prices.iloc[:100], pd.Series(np.nan, index=prices.index[100:110]), prices.iloc[110:]])
+    for metric, values in sweep_prices(gaps, GRID).items():
+        np.testing.assert_array_equal(values, sweep_prices(gaps.dropna(), GRID)[metric])
+
+
+def test_run_sweep_over_stored_prices(tmp_path):
+    symbols = synthetic_symbols(4)
+    path = str(tmp_path / "stocks.db")
+    manager = StockDataManager(path, data_source=SyntheticDataSource(symbols, years=2))
+    populate(manager, symbols)
+    expected = {symbol: sweep_prices(manager.get_stock_data(symbol)["adj_close"], GRID) for symbol in symbols}
+    manager.close()
+
+    table, results, failed = run_sweep(path, symbols + ["MISSING"], GRID, workers=1, rank_by="annual_return")
+    assert set(results) == set(symbols)
+    assert set(failed) == {"MISSING"}
+    for symbol in symbols:
+        for metric in METRICS:
+            np.testing.assert_array_equal(results[symbol][metric], expected[symbol][metric])
+    # Nur Kombinationen mit fast < slow, die beste zuerst
+    assert len(table) == len(GRID.vol_thresholds) * 3
+    assert (table["fast"] < table["slow"]).all()
+    assert table["annual_return"].is_monotonic_decreasing
+    assert (table["symbols"] == len(symbols)).all()
@@ -0,0 +1,82 @@
+"""Tests für batch_analytics: nur gespeicherte Indikatoren gelangen mit --to-db in die Datenbank."""
+import pytest
+
+import batch_analytics
+from financial_tools import IndicatorSpec
+from stock_data_manager import PERSISTED_INDICATORS, StockDataManager
+from storage_backends import SQLiteBackend
+from synthetic_data import SyntheticDataSource, populate, synthetic_symbols
+
+
+SYMBOLS = synthetic_symbols(3) + ["SPY"]
+
+
+@pytest.fixture(scope="module")
+def database(tmp_path_factory):
+    path = str(tmp_path_factory.mktemp("batch") / "stocks.db")
+    manager = StockDataManager(path, data_source=SyntheticDataSource(SYMBOLS, years=2))
+    populate(manager, SYMBOLS)
+    manager.close()
+    return path
+
+
+def stored_keys(path):
+    storage = SQLiteBackend(path, read_only=True)
+    try:
+        return {key for _, key in storage.indicator_series()}
+    finally:
+        storage.close()
+
+
+def test_to_db_rejects_non_persisted_indicators(database):
+    with pytest.raises(SystemExit) as exit_info:
+        batch_analytics.main(["--db", database, "--to-db", "--indicators", "returns", "ma:20"])
+    assert exit_info.value.code == 2
+    assert "returns" not in stored_keys(database)
+
+
+def test_to_db_default_indicators_are_persisted(database):
+    assert batch_analytics.main(["--db", database, "--to-db", "--workers", "1"]) == 0
+    keys = stored_keys(database)
+    assert keys == {"ma_20", "volatility_20", "beta_SPY_60"}
+    assert all(IndicatorSpec.from_key(key).name in PERSISTED_INDICATORS for key in keys)
+
+
+def test_storage_sink_rejects_non_persisted_indicators(database):
+    with pytest.raises(ValueError):
+        batch_analytics.StorageSink(database, [IndicatorSpec("ma", 20), IndicatorSpec("cumulative_returns")])
+
+
+def test_file_output_keeps_all_indicators(database, tmp_path):
+    output = tmp_path / "indikatoren.csv"
+    assert batch_analytics.main(["--db", database, "--output", str(output), "--workers", "1",
+                                 "--indicators", "returns", "ma:20"]) == 0
+    header = output.read_text(encoding="utf-8").splitlines()[0]
+    assert header == "symbol,date,returns,ma_20"
+
+
+@pytest.fixture(scope="module")
+def database_without_market(tmp_path_factory):
+    path = str(tmp_path_factory.mktemp("batch") / "ohne_markt.db")
+    symbols = synthetic_symbols(2)
+    manager = StockDataManager(path, data_source=SyntheticDataSource(symbols, years=1))
+    populate(manager, symbols)
+    manager.close()
+    return path
+
+
+def test_default_indicators_skip_beta_without_market_data(database_without_market, tmp_path, caplog):
+    output = tmp_path / "indikatoren.csv"
+    assert batch_analytics.main(["--db", database_without_market, "--output", str(output),
+                                 "--workers", "1"]) == 0
+    header = output.read_text(encoding="utf-8").splitlines()[0]
+    assert header == "symbol,date,returns,ma_20,volatility_20"
+    assert any(record.levelname == "WARNING" and "SPY" in record.getMessage() for record in caplog.records)
+
+
+def test_requested_beta_without_market_data_fails(database_without_market, tmp_path):
+    with pytest.raises(SystemExit) as exit_info:
+        batch_analytics.main(["--db", database_without_market, "--output", str(tmp_path / "beta.csv"),
+                              "--indicators", "beta:60", "--market", "QQQ"])
+    assert exit_info.value.code == 2
+    assert not (tmp_path / "beta.csv").exists()
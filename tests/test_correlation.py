@@ -0,0 +1,87 @@
+"""CorrelationEngine muss DataFrame.cov/corr über die Tagesrenditen der gespeicherten Kurse entsprechen."""
+import os
+
+import numpy as np
+import pytest
+
+from correlation import CorrelationEngine
+from financial_tools import FinancialTools
+from stock_data_manager import StockDataManager
+from synthetic_data import SyntheticDataSource, populate, synthetic_symbols
+
+
+# Mehr Symbole als die kleinste Kachel (16), damit auch die gespiegelten Kacheln geprüft werden
+SYMBOLS = synthetic_symbols(20)
+
+
+@pytest.fixture(scope="module")
+def manager(tmp_path_factory):
+    manager = StockDataManager(str(tmp_path_factory.mktemp("correlation") / "stocks.db"),
+                               data_source=SyntheticDataSource(SYMBOLS, years=2))
+    populate(manager, SYMBOLS)
+    yield manager
+    manager.close()
+
+
+@pytest.fixture(scope="module")
+def returns(manager):
+    returns = FinancialTools.calculate_returns_panel(manager.get_price_matrix(SYMBOLS), in_percent=False)
+    return returns[returns.notna().any(axis=1)]
+
+
+def assert_frame_matches(result, expected):
+    assert list(result.index) == list(expected.index)
+    assert list(result.columns) == list(expected.columns)
+    np.testing.assert_allclose(result.to_numpy(), expected.to_numpy(), rtol=1e-9, atol=1e-12)
+
+
+def test_matrices_match_pandas(manager, returns):
+    engine = CorrelationEngine(manager)
+    stats = engine.statistics(SYMBOLS)
+    try:
+        # Späte Börsengänge und fehlende Tage: die Paare haben unterschiedlich viele gemeinsame Tage
+        assert len(np.unique(stats.count)) > 1
+        assert_frame_matches(engine.covariance(stats), returns.cov(min_periods=20))
+        assert_frame_matches(engine.correlation(stats), returns.corr(min_periods=20))
+    finally:
+        stats.close()
+
+
+def test_spilled_matrices_match_pandas(manager, returns, tmp_path):
+    engine = CorrelationEngine(manager, memory_bytes=16 * 1024, workers=2, directory=str(tmp_path))
+    stats = engine.statistics(SYMBOLS)
+    assert isinstance(stats.count, np.memmap)
+    assert_frame_matches(engine.correlation(stats), returns.corr(min_periods=20))
+    stats.close()
+    assert os.listdir(tmp_path) == []
+
+
+@pytest.mark.parametrize("window", [None, 120])
+def test_update_matches_full_statistics(manager, returns, window):
+    engine = CorrelationEngine(manager)
+    end = returns.index[-1].date().isoformat()
+    stats = engine.statistics(SYMBOLS, end_date=returns.index[-40].date().isoformat(), window=window)
+    try:
+        assert engine.update(stats, end_date=end) == 39
+        assert stats.last_date == returns.index[-1]
+        expected = returns.iloc[-window:] if window else returns
+        assert len(stats.dates) == len(expected)
+        assert_frame_matches(engine.covariance(stats), expected.cov(min_periods=20))
+        assert engine.update(stats, end_date=end) == 0
+    finally:
+        stats.close()
+
+
+def test_fixed_shrinkage_scales_off_diagonal(manager):
+    engine = CorrelationEngine(manager)
+    stats = engine.statistics(SYMBOLS)
+    try:
+        plain = engine.correlation(stats).to_numpy()
+        shrunk = engine.correlation(stats, shrinkage=0.25).to_numpy()
+        off_diagonal = ~np.eye(len(SYMBOLS), dtype=bool)
+        np.testing.assert_allclose(shrunk[off_diagonal], 0.75 * plain[off_diagonal])
+        np.testing.assert_array_equal(np.diag(shrunk), np.diag(plain))
+        with pytest.raises(ValueError):
+            engine.correlation(stats, shrinkage=1.5)
+    finally:
+        stats.close()
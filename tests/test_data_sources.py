@@ -0,0 +1,227 @@
+"""Tests für ScheduledDataSource und MetadataCache, offline über SimulatedRemoteSource."""
+import threading
+
+import pytest
+
+from data_sources import (DEFAULT_MAX_REQUESTS, DEFAULT_REQUEST_RATE, MetadataCache, RateLimitError,
+                          ScheduledDataSource, is_transient)
+from stock_data_manager import StockDataManager
+from synthetic_data import SimulatedRemoteSource, SyntheticDataSource, synthetic_symbols
+
+
+SYMBOLS = synthetic_symbols(8)
+
+
+@pytest.fixture
+def synthetic():
+    return SyntheticDataSource(SYMBOLS, years=2)
+
+
+def scheduled(remote, **kwargs):
+    """ScheduledDataSource mit kurzen Wartezeiten, damit die Tests schnell bleiben."""
+    options = dict(rate=1000.0, burst=1000, backoff=0.01, max_backoff=0.05)
+    options.update(kwargs)
+    return ScheduledDataSource(remote, **options)
+
+
+def run_parallel(fn, args):
+    """Ruft fn gleichzeitig für alle args in eigenen Threads auf; gibt die Ergebnisse zurück."""
+    results = [None] * len(args)
+    errors = []
+    barrier = threading.Barrier(len(args))
+
+    def worker(i, arg):
+        barrier.wait()
+        try:
+            results[i] = fn(arg)
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=worker, args=(i, arg)) for i, arg in enumerate(args)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert not errors
+    return results
+
+
+class FailingSource:
+    """Quelle, die für jede Anfrage den Fehler error wirft."""
+
+    def __init__(self, error):
+        self.error = error
+        self.calls = 0
+
+    def history(self, symbol, period=None, start=None, end=None, interval="1d"):
+        self.calls += 1
+        raise self.error
+
+
+def test_is_transient():
+    assert is_transient(RateLimitError("Too Many Requests"))
+    assert is_transient(ConnectionError("reset"))
+    assert is_transient(TimeoutError())
+    assert not is_transient(ValueError("ungültiges Symbol"))
+    assert not is_transient(KeyError("Close"))
+
+
+def test_transient_errors_are_retried(synthetic):
+    remote = SimulatedRemoteSource(synthetic, latency=0.001, error_rate=0.5, seed=1)
+    source = scheduled(remote, retries=20)
+    for symbol in SYMBOLS:
+        assert not source.history(symbol, period="1y").empty
+    stats = source.stats()
+    assert remote.errors > 0
+    assert stats["retries"] == remote.errors
+    assert stats["requests"] == len(SYMBOLS) + remote.errors
+
+
+def test_rate_limit_rejections_are_retried(synthetic):
+    remote = SimulatedRemoteSource(synthetic, latency=0.001, rate=50.0, burst=2)
+    source = scheduled(remote, retries=20)
+    for symbol in SYMBOLS:
+        assert not source.history(symbol, period="1y").empty
+    assert remote.rejected > 0
+    assert source.stats()["retries"] == remote.rejected
+
+
+def test_token_bucket_avoids_rejections(synthetic):
+    remote = SimulatedRemoteSource(synthetic, latency=0.001, rate=50.0, burst=2)
+    source = scheduled(remote, rate=25.0, burst=2)
+    for symbol in SYMBOLS:
+        source.history(symbol, period="1y")
+    assert remote.rejected == 0
+    assert source.stats()["retries"] == 0
+
+
+def test_non_transient_errors_are_not_retried():
+    failing = FailingSource(ValueError("ungültiges Symbol"))
+    source = scheduled(failing, retries=5)
+    with pytest.raises(ValueError):
+        source.history("AAA", period="1y")
+    assert failing.calls == 1
+    assert source.stats()["retries"] == 0
+
+
+def test_retries_are_limited():
+    failing = FailingSource(ConnectionError("reset"))
+    source = scheduled(failing, retries=3)
+    with pytest.raises(ConnectionError):
+        source.history("AAA", period="1y")
+    assert failing.calls == 4
+    assert source.stats()["retries"] == 3
+
+
+def test_concurrency_is_limited(synthetic):
+    remote = SimulatedRemoteSource(synthetic, latency=0.02)
+    source = scheduled(remote, max_concurrency=2)
+    run_parallel(lambda symbol: source.history(symbol, period="1y"), SYMBOLS)
+    assert 1 <= remote.max_concurrent <= 2
+    assert sum(remote.calls["history"].values()) == len(SYMBOLS)
+
+
+def test_limits_are_restored(synthetic):
+    source = ScheduledDataSource(SimulatedRemoteSource(synthetic, latency=0.001))
+    with source.limits(rate=100.0, max_concurrency=16):
+        assert source.bucket.rate == 100.0
+        assert source.max_concurrency == 16
+    assert source.bucket.rate == DEFAULT_REQUEST_RATE
+    assert source.max_concurrency == DEFAULT_MAX_REQUESTS
+    with pytest.raises(ValueError):
+        source.configure(max_concurrency=0)
+
+
+def test_identical_requests_are_coalesced(synthetic):
+    remote = SimulatedRemoteSource(synthetic, latency=0.2)
+    source = scheduled(remote)
+    results = run_parallel(lambda symbol: source.history(symbol, period="1y"), [SYMBOLS[0]] * 5)
+    assert remote.calls["history"] == {SYMBOLS[0]: 1}
+    assert source.stats()["coalesced"] == 4
+    assert all(result is results[0] for result in results)
+
+
+def test_different_requests_are_not_coalesced(synthetic):
+    remote = SimulatedRemoteSource(synthetic, latency=0.05)
+    source = scheduled(remote)
+    run_parallel(lambda period: source.history(SYMBOLS[0], period=period), ["1y", "6mo"])
+    assert remote.calls["history"] == {SYMBOLS[0]: 2}
+    assert source.stats()["coalesced"] == 0
+
+
+def test_info_uses_metadata_cache(synthetic):
+    remote = SimulatedRemoteSource(synthetic, latency=0.001)
+    source = scheduled(remote)
+    assert source.info(SYMBOLS[0])["longName"] == f"Synthetic {SYMBOLS[0]}"
+    assert source.info(SYMBOLS[0].lower())["longName"] == f"Synthetic {SYMBOLS[0]}"
+    assert remote.calls["info"] == {SYMBOLS[0]: 1}
+    assert source.stats()["cache_hits"] == 1
+
+
+def test_metadata_cache_expires():
+    now = [1000.0]
+    cache = MetadataCache(ttl=60, clock=lambda: now[0])
+    cache.put("aaa", {"longName": "A Corp"})
+    now[0] += 59
+    assert cache.get("AAA") == {"longName": "A Corp"}
+    now[0] += 2
+    assert cache.get("AAA") is None
+
+
+def test_metadata_cache_survives_restart(tmp_path):
+    path = tmp_path / "stocks.metadata.json"
+    now = [1000.0]
+    cache = MetadataCache(path, ttl=60, flush_interval=3600, clock=lambda: now[0])
+    cache.put("AAA", {"longName": "A Corp"})
+    assert not path.exists()
+    cache.flush()
+
+    reloaded = MetadataCache(path, ttl=60, clock=lambda: now[0])
+    assert reloaded.get("AAA") == {"longName": "A Corp"}
+    # Die Ablaufzeit zählt ab dem ursprünglichen Abruf, nicht ab dem Neustart
+    now[0] += 61
+    assert MetadataCache(path, ttl=60, clock=lambda: now[0]).get("AAA") is None
+
+
+def test_scheduled_source_flushes_metadata_on_close(tmp_path, synthetic):
+    path = tmp_path / "stocks.metadata.json"
+    source = scheduled(SimulatedRemoteSource(synthetic, latency=0.001),
+                       metadata=MetadataCache(path, flush_interval=3600))
+    source.info(SYMBOLS[0])
+    source.close()
+
+    remote = SimulatedRemoteSource(synthetic, latency=0.001)
+    restarted = scheduled(remote, metadata=MetadataCache(path))
+    assert restarted.info(SYMBOLS[0])["longName"] == f"Synthetic {SYMBOLS[0]}"
+    assert remote.calls["info"] == {}
+
+
+def test_concurrent_fetches_store_no_duplicates(tmp_path, synthetic):
+    remote = SimulatedRemoteSource(synthetic, latency=0.05)
+    manager = StockDataManager(str(tmp_path / "stocks.db"), data_source=scheduled(remote))
+    try:
+        assert all(run_parallel(lambda symbol: manager.fetch_and_store_data(symbol, period="1y"),
+                                [SYMBOLS[0]] * 4))
+        stored = manager.get_stock_data(SYMBOLS[0])
+        expected = synthetic.history(SYMBOLS[0], period="1y")
+        assert len(stored) == len(expected)
+        assert stored.index.is_unique
+    finally:
+        manager.close()
+
+
+def test_bulk_import_throughput_with_default_limits():
+    # Wie ein erster Import einer Watchlist über yfinance: je Symbol Kurse und Stammdaten, 0,2 s je Anfrage
+    symbols = synthetic_symbols(100)
+    remote = SimulatedRemoteSource(SyntheticDataSource(symbols, years=1), latency=0.2)
+    manager = StockDataManager(":memory:", data_source=ScheduledDataSource(remote))
+    try:
+        report = manager.fetch_and_store_many(symbols, max_workers=8)
+    finally:
+        manager.close()
+    assert len(report.succeeded) == len(symbols)
+    assert sum(remote.calls["info"].values()) == len(symbols)
+    # Der Import nutzt alle max_workers Threads, statt auf die Grenze des Schedulers zu warten
+    assert remote.max_concurrent == 8
+    # 500 Symbole in höchstens einer Minute
+    assert report.symbols_per_second >= 500 / 60
@@ -0,0 +1,74 @@
+"""Die Panel-Kernels von FinancialTools müssen je Spalte den Einzelfunktionen entsprechen."""
+import numpy as np
+import pandas as pd
+import pytest
+
+from financial_tools import FinancialTools
+from synthetic_data import synthetic_history, synthetic_symbols
+
+
+@pytest.fixture(scope="module")
+def panel():
+    """Adj-Close-Panel mit späten Börsengängen, Lücken und einer sehr kurzen Historie."""
+    symbols = synthetic_symbols(6)
+    prices = pd.DataFrame({symbol: synthetic_history(symbol, years=3)["Adj Close"] for symbol in symbols})
+    rng = np.random.default_rng(0)
+    prices = prices.mask(rng.random(prices.shape) < 0.02)
+    prices.iloc[:-40, -1] = np.nan  # kürzer als die meisten Fenster
+    prices.iloc[:, -2] = np.nan     # ohne einen einzigen Kurs
+    return prices
+
+
+@pytest.fixture(scope="module")
+def market(panel):
+    market = synthetic_history("SPY", years=3)["Adj Close"].reindex(panel.index)
+    return market.mask(np.random.default_rng(1).random(len(market)) < 0.02)
+
+
+def assert_matches_single(result, panel, single):
+    """
+    Vergleicht jede Spalte mit single(gültige Kurse der Spalte), ausgerichtet auf den Panel-Index.
+    Die Panel-Kernels rechnen über kumulierte Summen; bei fast gleichen Renditen (kleine Fenster)
+    weichen sie daher absolut um Rundungsfehler ab.
+    """
+    assert result.shape == panel.shape
+    for symbol in panel.columns:
+        expected = single(panel[symbol].dropna())
+        expected = expected.reindex(panel.index) if len(expected) else pd.Series(np.nan, index=panel.index)
+        np.testing.assert_allclose(result[symbol].to_numpy(), expected.to_numpy(dtype='float64'),
+                                   rtol=1e-9, atol=1e-9, err_msg=symbol)
+
+
+@pytest.mark.parametrize("in_percent", [True, False])
+def test_returns_panel(panel, in_percent):
+    assert_matches_single(FinancialTools.calculate_returns_panel(panel, in_percent=in_percent), panel,
+                          lambda prices: FinancialTools.calculate_returns(prices, in_percent=in_percent))
+
+
+def test_cumulative_returns_panel(panel):
+    assert_matches_single(FinancialTools.calculate_cumulative_returns_panel(panel), panel,
+                          FinancialTools.calculate_cumulative_returns)
+
+
+@pytest.mark.parametrize("window", [2, 20, 60])
+def test_moving_average_panel(panel, window):
+    assert_matches_single(FinancialTools.calculate_moving_average_panel(panel, window), panel,
+                          lambda prices: FinancialTools.calculate_moving_average(prices, window))
+
+
+@pytest.mark.parametrize("window", [2, 20, 60])
+def test_volatility_panel(panel, window):
+    assert_matches_single(FinancialTools.calculate_volatility_panel(panel, window, periods_per_year=52), panel,
+                          lambda prices: FinancialTools.calculate_volatility(prices, window, periods_per_year=52))
+
+
+@pytest.mark.parametrize("window", [20, 60])
+def test_beta_panel(panel, market, window):
+    assert_matches_single(FinancialTools.calculate_beta_panel(panel, market, window), panel,
+                          lambda prices: FinancialTools.calculate_beta(prices, market, window))
+
+
+def test_beta_panel_with_market_frame(panel, market):
+    frame = pd.DataFrame({"adj_close": market})
+    pd.testing.assert_frame_equal(FinancialTools.calculate_beta_panel(panel, frame, 60),
+                                  FinancialTools.calculate_beta_panel(panel, market, 60))
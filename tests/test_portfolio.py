@@ -0,0 +1,103 @@
+"""PortfolioEngine muss einer Bewertung Tag für Tag über die Lots entsprechen."""
+import numpy as np
+import pandas as pd
+import pytest
+
+from portfolio import UNKNOWN_SECTOR, PortfolioEngine, load_holdings
+from stock_data_manager import StockDataManager
+from synthetic_data import SyntheticDataSource, populate, synthetic_symbols
+
+
+SYMBOLS = synthetic_symbols(3)
+
+
+@pytest.fixture(scope="module")
+def manager(tmp_path_factory):
+    manager = StockDataManager(str(tmp_path_factory.mktemp("portfolio") / "stocks.db"),
+                               data_source=SyntheticDataSource(SYMBOLS, years=2))
+    populate(manager, SYMBOLS)
+    yield manager
+    manager.close()
+
+
+@pytest.fixture
+def holdings():
+    """Mehrere Lots je Symbol, Käufe am Wochenende, vor dem Zeitraum und nach dessen Ende."""
+    return pd.DataFrame({
+        'Symbol': [SYMBOLS[0], SYMBOLS[1], SYMBOLS[0].lower(), SYMBOLS[2], SYMBOLS[1]],
+        'Branche': ["Technologie", "Energie", "Technologie", None, "Energie"],
+        'Anzahl_Aktien': [10, 5, 7, 20, 3],
+        'Kaufpreis_pro_Aktie': [100.0, 50.0, 120.0, 30.0, 55.0],
+        'Kaufdatum': ["2020-01-02", "2023-06-03", "2024-02-15", "2024-05-20", "2030-01-01"],
+    })
+
+
+def naive_valuation(manager, holdings, start_date=None, end_date=None):
+    """Stück, Marktwert, Einstandswert und Portfoliorendite je Tag mit einer Schleife über die Tage."""
+    lots = load_holdings(holdings)
+    close = manager.get_price_matrix(SYMBOLS, start_date, end_date, field="close").ffill()
+    adjusted = manager.get_price_matrix(SYMBOLS, start_date, end_date, field="adj_close").ffill()
+    quantities, costs = [], []
+    for day in close.index:
+        bought = lots[lots['Kaufdatum'] <= day]
+        quantities.append(bought.groupby('Symbol')['Anzahl_Aktien'].sum().reindex(SYMBOLS, fill_value=0))
+        cost = bought['Anzahl_Aktien'] * bought['Kaufpreis_pro_Aktie']
+        costs.append(cost.groupby(bought['Symbol']).sum().reindex(SYMBOLS, fill_value=0))
+    quantities = pd.DataFrame(quantities, index=close.index)
+    values = quantities * close.fillna(0)
+    returns = {}
+    for previous, day in zip(close.index[:-1], close.index[1:]):
+        if values.loc[previous].sum() > 0:
+            asset_returns = (adjusted.loc[day] / adjusted.loc[previous] - 1).fillna(0)
+            returns[day] = (values.loc[previous] * asset_returns).sum() / values.loc[previous].sum()
+    return quantities, values, pd.DataFrame(costs, index=close.index), pd.Series(returns, dtype='float64')
+
+
+def test_load_holdings_cleans_types(holdings):
+    lots = load_holdings(holdings)
+    assert lots['Symbol'].tolist()[2] == SYMBOLS[0]
+    assert lots['Branche'].tolist()[3] == UNKNOWN_SECTOR
+    assert lots['Kaufdatum'].dtype.kind == "M"
+
+
+def test_load_holdings_rejects_invalid_rows(holdings):
+    with pytest.raises(ValueError, match="Kaufdatum"):
+        load_holdings(holdings.drop(columns="Kaufdatum"))
+    with pytest.raises(ValueError, match="Zeile"):
+        load_holdings(holdings.assign(Anzahl_Aktien=[10, "viele", 7, 20, 3]))
+
+
+@pytest.mark.parametrize("start_date, end_date", [(None, None), ("2024-01-01", "2024-09-30")])
+def test_value_matches_naive_valuation(manager, holdings, start_date, end_date):
+    valuation = PortfolioEngine(manager).value(holdings, start_date, end_date)
+    quantities, values, costs, returns = naive_valuation(manager, holdings, start_date, end_date)
+    assert valuation.symbols == SYMBOLS
+    np.testing.assert_allclose(valuation.quantities, quantities.to_numpy())
+    np.testing.assert_allclose(valuation.market_values, values.to_numpy(), rtol=1e-12)
+    np.testing.assert_allclose(valuation.cost_basis, costs.to_numpy(), rtol=1e-12)
+    assert list(valuation.daily_returns.index) == list(returns.index)
+    np.testing.assert_allclose(valuation.daily_returns.to_numpy(), returns.to_numpy(), rtol=1e-9, atol=1e-15)
+    np.testing.assert_allclose(valuation.unrealized_pnl.to_numpy(), (values - costs).sum(axis=1).to_numpy(),
+                               rtol=1e-9)
+
+
+def test_weights_and_sector_exposure(manager, holdings):
+    valuation = PortfolioEngine(manager).value(holdings)
+    invested = valuation.total_value > 0
+    np.testing.assert_allclose(valuation.weights()[invested].sum(axis=1), 1.0)
+    exposure = valuation.sector_exposure()
+    assert list(exposure.columns) == ["Energie", "Technologie", UNKNOWN_SECTOR]
+    np.testing.assert_allclose(exposure[invested].sum(axis=1), 1.0)
+    absolute = valuation.sector_exposure(relative=False)
+    np.testing.assert_allclose(absolute.sum(axis=1), valuation.total_value)
+
+    positions = valuation.positions()
+    assert positions['Anzahl_Aktien'].to_dict() == {SYMBOLS[0]: 17, SYMBOLS[1]: 5, SYMBOLS[2]: 20}
+    assert positions['Gewicht'].sum() == pytest.approx(1.0)
+
+
+def test_symbols_without_prices_are_reported(manager, holdings):
+    holdings.loc[len(holdings)] = ["NOPRICE", "Energie", 1, 10.0, "2024-01-02"]
+    valuation = PortfolioEngine(manager).value(holdings)
+    assert valuation.missing_prices == ["NOPRICE"]
+    assert (valuation.market_values[:, valuation.symbols.index("NOPRICE")] == 0).all()
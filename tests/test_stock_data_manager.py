@@ -0,0 +1,245 @@
+"""Offline-Tests für das inkrementelle Laden von StockDataManager über FrameDataSource."""
+import numpy as np
+import pandas as pd
+import pytest
+
+from data_sources import FrameDataSource
+from financial_tools import FinancialTools, IndicatorSpec
+from stock_data_manager import StockDataManager
+from storage_backends import ColumnarBackend, SQLiteBackend
+
+
+def price_frame(start="2022-01-03", end="2024-12-31", seed=0):
+    """Kurshistorie im yfinance-Format mit Werktagen von start bis end."""
+    dates = pd.bdate_range(start, end, name="Date")
+    close = 100 * np.exp(np.cumsum(np.random.default_rng(seed).normal(0, 0.01, len(dates))))
+    return pd.DataFrame({"Open": close, "High": close * 1.01, "Low": close * 0.99, "Close": close,
+                         "Adj Close": close * 0.98, "Volume": 1000.0}, index=dates)
+
+
+@pytest.fixture
+def full():
+    return price_frame()
+
+
+@pytest.fixture
+def market():
+    return price_frame(seed=1)
+
+
+@pytest.fixture
+def source(full, market):
+    # Bis zum 20.12.2024 bekannt; die restlichen Tage kommen im Test hinzu
+    return FrameDataSource({"AAA": full[:"2024-12-20"], "SPY": market[:"2024-12-20"]},
+                           {"AAA": {"longName": "A Corp"}, "SPY": {"longName": "Market"}})
+
+
+@pytest.fixture
+def manager(source):
+    manager = StockDataManager(":memory:", data_source=source)
+    yield manager
+    manager.close()
+
+
+def test_first_fetch_backfills_period(manager, source):
+    assert manager.fetch_and_store_data("AAA", period="1y")
+    assert source.history_calls == [("AAA", "1y", None, None)]
+    stored = manager.get_stock_data("AAA")
+    expected = source.history("AAA", period="1y")
+    assert len(stored) == len(expected)
+    assert stored.index[0] == expected.index[0]
+    assert stored.index[-1] == pd.Timestamp("2024-12-20")
+    assert manager.get_all_symbols() == ["AAA"]
+
+
+def test_second_fetch_requests_only_new_days(manager, source, full):
+    manager.fetch_and_store_data("AAA", period="1y")
+    rows = len(manager.get_stock_data("AAA"))
+
+    source.frames["AAA"] = full
+    assert manager.fetch_and_store_data("AAA", period="1y")
+    assert source.history_calls[-1] == ("AAA", None, "2024-12-21", None)
+    stored = manager.get_stock_data("AAA")
+    assert len(stored) == rows + len(full["2024-12-21":])
+    assert stored.index[-1] == pd.Timestamp("2024-12-31")
+    assert stored.index.is_unique
+    np.testing.assert_allclose(stored["adj_close"].to_numpy()[-7:], full["Adj Close"].to_numpy()[-7:])
+
+
+def test_fetch_without_new_days_keeps_data(manager, source):
+    manager.fetch_and_store_data("AAA", period="1y")
+    rows = len(manager.get_stock_data("AAA"))
+    assert manager.fetch_and_store_data("AAA", period="1y")
+    assert source.history_calls[-1] == ("AAA", None, "2024-12-21", None)
+    assert len(manager.get_stock_data("AAA")) == rows
+
+
+def test_repair_replaces_adjusted_prices(manager, source, full):
+    manager.fetch_and_store_data("AAA", period="1y")
+    rows = len(manager.get_stock_data("AAA"))
+
+    # Nachträgliche Bereinigung (z.B. Dividende): alle Adj-Close-Werte ändern sich
+    adjusted = full[:"2024-12-20"].copy()
+    adjusted["Adj Close"] *= 0.5
+    source.frames["AAA"] = adjusted
+    assert manager.fetch_and_store_data("AAA", period="1y", repair=True)
+    assert source.history_calls[-1] == ("AAA", "1y", None, None)
+    stored = manager.get_stock_data("AAA")
+    assert len(stored) == rows
+    expected = adjusted.loc[stored.index[0]:, "Adj Close"]
+    np.testing.assert_allclose(stored["adj_close"].to_numpy(), expected.to_numpy())
+
+
+MA = IndicatorSpec("ma", 20)
+VOLATILITY = IndicatorSpec("volatility", 20)
+BETA = IndicatorSpec("beta", 60, "SPY")
+
+
+def expected_indicator(manager, spec):
+    """Indikator über die gesamte gespeicherte Historie, wie ihn FinancialTools berechnet."""
+    prices = manager.get_stock_data("AAA")
+    if spec.name == "ma":
+        return FinancialTools.calculate_moving_average(prices, spec.window)
+    if spec.name == "volatility":
+        return FinancialTools.calculate_volatility(prices, spec.window).reindex(prices.index)
+    return FinancialTools.calculate_beta(prices, manager.get_stock_data("SPY"), spec.window).reindex(prices.index)
+
+
+def assert_indicator(manager, spec):
+    stored = manager.get_indicator("AAA", spec)
+    expected = expected_indicator(manager, spec)
+    assert stored.index.equals(expected.index)
+    np.testing.assert_allclose(stored.to_numpy(), expected.to_numpy(), rtol=1e-9, atol=1e-12)
+
+
+def indicator_computations(manager, monkeypatch):
+    """Zeichnet die Aufrufe von _indicator_from auf: (Schlüssel, first_day) je Berechnung."""
+    calls = []
+    compute = manager._indicator_from
+
+    def recording(symbol, spec, first_day, after_day, end_day):
+        calls.append((spec.key, first_day))
+        return compute(symbol, spec, first_day, after_day, end_day)
+
+    monkeypatch.setattr(manager, "_indicator_from", recording)
+    return calls
+
+
+@pytest.mark.parametrize("spec", [MA, VOLATILITY, BETA])
+def test_indicator_is_stored(manager, spec):
+    manager.fetch_and_store_many(["AAA", "SPY"], period="2y")
+    assert_indicator(manager, spec)
+    assert ("AAA", spec.key) in manager.storage.indicator_series("AAA")
+
+
+def test_indicators_extend_after_new_prices(manager, source, full, market, monkeypatch):
+    manager.fetch_and_store_many(["AAA", "SPY"], period="2y")
+    for spec in (MA, VOLATILITY, BETA):
+        manager.get_indicator("AAA", spec)
+
+    calls = indicator_computations(manager, monkeypatch)
+    source.frames.update({"AAA": full, "SPY": market})
+    manager.fetch_and_store_data("SPY")
+    manager.fetch_and_store_data("AAA")
+    # Beim Speichern nur am Ende fortgeschrieben, nicht über die gesamte Historie berechnet
+    assert calls and all(first_day is not None for _, first_day in calls)
+    assert {key for key, _ in calls} == {MA.key, VOLATILITY.key, BETA.key}
+    last_day = (pd.Timestamp("2024-12-31") - pd.Timestamp("1970-01-01")).days
+    for spec in (MA, VOLATILITY, BETA):
+        assert manager.storage.last_indicator_day("AAA", spec.key) == last_day
+        assert_indicator(manager, spec)
+
+
+def test_repair_invalidates_indicators(manager, source, full):
+    manager.fetch_and_store_many(["AAA", "SPY"], period="2y")
+    for spec in (MA, BETA):
+        manager.get_indicator("AAA", spec)
+
+    corrected = full[:"2024-12-20"].copy()
+    corrected["Adj Close"] *= np.linspace(0.5, 1.0, len(corrected))
+    source.frames["AAA"] = corrected
+    manager.fetch_and_store_data("AAA", period="2y", repair=True)
+    assert manager.storage.indicator_series("AAA") == []
+    for spec in (MA, BETA):
+        assert_indicator(manager, spec)
+
+
+def test_market_repair_invalidates_beta(manager, source, market):
+    manager.fetch_and_store_many(["AAA", "SPY"], period="2y")
+    manager.get_indicator("AAA", MA)
+    manager.get_indicator("AAA", BETA)
+
+    corrected = market[:"2024-12-20"].copy()
+    corrected["Adj Close"] *= 1.5
+    source.frames["SPY"] = corrected
+    manager.fetch_and_store_data("SPY", period="2y", repair=True)
+    assert manager.storage.indicator_series("AAA") == [("AAA", MA.key)]
+    assert_indicator(manager, BETA)
+
+
+def test_non_persisted_indicators_are_rejected(manager):
+    manager.fetch_and_store_data("AAA")
+    with pytest.raises(ValueError):
+        manager.get_indicator("AAA", IndicatorSpec("returns"))
+    assert manager.storage.indicator_series() == []
+
+
+def pandas_rollup(daily, resolution):
+    """Wochen- bzw. Monatswerte per pandas-groupby, jeweils unter dem letzten Handelstag der Periode."""
+    periods = daily.index.to_period("W-SUN" if resolution == "weekly" else "M")
+    grouped = daily.groupby(periods)
+    rollup = grouped.agg({"open": "first", "high": "max", "low": "min", "close": "last",
+                          "adj_close": "last", "volume": "sum"})
+    rollup.index = pd.DatetimeIndex(daily.index.to_series().groupby(periods).max().to_numpy(), name="date")
+    return rollup
+
+
+def open_storage(layout, path):
+    if layout == "columnar":
+        return ColumnarBackend(path / "columns")
+    return SQLiteBackend(str(path / "stocks.db"), layout=layout)
+
+
+@pytest.fixture(params=["legacy", "compact", "columnar"])
+def layout_manager(request, tmp_path, source):
+    manager = StockDataManager(data_source=source, storage=open_storage(request.param, tmp_path))
+    yield manager
+    manager.close()
+
+
+def assert_rollup(manager, resolution, start_date=None, end_date=None):
+    daily = manager.get_stock_data("AAA", start_date, end_date)
+    rolled = manager.get_stock_data("AAA", start_date, end_date, resolution=resolution)
+    expected = pandas_rollup(daily, resolution)
+    assert len(rolled) == len(expected)
+    pd.testing.assert_frame_equal(rolled, expected, check_dtype=False, check_index_type=False, check_freq=False)
+
+
+@pytest.mark.parametrize("resolution", ["weekly", "monthly"])
+def test_rollups_match_pandas(layout_manager, resolution):
+    layout_manager.fetch_and_store_data("AAA", period="2y")
+    assert_rollup(layout_manager, resolution)
+
+
+@pytest.mark.parametrize("resolution", ["weekly", "monthly"])
+@pytest.mark.parametrize("start_date, end_date", [
+    ("2023-03-15", "2023-11-08"),  # beide Enden mitten in Woche und Monat
+    ("2024-07-03", None),
+    (None, "2023-06-14"),
+    ("2024-05-08", "2024-05-09"),  # nur ein Teil einer einzigen Woche
+])
+def test_rollups_of_partial_periods(layout_manager, resolution, start_date, end_date):
+    layout_manager.fetch_and_store_data("AAA", period="2y")
+    assert_rollup(layout_manager, resolution, start_date, end_date)
+
+
+@pytest.mark.parametrize("resolution", ["weekly", "monthly"])
+def test_rollups_after_incremental_fetch(layout_manager, source, full, resolution):
+    # Der erste Abruf endet an einem Mittwoch mitten im Monat; die offene Periode wird später ergänzt
+    source.frames["AAA"] = full[:"2024-11-13"]
+    layout_manager.fetch_and_store_data("AAA", period="2y")
+    assert_rollup(layout_manager, resolution)
+    source.frames["AAA"] = full
+    layout_manager.fetch_and_store_data("AAA", period="2y")
+    assert_rollup(layout_manager, resolution)
+    assert layout_manager.get_stock_data("AAA", resolution=resolution).index[-1] == pd.Timestamp("2024-12-31")
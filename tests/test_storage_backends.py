@@ -0,0 +1,213 @@
+"""Tests für Speicherlayouts, Migration und Umwandlung zwischen den Speicher-Backends."""
+from pathlib import Path
+import sqlite3
+import subprocess
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from stock_data_manager import StockDataManager
+from storage_backends import (ColumnarBackend, IntradayStore, SQLiteBackend, _schema_version, bars_from_frame,
+                              convert_storage, frame_to_columns, migrate_to_compact)
+from synthetic_data import SyntheticDataSource, synthetic_history, synthetic_intraday, synthetic_symbols
+
+
+SYMBOLS = synthetic_symbols(3)
+
+
+def fill(storage, symbols=SYMBOLS, years=2):
+    """Speichert synthetische Historien der Symbole; gibt sie im Format von query_history zurück."""
+    frames = {}
+    with storage.transaction():
+        storage.upsert_stocks([(symbol, f"Synthetic {symbol}") for symbol in symbols])
+        for symbol in symbols:
+            frame = synthetic_history(symbol, years=years)
+            frame = frame.set_axis(["open", "high", "low", "close", "adj_close", "volume"], axis=1)
+            days, columns = frame_to_columns(frame)
+            storage.insert_history(symbol, days, columns)
+            frames[symbol] = storage.query_history(symbol)
+    return frames
+
+
+def test_open_keeps_existing_layout(tmp_path):
+    path = str(tmp_path / "stocks.db")
+    legacy = SQLiteBackend(path, layout="legacy")
+    frames = fill(legacy)
+    legacy.close()
+
+    storage = SQLiteBackend(path, layout=None)
+    assert storage.layout == "legacy"
+    pd.testing.assert_frame_equal(storage.query_history(SYMBOLS[0]), frames[SYMBOLS[0]])
+    storage.close()
+    assert not (tmp_path / "stocks.db.bak").exists()
+
+
+def test_new_database_defaults_to_compact(tmp_path):
+    storage = SQLiteBackend(str(tmp_path / "stocks.db"), layout=None)
+    assert storage.layout == "compact"
+    storage.close()
+
+
+def test_explicit_migration_keeps_backup(tmp_path):
+    path = str(tmp_path / "stocks.db")
+    legacy = SQLiteBackend(path, layout="legacy")
+    frames = fill(legacy)
+    legacy.close()
+
+    backup = migrate_to_compact(path)
+    assert backup == path + ".bak"
+    conn = sqlite3.connect(backup)
+    columns = {row[1] for row in conn.execute("PRAGMA table_info(daily_prices)")}
+    conn.close()
+    assert "symbol" in columns and "symbol_id" not in columns
+
+    storage = SQLiteBackend(path, layout=None)
+    assert storage.layout == "compact"
+    assert storage.conn.execute("PRAGMA user_version").fetchone()[0] == _schema_version("compact")
+    for symbol, frame in frames.items():
+        pd.testing.assert_frame_equal(storage.query_history(symbol), frame)
+    storage.close()
+    assert migrate_to_compact(path) is None
+
+
+def test_round_trip_through_columnar(tmp_path):
+    source_path = str(tmp_path / "source.db")
+    source = SQLiteBackend(source_path, layout="compact")
+    frames = fill(source)
+    source.close()
+
+    # Hin über die Kommandozeile, zurück per convert_storage in eine Datenbank im alten Layout
+    columns_path = tmp_path / "columns"
+    subprocess.run([sys.executable, "storage_backends.py", source_path, str(columns_path)],
+                   cwd=Path(__file__).resolve().parent.parent, check=True, capture_output=True)
+    columnar = ColumnarBackend(columns_path, read_only=True)
+    assert columnar.symbols() == SYMBOLS
+    for symbol, frame in frames.items():
+        pd.testing.assert_frame_equal(columnar.query_history(symbol), frame)
+
+    target = SQLiteBackend(str(tmp_path / "target.db"), layout="legacy")
+    rows = convert_storage(columnar, target)
+    assert rows == sum(len(frame) for frame in frames.values())
+    assert sorted(target.stocks()) == [(symbol, f"Synthetic {symbol}") for symbol in SYMBOLS]
+    for symbol, frame in frames.items():
+        pd.testing.assert_frame_equal(target.query_history(symbol), frame)
+        pd.testing.assert_frame_equal(target.query_history(symbol, "2024-03-01", "2024-06-30"),
+                                      frame["2024-03-01":"2024-06-30"])
+    target.close()
+    columnar.close()
+
+
+def test_columnar_keeps_symbols_apart_from_internal_directories(tmp_path):
+    # Auf Dateisystemen ohne Groß-/Kleinschreibung dürfen diese Symbole nicht neben 'indicators' usw. liegen
+    symbols = ["INDICATORS", "ROLLUPS", "PRICES", "STOCKS.JSON"]
+    storage = ColumnarBackend(tmp_path / "columns")
+    frames = fill(storage, symbols)
+    with storage.transaction():
+        storage.insert_indicator_values("ROLLUPS", "ma_20", [19000, 19001], [1.0, 2.0])
+    top_level = sorted(path.name for path in (tmp_path / "columns").iterdir())
+    assert top_level == ["indicators", "prices", "stocks.json"]
+    assert storage.symbols() == sorted(symbols)
+    for symbol, frame in frames.items():
+        pd.testing.assert_frame_equal(storage.query_history(symbol), frame)
+    storage.close()
+
+
+def test_columnar_moves_symbols_of_older_stores(tmp_path):
+    directory = tmp_path / "columns"
+    storage = ColumnarBackend(directory)
+    frames = fill(storage)
+    storage.close()
+    # Aufbau älterer Versionen: Symbolverzeichnisse direkt im Hauptverzeichnis
+    for path in (directory / "prices").iterdir():
+        path.rename(directory / path.name)
+    (directory / "prices").rmdir()
+
+    read_only = ColumnarBackend(directory, read_only=True)
+    pd.testing.assert_frame_equal(read_only.query_history(SYMBOLS[0]), frames[SYMBOLS[0]])
+    read_only.close()
+    assert not (directory / "prices").exists()
+
+    storage = ColumnarBackend(directory)
+    assert sorted(path.name for path in (directory / "prices").iterdir()) == SYMBOLS
+    for symbol, frame in frames.items():
+        pd.testing.assert_frame_equal(storage.query_history(symbol), frame)
+    storage.close()
+
+
+def intraday_bars(interval="5m", days=30, symbol=SYMBOLS[0]):
+    """Synthetische Balken über einen Monatswechsel als (Sekunden seit 1970 UTC, Spalten)."""
+    return bars_from_frame(synthetic_intraday(symbol, interval, days, end="2024-03-15"))
+
+
+def test_intraday_round_trip(tmp_path):
+    store = IntradayStore(tmp_path, dtype="float64")
+    ts, columns = intraday_bars()
+    assert store.insert_bars(SYMBOLS[0], "5m", ts, columns) == len(ts)
+    assert sorted(path.stem for path in store._months(SYMBOLS[0], "5m")) == ["2024-02", "2024-03"]
+
+    stored_ts, stored = store.query_bars(SYMBOLS[0], "5m")
+    np.testing.assert_array_equal(stored_ts, ts)
+    for field in IntradayStore.FIELDS:
+        np.testing.assert_array_equal(stored[field], columns[field])
+    assert store.last_timestamp(SYMBOLS[0], "5m") == ts[-1]
+    assert store.symbols("5m") == [SYMBOLS[0]]
+
+    frame = store.query_frame(SYMBOLS[0], "5m", start="2024-03-01", end="2024-03-04", tz="America/New_York")
+    assert list(frame.columns) == list(IntradayStore.FIELDS)
+    assert frame.index[0] == pd.Timestamp("2024-03-01 09:30", tz="America/New_York")
+    assert frame.index[-1] == pd.Timestamp("2024-03-04 15:55", tz="America/New_York")
+
+    store.delete(SYMBOLS[0], "5m")
+    assert len(store.query_bars(SYMBOLS[0], "5m")[0]) == 0
+    assert store.last_timestamp(SYMBOLS[0], "5m") is None
+
+
+def test_intraday_insert_replaces_equal_timestamps(tmp_path):
+    store = IntradayStore(tmp_path, dtype="float64")
+    ts, columns = intraday_bars()
+    store.insert_bars(SYMBOLS[0], "5m", ts[:1000], {field: values[:1000] for field, values in columns.items()})
+    # Überlappender zweiter Abruf mit geänderten Kursen: die neuen Balken gewinnen
+    changed = {field: values * 2 for field, values in columns.items()}
+    store.insert_bars(SYMBOLS[0], "5m", ts[500:], {field: values[500:] for field, values in changed.items()})
+    stored_ts, stored = store.query_bars(SYMBOLS[0], "5m")
+    np.testing.assert_array_equal(stored_ts, ts)
+    np.testing.assert_array_equal(stored["close"][:500], columns["close"][:500])
+    np.testing.assert_array_equal(stored["close"][500:], changed["close"][500:])
+
+
+def test_intraday_float32_size(tmp_path):
+    store = IntradayStore(tmp_path)
+    ts, columns = intraday_bars("1m", days=5)
+    store.insert_bars(SYMBOLS[0], "1m", ts, columns)
+    _, stored = store.query_bars(SYMBOLS[0], "1m")
+    assert stored["close"].dtype == np.float32
+    np.testing.assert_allclose(stored["close"], columns["close"], rtol=1e-6)
+    np.testing.assert_array_equal(stored["volume"], columns["volume"])
+    assert store.size_bytes(SYMBOLS[0], "1m") / len(ts) < 20
+    assert store.size_bytes() == store.size_bytes(SYMBOLS[0], "1m")
+
+
+def test_intraday_rejects_unknown_interval_and_dtype(tmp_path):
+    with pytest.raises(ValueError):
+        IntradayStore(tmp_path, dtype="int32")
+    with pytest.raises(ValueError):
+        IntradayStore(tmp_path).query_bars(SYMBOLS[0], "7m")
+
+
+def test_manager_stores_intraday_bars_incrementally(tmp_path):
+    source = SyntheticDataSource(SYMBOLS[:1], intraday_days=10)
+    manager = StockDataManager(str(tmp_path / "stocks.db"), data_source=source)
+    try:
+        assert manager.fetch_and_store_data(SYMBOLS[0], interval="5m")
+        ts, columns = bars_from_frame(source.history(SYMBOLS[0], interval="5m"))
+        stored_ts, stored = manager.get_intraday_data(SYMBOLS[0], "5m", as_arrays=True)
+        np.testing.assert_array_equal(stored_ts, ts)
+        np.testing.assert_allclose(stored["close"], columns["close"], rtol=1e-6)
+
+        # Erneuter Abruf ergänzt nur Balken nach dem letzten gespeicherten
+        assert manager.fetch_and_store_data(SYMBOLS[0], interval="5m")
+        np.testing.assert_array_equal(manager.get_intraday_data(SYMBOLS[0], "5m", as_arrays=True)[0], ts)
+    finally:
+        manager.close()
@@ -0,0 +1,130 @@
+"""Streaming-Indikatoren: Übereinstimmung mit den Batch-Funktionen und speicherbarer Zustand."""
+import json
+import math
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from financial_tools import TRADING_DAYS_PER_YEAR, FinancialTools
+from streaming_indicators import (StreamingBeta, StreamingIndicator, StreamingMovingAverage,
+                                  StreamingVolatility)
+from synthetic_data import synthetic_history
+
+
+def with_gaps(prices, seed):
+    return prices.mask(np.random.default_rng(seed).random(len(prices)) < 0.03)
+
+
+@pytest.fixture(scope="module")
+def prices():
+    return with_gaps(synthetic_history("SYN00001", years=2)["Adj Close"], seed=0)
+
+
+@pytest.fixture(scope="module")
+def market(prices):
+    return with_gaps(synthetic_history("SPY", years=2)["Adj Close"], seed=1).reindex(prices.index)
+
+
+def stream(indicator, values, dates):
+    """Aktualisiert Kurs für Kurs und gibt die Werte nach jedem Kurs als Series zurück."""
+    return pd.Series([indicator.update(value, date=date) for value, date in zip(values, dates)], index=dates)
+
+
+def assert_matches(streamed, expected):
+    """Vergleicht an den Tagen, für die die Batch-Funktion einen Wert liefert."""
+    streamed = streamed.reindex(expected.index)
+    np.testing.assert_allclose(streamed.to_numpy(), expected.to_numpy(), rtol=1e-9, atol=1e-12)
+
+
+def test_moving_average_matches_batch(prices):
+    # Fehlende Kurse (NaN) überspringt der Streaming-Indikator; die Batch-Funktion sieht nur gültige Kurse
+    streamed = stream(StreamingMovingAverage(20), prices.tolist(), prices.index)
+    assert_matches(streamed, FinancialTools.calculate_moving_average(prices.dropna(), 20))
+    assert math.isnan(streamed.iloc[0])
+
+
+@pytest.mark.parametrize("periods_per_year", [TRADING_DAYS_PER_YEAR, 52])
+def test_volatility_matches_batch(prices, periods_per_year):
+    indicator = StreamingVolatility(20, periods_per_year=periods_per_year)
+    streamed = stream(indicator, prices.tolist(), prices.index)
+    assert_matches(streamed, FinancialTools.calculate_volatility(prices.dropna(), 20, periods_per_year))
+
+
+def test_beta_matches_batch(prices, market):
+    streamed = stream(StreamingBeta(60), list(zip(prices, market)), prices.index)
+    expected = FinancialTools.calculate_beta(prices.dropna(), market.dropna(), 60)
+    assert len(expected) > 300
+    assert_matches(streamed, expected)
+
+
+def test_from_history_continues_like_batch(prices, market):
+    split = prices.index[400]
+    head, tail = prices[:split], prices[split:].iloc[1:]
+    volatility = StreamingVolatility.from_history(head, 20, periods_per_year=52)
+    assert_matches(stream(volatility, tail.tolist(), tail.index),
+                   FinancialTools.calculate_volatility(prices.dropna(), 20, 52)[tail.index[0]:])
+    average = StreamingMovingAverage.from_history(head, 20)
+    assert_matches(stream(average, tail.tolist(), tail.index),
+                   FinancialTools.calculate_moving_average(prices.dropna(), 20)[tail.index[0]:])
+    beta = StreamingBeta.from_history(head, market[:split], 60)
+    expected = FinancialTools.calculate_beta(prices.dropna(), market.dropna(), 60)
+    assert_matches(stream(beta, list(zip(tail, market[split:].iloc[1:])), tail.index),
+                   expected[tail.index[0]:])
+
+
+def round_trip(indicator):
+    return StreamingIndicator.from_dict(json.loads(json.dumps(indicator.to_dict())))
+
+
+@pytest.mark.parametrize("make, values", [
+    (lambda: StreamingMovingAverage(20), lambda p, m: p.tolist()),
+    (lambda: StreamingVolatility(20, periods_per_year=52), lambda p, m: p.tolist()),
+    (lambda: StreamingBeta(60), lambda p, m: list(zip(p, m))),
+])
+def test_round_trip_continues_identically(prices, market, make, values):
+    values = values(prices, market)
+    original = make()
+    stream(original, values[:300], prices.index[:300])
+    restored = round_trip(original)
+    assert type(restored) is type(original)
+    assert restored.last_date == original.last_date
+    assert restored.value == pytest.approx(original.value, nan_ok=True)
+    np.testing.assert_allclose(stream(restored, values[300:], prices.index[300:]).to_numpy(),
+                               stream(original, values[300:], prices.index[300:]).to_numpy(), rtol=1e-12)
+
+
+def test_volatility_state_keeps_periods_per_year(prices):
+    indicator = StreamingVolatility.from_history(prices, 20, periods_per_year=52)
+    restored = round_trip(indicator)
+    assert restored.periods_per_year == 52
+    assert restored.value == pytest.approx(indicator.value)
+
+
+def test_volatility_state_without_periods_per_year(prices):
+    # Zustände aus älteren Versionen kennen periods_per_year noch nicht: sie gelten für Tageskurse
+    state = StreamingVolatility.from_history(prices, 20).to_dict()
+    del state["periods_per_year"]
+    restored = StreamingVolatility.from_dict(state)
+    assert restored.periods_per_year == TRADING_DAYS_PER_YEAR
+    assert restored.value == pytest.approx(FinancialTools.calculate_volatility(prices.dropna(), 20).iloc[-1])
+
+
+def test_from_dict_rejects_other_class(prices):
+    state = StreamingVolatility.from_history(prices, 20).to_dict()
+    with pytest.raises(ValueError):
+        StreamingMovingAverage.from_dict(state)
+    assert isinstance(StreamingVolatility.from_dict(state), StreamingVolatility)
+
+
+def test_known_dates_and_nan_are_skipped(prices):
+    indicator = StreamingMovingAverage.from_history(prices, 5)
+    value = indicator.value
+    assert indicator.update(1e6, date=prices.index[-2]) == value
+    assert indicator.update(math.nan, date=prices.index[-1] + pd.Timedelta(days=1)) == value
+    assert indicator.update(1e6, date=prices.index[-1] + pd.Timedelta(days=2)) != value
+
+
+def test_window_must_be_at_least_two():
+    with pytest.raises(ValueError):
+        StreamingVolatility(1)